@@ -1,22 +1,30 @@
 import streamlit as st
-import pytesseract # for ocr
 import pandas as pd
-import PyPDF2
 from PIL import Image
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.colors import yellow, red, green, blue
-import zipfile
-import pdf2image
-from pdf2image import convert_from_bytes
-import img2pdf
 import os
+import time
 # added new 
 import base64
 import json
 import streamlit.components.v1 as components
 
+# UI-free operations (shared with batch jobs)
+import pdf_ops
+import invoice
+import invoice_batch
+import invoice_table
+import ocr
+from result_cache import ResultCache, content_hash
+from thumbnails import ThumbnailService
+from archive import build_archive
+from preprocess import PreprocessOptions
+from workspace import DocumentStore, Workspace
+from invoice_rules import slow_rules
+import pipeline
+import background
+from background import JobRunner
+
 
 
 st.set_page_config(page_title="Star Cement PDF Editor Pro", page_icon="📄", layout="wide")
@@ -95,18 +103,22 @@ feature = st.sidebar.radio(
         "🔀 Reorder Pages",
         "🔐 Protect PDF",
         "🛑 Redact PDF",
-        "✍️ Sign PDF"
+        "✍️ Sign PDF",
+        "⛓️ Pipeline"
 
     ]
 )
 
 # 🔄 RESET STATE WHEN TOOL CHANGES
+# Per-tool results and widgets are dropped; these survive a tool switch
+PERSISTENT_STATE_KEYS = {"prev_feature", "pipeline_steps", "workspace", "jobs"}
+
 if "prev_feature" not in st.session_state:
     st.session_state.prev_feature = feature
 
 if st.session_state.prev_feature != feature:
     for key in list(st.session_state.keys()):
-        if key != "prev_feature":
+        if key not in PERSISTENT_STATE_KEYS:
             del st.session_state[key]
     st.session_state.prev_feature = feature
     st.rerun()
@@ -114,6 +126,125 @@ if st.session_state.prev_feature != feature:
 st.sidebar.markdown("---")
 st.sidebar.info("💡 **Tip:** Upload your PDF(s) and select the operation you want to perform.")
 
+# Shared across reruns and sessions: results keyed by SHA-256 of the
+# uploaded bytes + operation parameters, so reruns cost a lookup
+@st.cache_resource
+def get_result_cache():
+    return ResultCache.from_env()
+
+result_cache = get_result_cache()
+
+@st.cache_resource
+def get_thumbnail_service():
+    return ThumbnailService(get_result_cache(), dpi=80)
+
+thumbnail_service = get_thumbnail_service()
+
+# OCR, raster compression and page rendering run as background jobs shared
+# by all sessions, so a rerun does not abandon them; each session keeps the
+# id of its latest job per tool and polls it
+@st.cache_resource
+def get_job_runner():
+    return JobRunner.from_env()
+
+job_runner = get_job_runner()
+
+if "jobs" not in st.session_state:
+    st.session_state.jobs = {}
+
+# Uploaded documents on disk by content hash, shared by all sessions; each
+# session keeps its own LRU index so a file follows the user across tools
+@st.cache_resource
+def get_document_store():
+    return DocumentStore.from_env()
+
+if "workspace" not in st.session_state:
+    st.session_state.workspace = Workspace.from_env(get_document_store())
+workspace = st.session_state.workspace
+
+def select_workspace_doc():
+    workspace.touch(st.session_state.workspace_active)
+
+workspace_docs = workspace.docs()
+if workspace_docs:
+    st.sidebar.markdown("### 📂 Workspace")
+    # Stable order, so choosing a document does not reshuffle the list
+    docs_by_digest = {doc.digest: doc for doc in sorted(workspace_docs, key=lambda d: (d.name, d.digest))}
+    digests = list(docs_by_digest)
+    st.session_state.workspace_active = workspace_docs[0].digest
+    active_digest = st.sidebar.selectbox(
+        "Active document",
+        digests,
+        format_func=lambda d: f"{docs_by_digest[d].name} ({docs_by_digest[d].size / 1024 / 1024:.1f} MB)",
+        key="workspace_active",
+        on_change=select_workspace_doc
+    )
+    if st.sidebar.button("🗑️ Remove from workspace", use_container_width=True):
+        workspace.remove(active_digest)
+        st.rerun()
+
+def pdf_uploader(label, key=None):
+    """PDF uploader that falls back to the active workspace document
+
+    New uploads join the workspace, so the next tool opens them without
+    another upload. Choosing another document in the sidebar wins over
+    the file still sitting in the uploader.
+    """
+    uploaded = st.file_uploader(label, type=["pdf"], key=key)
+    if uploaded is not None:
+        previous = workspace.active
+        doc = workspace.add_upload(uploaded)
+        if doc is not previous and doc is workspace.active:
+            st.rerun()  # just added: show it in the sidebar
+        if doc is workspace.active:
+            return uploaded
+
+    doc = workspace.active
+    if doc is None:
+        return None
+    stored = workspace.open(doc)
+    if stored is not None:
+        st.caption(f"📂 Using **{doc.name}** from the workspace. Upload a file to use another one.")
+    return stored
+
+def start_job(slot, label, func, *args, key=None, **kwargs):
+    """Run func in the background as this session's job for slot
+
+    key identifies the inputs, so the result is only shown for them.
+    """
+    previous = job_runner.get(st.session_state.jobs.get(slot))
+    if previous is not None:
+        previous.cancel()
+    st.session_state.jobs[slot] = job_runner.submit(label, func, *args, key=key, **kwargs).id
+
+@st.fragment(run_every=0.5)
+def show_job_progress(job):
+    if job.finished:
+        st.rerun()  # the whole script, to show the result
+    if job.status == background.QUEUED:
+        detail = "waiting for a free worker..."
+    elif job.total:
+        detail = f"{job.done} of {job.total} pages done"
+    else:
+        detail = "working..."
+    st.progress(job.done / job.total if job.total else 0.0, text=f"⏳ {job.label}: {detail}")
+    if not job.cancelling and st.button("⏹️ Cancel", key=f"cancel_job_{job.id}"):
+        job.cancel()
+    if job.cancelling:
+        st.caption("Cancelling after the current page...")
+
+def slot_job(slot, key):
+    """This session's job for slot, if it was started for key
+
+    While the job runs its progress and a cancel button are shown.
+    """
+    job = job_runner.get(st.session_state.jobs.get(slot))
+    if job is None or job.key != key:
+        return None
+    if not job.finished:
+        show_job_progress(job)
+    return job
+
 # Helper function to create download button
 def create_download_button(file_data, filename, label):
     st.download_button(
@@ -124,6 +255,12 @@ def create_download_button(file_data, filename, label):
         use_container_width=True
     )
 
+# st.download_button keeps the whole payload in memory whatever it is given,
+# so spooled outputs (merge, ZIPs) are read once and their temp files closed
+def read_spooled(handle):
+    with handle:
+        return handle.read()
+
 # Feature 1: Merge PDFs
 if feature == "🔗 Merge PDFs":
     st.header("🔗 Merge Multiple PDFs")
@@ -140,26 +277,35 @@ if feature == "🔗 Merge PDFs":
     if uploaded_files and len(uploaded_files) > 1:
         st.success(f"✅ {len(uploaded_files)} files uploaded")
 
-        # Display merge order
+        # Display merge order, with an optional page range per file
         st.write("**Files will be merged in this order:**")
+        page_specs = []
         for index, file in enumerate(uploaded_files, start=1):
-            st.write(f"{index}. {file.name}")
+            col1, col2 = st.columns([3, 2])
+            col1.write(f"{index}. {file.name}")
+            page_specs.append(col2.text_input(
+                "Pages",
+                key=f"merge_pages_{index}",
+                placeholder="All pages (or e.g. 1-3,5)",
+                label_visibility="collapsed"
+            ))
 
         # Merge button
         if st.button("🔗 Merge PDFs", use_container_width=True):
             try:
-                merger = PyPDF2.PdfMerger()
-
-                for pdf in uploaded_files:
-                    merger.append(pdf)
+                inputs = []
+                for file, spec in zip(uploaded_files, page_specs):
+                    try:
+                        pages = pdf_ops.parse_page_list(spec) if spec.strip() else None
+                    except ValueError:
+                        st.error(f"❌ Invalid page range for {file.name}: {spec}")
+                        st.stop()
+                    inputs.append(pdf_ops.MergeInput(file, pages))
 
-                output = io.BytesIO()
-                merger.write(output)
-                merger.close()
-                output.seek(0)
+                merged = pdf_ops.merge_to_file(inputs, workers=os.cpu_count() or 1)
 
                 create_download_button(
-                    output.getvalue(),
+                    read_spooled(merged),
                     "merged_document.pdf",
                     "⬇️ Download Merged PDF"
                 )
@@ -177,12 +323,11 @@ elif feature == "✂️ Split PDF":
     st.header("✂️ Split PDF into Pages")
     st.write("Split a PDF into individual page files with preview and bulk download.")
 
-    uploaded_file = st.file_uploader("Choose a PDF file", type=["pdf"])
+    uploaded_file = pdf_uploader("Choose a PDF file")
 
     if uploaded_file:
         try:
-            reader = PyPDF2.PdfReader(uploaded_file)
-            num_pages = len(reader.pages)
+            num_pages = result_cache.call(pdf_ops.page_count, uploaded_file.getvalue())
 
             st.info(f"📄 Total pages: {num_pages}")
 
@@ -198,67 +343,38 @@ elif feature == "✂️ Split PDF":
 
                 show_preview = st.checkbox("🖼️ Show page previews", value=False)
 
-                # ---- Initialize session state ----
-                if "split_pages" not in st.session_state:
-                    st.session_state.split_pages = None
+                # ---- Lazy split: keep only hash + page count in session ----
+                # Per-page PDFs and the ZIP are generated when their
+                # download button is clicked, never held in session state
+                source_pdf = uploaded_file.getvalue()
+                source_hash = content_hash(source_pdf)
 
-                if "zip_data" not in st.session_state:
-                    st.session_state.zip_data = None
+                split_doc = st.session_state.get("split_doc")
+                if split_doc and split_doc["hash"] != source_hash:
+                    split_doc = st.session_state.split_doc = None
 
                 # ---- Split button ----
                 if st.button("✂️ Split All Pages", use_container_width=True):
+                    split_doc = st.session_state.split_doc = {
+                        "hash": source_hash,
+                        "pages": num_pages
+                    }
 
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-
-                    split_pages = []
-                    zip_buffer = io.BytesIO()
-
-                    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-                        for page_index in range(num_pages):
-
-                            writer = PyPDF2.PdfWriter()
-                            writer.add_page(reader.pages[page_index])
-
-                            output = io.BytesIO()
-                            writer.write(output)
-                            output.seek(0)
-
-                            pdf_bytes = output.getvalue()
-
-                            split_pages.append({
-                                "page": page_index + 1,
-                                "pdf": pdf_bytes
-                            })
-
-                            zip_file.writestr(
-                                f"page_{page_index + 1}.pdf",
-                                pdf_bytes
-                            )
-
-                            progress = int(((page_index + 1) / num_pages) * 100)
-                            progress_bar.progress(progress)
-                            status_text.text(
-                                f"Processing page {page_index + 1} of {num_pages}"
-                            )
-
-                    zip_buffer.seek(0)
-
-                    st.session_state.split_pages = split_pages
-                    st.session_state.zip_data = zip_buffer.getvalue()
+                    st.success("✅ All pages split successfully!")
 
-                    progress_bar.empty()
-                    status_text.empty()
+                def split_page_data(page_no):
+                    return lambda: pdf_ops.split_page(source_pdf, page_no)
 
-                    st.success("✅ All pages split successfully!")
+                def split_zip_data():
+                    return read_spooled(pdf_ops.split_archive(source_pdf))
 
                 # ==========================================================
                 # RENDER RESULTS (20 PAGES AT A TIME)
                 # ==========================================================
-                if st.session_state.split_pages:
+                if split_doc:
 
                     PAGES_PER_VIEW = 20
-                    total_pages = len(st.session_state.split_pages)
+                    total_pages = split_doc["pages"]
 
                     total_groups = (total_pages - 1) // PAGES_PER_VIEW + 1
 
@@ -276,7 +392,23 @@ elif feature == "✂️ Split PDF":
                     start_idx = group_index * PAGES_PER_VIEW
                     end_idx = min(start_idx + PAGES_PER_VIEW, total_pages)
 
-                    pages_to_show = st.session_state.split_pages[start_idx:end_idx]
+                    pages_to_show = list(range(start_idx + 1, end_idx + 1))
+
+                    # ---- Thumbnails: one batched render per group, next group prefetched ----
+                    thumbs = {}
+                    if show_preview:
+                        try:
+                            thumbs = thumbnail_service.get_group(
+                                uploaded_file.getvalue(), start_idx + 1, end_idx
+                            )
+                            if end_idx < total_pages:
+                                thumbnail_service.prefetch(
+                                    uploaded_file.getvalue(),
+                                    end_idx + 1,
+                                    min(end_idx + PAGES_PER_VIEW, total_pages)
+                                )
+                        except Exception:
+                            thumbs = {}
 
                     cols_per_row = 3
 
@@ -288,40 +420,34 @@ elif feature == "✂️ Split PDF":
                             if idx >= len(pages_to_show):
                                 continue
 
-                            page_data = pages_to_show[idx]
+                            page_no = pages_to_show[idx]
 
                             with cols[col_idx]:
 
                                 # ---- Optional Preview ----
                                 if show_preview:
-                                    try:
-                                        img = convert_from_bytes(
-                                            uploaded_file.getvalue(),
-                                            dpi=80,
-                                            first_page=page_data["page"],
-                                            last_page=page_data["page"]
-                                        )[0]
-
+                                    if page_no in thumbs:
                                         st.image(
-                                            img,
-                                            caption=f"Page {page_data['page']}",
+                                            thumbs[page_no],
+                                            caption=f"Page {page_no}",
                                             use_column_width=True
                                         )
-                                    except Exception:
+                                    else:
                                         st.empty()
 
-                                # ---- Download button ----
+                                # ---- Download button (generated on click) ----
                                 st.download_button(
-                                    label=f"⬇️ Download Page {page_data['page']}",
-                                    data=page_data["pdf"],
-                                    file_name=f"page_{page_data['page']}.pdf",
+                                    label=f"⬇️ Download Page {page_no}",
+                                    data=split_page_data(page_no),
+                                    file_name=f"page_{page_no}.pdf",
                                     mime="application/pdf",
+                                    key=f"split_page_{page_no}",
                                     use_container_width=True
                                 )
 
                     st.download_button(
                         label="📦 Download All Pages as ZIP",
-                        data=st.session_state.zip_data,
+                        data=split_zip_data,
                         file_name="split_pages.zip",
                         mime="application/zip",
                         use_container_width=True
@@ -348,16 +474,10 @@ elif feature == "✂️ Split PDF":
                     )
 
                 if st.button("✂️ Split Range", use_container_width=True):
-                    writer = PyPDF2.PdfWriter()
-                    for i in range(start_page - 1, end_page):
-                        writer.add_page(reader.pages[i])
-
-                    output = io.BytesIO()
-                    writer.write(output)
-                    output.seek(0)
+                    split_bytes = pdf_ops.split_range(uploaded_file.getvalue(), start_page, end_page)
 
                     create_download_button(
-                        output.getvalue(),
+                        split_bytes,
                         f"pages_{start_page}_to_{end_page}.pdf",
                         "⬇️ Download Split PDF"
                     )
@@ -371,12 +491,11 @@ elif feature == "📑 Extract Pages":
     st.header("📑 Extract Specific Pages")
     st.write("Extract selected pages from a PDF.")
     
-    uploaded_file = st.file_uploader("Choose a PDF file", type=['pdf'])
+    uploaded_file = pdf_uploader("Choose a PDF file")
     
     if uploaded_file:
         try:
-            reader = PyPDF2.PdfReader(uploaded_file)
-            num_pages = len(reader.pages)
+            num_pages = result_cache.call(pdf_ops.page_count, uploaded_file.getvalue())
             
             st.info(f"📄 Total pages: {num_pages}")
             
@@ -387,31 +506,15 @@ elif feature == "📑 Extract Pages":
             
             if st.button("📑 Extract Pages", use_container_width=True):
                 if pages_to_extract:
-                    # Parse page numbers
-                    page_list = []
-                    for part in pages_to_extract.split(','):
-                        if '-' in part:
-                            start, end = map(int, part.split('-'))
-                            page_list.extend(range(start, end+1))
-                        else:
-                            page_list.append(int(part))
-                    
-                    # Remove duplicates and sort
-                    page_list = sorted(set(page_list))
+                    # Parse page numbers (duplicates removed, sorted)
+                    page_list = pdf_ops.parse_page_list(pages_to_extract)
                     
-                    # Validate page numbers
-                    if all(1 <= p <= num_pages for p in page_list):
-                        writer = PyPDF2.PdfWriter()
-                        for page_num in page_list:
-                            writer.add_page(reader.pages[page_num-1])
-                        
-                        output = io.BytesIO()
-                        writer.write(output)
-                        output.seek(0)
+                    try:
+                        extracted = pdf_ops.extract_pages(uploaded_file.getvalue(), page_list)
                         
-                        create_download_button(output.getvalue(), "extracted_pages.pdf", "⬇️ Download Extracted Pages")
+                        create_download_button(extracted, "extracted_pages.pdf", "⬇️ Download Extracted Pages")
                         st.success(f"✅ Extracted {len(page_list)} pages successfully!")
-                    else:
+                    except ValueError:
                         st.error("❌ Invalid page numbers. Please check your input.")
                 else:
                     st.warning("⚠️ Please enter page numbers.")
@@ -424,12 +527,11 @@ elif feature == "🔄 Rotate Pages":
     st.header("🔄 Rotate PDF Pages")
     st.write("Rotate pages clockwise by 90°, 180°, or 270°.")
     
-    uploaded_file = st.file_uploader("Choose a PDF file", type=['pdf'])
+    uploaded_file = pdf_uploader("Choose a PDF file")
     
     if uploaded_file:
         try:
-            reader = PyPDF2.PdfReader(uploaded_file)
-            num_pages = len(reader.pages)
+            num_pages = result_cache.call(pdf_ops.page_count, uploaded_file.getvalue())
             
             st.info(f"📄 Total pages: {num_pages}")
             
@@ -443,26 +545,16 @@ elif feature == "🔄 Rotate Pages":
                 pages_to_rotate = st.text_input("Enter page numbers (comma-separated):", placeholder="1,2,3")
             
             if st.button("🔄 Rotate Pages", use_container_width=True):
-                writer = PyPDF2.PdfWriter()
-                
                 if rotate_option == "All pages":
-                    for page in reader.pages:
-                        rotated_page = page.rotate(rotation)
-                        writer.add_page(rotated_page)
+                    page_list = None
+                elif pages_to_rotate:
+                    page_list = [int(p.strip()) for p in pages_to_rotate.split(',')]
                 else:
-                    if pages_to_rotate:
-                        page_list = [int(p.strip()) for p in pages_to_rotate.split(',')]
-                        for i, page in enumerate(reader.pages, 1):
-                            if i in page_list:
-                                writer.add_page(page.rotate(rotation))
-                            else:
-                                writer.add_page(page)
+                    page_list = []
                 
-                output = io.BytesIO()
-                writer.write(output)
-                output.seek(0)
+                rotated = pdf_ops.rotate(uploaded_file.getvalue(), rotation, page_list)
                 
-                create_download_button(output.getvalue(), "rotated_document.pdf", "⬇️ Download Rotated PDF")
+                create_download_button(rotated, "rotated_document.pdf", "⬇️ Download Rotated PDF")
                 st.success("✅ Pages rotated successfully!")
         
         except Exception as e:
@@ -473,7 +565,7 @@ elif feature == "💧 Add Watermark":
     st.header("💧 Add Watermark to PDF")
     st.write("Add a transparent text watermark and preview before downloading.")
 
-    uploaded_file = st.file_uploader("Choose a PDF file", type=["pdf"])
+    uploaded_file = pdf_uploader("Choose a PDF file")
 
     if uploaded_file:
         watermark_text = st.text_input(
@@ -494,39 +586,15 @@ elif feature == "💧 Add Watermark":
                 st.warning("⚠️ Please enter watermark text.")
             else:
                 try:
-                    reader = PyPDF2.PdfReader(uploaded_file)
-                    writer = PyPDF2.PdfWriter()
-
-                    for page in reader.pages:
-                        page_width = float(page.mediabox.width)
-                        page_height = float(page.mediabox.height)
-
-                        # Create watermark page
-                        packet = io.BytesIO()
-                        can = canvas.Canvas(packet, pagesize=(page_width, page_height))
-
-                        can.saveState()
-                        can.setFont("Helvetica-Bold", font_size)
-                        can.setFillAlpha(opacity)  # TRUE transparency
-                        can.translate(page_width / 2, page_height / 2)
-                        can.rotate(rotation)
-                        can.drawCentredString(0, 0, watermark_text)
-                        can.restoreState()
-                        can.save()
-
-                        packet.seek(0)
-                        watermark_pdf = PyPDF2.PdfReader(packet)
-                        watermark_page = watermark_pdf.pages[0]
-
-                        page.merge_page(watermark_page)
-                        writer.add_page(page)
-
-                    output = io.BytesIO()
-                    writer.write(output)
-                    output.seek(0)
+                    spec = pdf_ops.WatermarkSpec(
+                        text=watermark_text,
+                        font_size=font_size,
+                        opacity=opacity,
+                        rotation=rotation
+                    )
 
                     # Save for preview & download
-                    st.session_state.watermarked_pdf = output.getvalue()
+                    st.session_state.watermarked_pdf = result_cache.call(pdf_ops.watermark, uploaded_file.getvalue(), spec)
 
                     st.success("✅ Watermark added successfully!")
 
@@ -548,7 +616,8 @@ elif feature == "💧 Add Watermark":
         )
 
         try:
-            images = convert_from_bytes(
+            images = result_cache.call(
+                pdf_ops.render_preview,
                 st.session_state.watermarked_pdf,
                 dpi=90,
                 first_page=1,
@@ -579,7 +648,123 @@ elif feature == "📝 Extract Text":
     st.header("📝 Extract Text from PDF")
     st.write("Extract text from digital or scanned PDFs using OCR if required.")
 
-    uploaded_file = st.file_uploader("Choose a PDF file", type=["pdf"])
+    batch_mode = st.toggle("🗂️ Batch invoice mode (many PDFs or a ZIP)")
+
+    if batch_mode:
+        uploaded_file = None
+        batch_files = st.file_uploader(
+            "Choose invoice PDFs or ZIP archives",
+            type=["pdf", "zip"],
+            accept_multiple_files=True
+        )
+    else:
+        batch_files = None
+        uploaded_file = pdf_uploader("Choose a PDF file")
+
+    # ======================================================
+    # BATCH INVOICES → CONSOLIDATED TABLES
+    # ======================================================
+    if batch_files:
+        extract_method = st.radio(
+            "Extraction method",
+            ["Normal (Text-based PDF)", "OCR (Scanned PDF)", "Auto (OCR only scanned pages)"]
+        )
+
+        batch_workers = 1
+        max_workers = os.cpu_count() or 1
+        if max_workers > 1:
+            batch_workers = st.slider("Worker processes", 1, max_workers, max_workers)
+
+        batch_preprocess = None
+        if extract_method != "Normal (Text-based PDF)" and st.checkbox(
+            "🧹 Clean up scans before OCR (grayscale, threshold, deskew, crop)"
+        ):
+            batch_preprocess = PreprocessOptions()
+
+        if st.button("🧾 Extract All Invoices", use_container_width=True):
+            try:
+                sources = list(invoice_batch.iter_sources(
+                    (f.name, f.getvalue()) for f in batch_files
+                ))
+                if not sources:
+                    st.warning("⚠️ No PDF files found in the upload.")
+                    st.stop()
+
+                progress_bar = st.progress(0)
+                status_text = st.empty()
+
+                def show_batch_progress(done, total):
+                    progress_bar.progress(int(done / total * 100))
+                    status_text.text(f"{done} of {total} invoices done")
+
+                st.session_state.invoice_batch = invoice_batch.run_batch(
+                    sources,
+                    method={
+                        "Normal (Text-based PDF)": invoice_batch.METHOD_TEXT,
+                        "OCR (Scanned PDF)": invoice_batch.METHOD_OCR,
+                        "Auto (OCR only scanned pages)": invoice_batch.METHOD_AUTO,
+                    }[extract_method],
+                    workers=batch_workers,
+                    progress=show_batch_progress,
+                    preprocess=batch_preprocess
+                )
+
+                progress_bar.empty()
+                status_text.empty()
+            except Exception as e:
+                st.error(f"❌ Error during batch extraction: {str(e)}")
+
+        if "invoice_batch" in st.session_state:
+            batch = st.session_state.invoice_batch
+            header_df = batch.header_table()
+            items_df = batch.line_items_table()
+
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Invoices", len(batch.results))
+            col2.metric("Invoices / sec", f"{batch.invoices_per_second:.1f}")
+            col3.metric("Failed", len(batch.failed))
+
+            st.markdown("### 🧾 Invoice Headers")
+            st.dataframe(header_df, use_container_width=True)
+
+            st.markdown("### 📦 Line Items")
+            st.dataframe(items_df, use_container_width=True)
+
+            if batch.failed:
+                with st.expander(f"⚠️ {len(batch.failed)} file(s) could not be processed"):
+                    st.dataframe(batch.error_table(), use_container_width=True)
+
+            slow_df = batch.slow_rules_table()
+            if not slow_df.empty:
+                with st.expander(f"⏱️ {len(slow_df)} slow or skipped extraction rule(s)"):
+                    st.caption("Skipped rules ran out of their time budget and left their field empty.")
+                    st.dataframe(slow_df, use_container_width=True)
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.download_button(
+                    "⬇️ Excel (all invoices)",
+                    data=lambda: invoice_batch.to_excel(batch),
+                    file_name="invoice_batch.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    use_container_width=True
+                )
+            with col2:
+                st.download_button(
+                    "⬇️ Headers (Parquet)",
+                    data=lambda: invoice_batch.to_parquet(header_df),
+                    file_name="invoice_headers.parquet",
+                    mime="application/octet-stream",
+                    use_container_width=True
+                )
+            with col3:
+                st.download_button(
+                    "⬇️ Line Items (Parquet)",
+                    data=lambda: invoice_batch.to_parquet(items_df),
+                    file_name="invoice_line_items.parquet",
+                    mime="application/octet-stream",
+                    use_container_width=True
+                )
 
     if uploaded_file:
         col1, col2 = st.columns(2)
@@ -593,48 +778,146 @@ elif feature == "📝 Extract Text":
         with col2:
             extract_method = st.radio(
                 "Extraction method",
-                ["Normal (Text-based PDF)", "OCR (Scanned PDF)"]
+                ["Normal (Text-based PDF)", "OCR (Scanned PDF)", "Auto (OCR only scanned pages)"]
+            )
+
+        ocr_workers = 1
+        max_workers = os.cpu_count() or 1
+        if extract_method != "Normal (Text-based PDF)" and max_workers > 1:
+            ocr_workers = st.slider(
+                "OCR worker processes",
+                1,
+                max_workers,
+                min(ocr.default_workers(), max_workers)
             )
 
-        if st.button("📝 Extract", use_container_width=True):
+        ocr_preprocess = None
+        if extract_method != "Normal (Text-based PDF)" and st.checkbox(
+            "🧹 Clean up scans before OCR (grayscale, threshold, deskew, crop)"
+        ):
+            ocr_preprocess = PreprocessOptions()
+
+        build_searchable = extract_method != "Normal (Text-based PDF)" and st.checkbox(
+            "📑 Also build a searchable PDF (invisible text layer over scanned pages)",
+            help="Pages that already have a text layer are left as they are. "
+                 "The result can be searched, redacted and extracted without OCR."
+        )
+
+        extract_clicked = st.button("📝 Extract", use_container_width=True)
+
+        # OCR runs as a background job, so its result stays on screen across
+        # reruns until the file or the OCR settings change
+        ocr_job = None
+        if extract_method != "Normal (Text-based PDF)":
+            ocr_key = (uploaded_file.file_id, extract_method, build_searchable, ocr_preprocess)
+            if extract_clicked:
+                if build_searchable:
+                    ocr_func = pdf_ops.searchable_pdf
+                elif extract_method == "OCR (Scanned PDF)":
+                    ocr_func = pdf_ops.ocr_text
+                else:
+                    ocr_func = pdf_ops.hybrid_text
+                start_job(
+                    "ocr", "OCR",
+                    background.cached_job, result_cache, ocr_func, uploaded_file.getvalue(),
+                    dpi=300,
+                    preprocess=ocr_preprocess,
+                    uncached={"workers": ocr_workers},
+                    key=ocr_key
+                )
+            ocr_job = slot_job("ocr", ocr_key)
+
+        if (extract_clicked and extract_method == "Normal (Text-based PDF)") or (
+            ocr_job is not None and ocr_job.finished
+        ):
             try:
                 extracted_text = ""
+                searchable = None
 
                 # ===============================
                 # NORMAL TEXT EXTRACTION
                 # ===============================
                 if extract_method == "Normal (Text-based PDF)":
-                    reader = PyPDF2.PdfReader(uploaded_file)
-                    with st.spinner("Extracting text from PDF..."):
-                        for page in reader.pages:
-                            txt = page.extract_text()
-                            if txt:
-                                extracted_text += txt + "\n\n"
+                    status_text = st.empty()
+                    preview = st.empty()
+                    page_texts = []
+                    last_shown = [0.0]
+
+                    def show_page(page_no, total, txt):
+                        if txt:
+                            page_texts.append(txt + "\n\n")
+                        # First page right away, then at most twice a second
+                        now = time.monotonic()
+                        if page_no == 1 or page_no == total or now - last_shown[0] >= 0.5:
+                            last_shown[0] = now
+                            status_text.text(f"Extracted {page_no} of {total} pages")
+                            if doc_type == "📄 Document":
+                                preview.text_area("📖 Extracted Text (so far)", "".join(page_texts), height=400)
+
+                    extracted_text = result_cache.call(
+                        pdf_ops.extract_text,
+                        uploaded_file.getvalue(),
+                        uncached={"on_page": show_page}
+                    )
+                    status_text.empty()
+                    preview.empty()
 
                 # ===============================
                 # OCR EXTRACTION
                 # ===============================
                 else:
-                    try:
-                        with st.spinner("Running OCR on scanned PDF..."):
-                            images = convert_from_bytes(uploaded_file.getvalue(), dpi=300)
-                            for img in images:
-                                extracted_text += pytesseract.image_to_string(img) + "\n\n"
-                    except Exception as ocr_error:
-                        st.error("❌ OCR Error: Tesseract is not installed or not found in PATH")
-                        st.info("""
-                        **To fix this:**
-                        - Use 'Normal (Text-based PDF)' extraction method instead
-                        - Or install Tesseract OCR on your system
-                        """)
+                    if ocr_job.status == background.CANCELLED:
+                        # Recognised pages are in the OCR store, so a restart skips them
+                        st.warning(f"⏹️ OCR cancelled after {ocr_job.done} of {ocr_job.total} pages. "
+                                   "Pages already recognised are kept and will not be OCR'd again.")
+                        st.stop()
+
+                    if ocr_job.status == background.FAILED:
+                        if ocr.is_tesseract_missing(ocr_job.exception):
+                            st.error("❌ OCR Error: Tesseract is not installed or not found in PATH")
+                            st.info("""
+                            **To fix this:**
+                            - Use 'Normal (Text-based PDF)' extraction method instead
+                            - Or install Tesseract OCR on your system
+                            """)
+                        else:
+                            st.error(f"❌ OCR failed: {ocr_job.error}")
                         st.stop()
 
+                    if build_searchable:
+                        searchable = ocr_job.result
+                        extracted_text = searchable.text
+                        if searchable.ocr_pages:
+                            st.info(f"ℹ️ Text layer added to {len(searchable.ocr_pages)} page(s): "
+                                    + ", ".join(map(str, searchable.ocr_pages)))
+                        else:
+                            st.info("ℹ️ Every page has a text layer, OCR was not needed.")
+                    elif extract_method == "OCR (Scanned PDF)":
+                        extracted_text = ocr_job.result
+                    else:
+                        hybrid = ocr_job.result
+                        extracted_text = hybrid.text
+                        if hybrid.ocr_pages:
+                            st.info(f"ℹ️ OCR used on {len(hybrid.ocr_pages)} page(s): "
+                                    + ", ".join(map(str, hybrid.ocr_pages)))
+                        else:
+                            st.info("ℹ️ Every page has a text layer, OCR was not needed.")
+
                 if not extracted_text.strip():
                     st.warning("⚠️ No text could be extracted.")
                     st.stop()
 
                 st.success("✅ Text extraction completed!")
 
+                if searchable is not None and searchable.ocr_pages:
+                    st.download_button(
+                        "⬇️ Download Searchable PDF",
+                        searchable.pdf,
+                        "searchable.pdf",
+                        "application/pdf",
+                        use_container_width=True
+                    )
+
                 # ======================================================
                 # DOCUMENT → TXT
                 # ======================================================
@@ -652,530 +935,22 @@ elif feature == "📝 Extract Text":
                 # INVOICE / BILL → UNIVERSAL EXTRACTION
                 # ======================================================
                 else:
-                    import re
-                    import pandas as pd
-                    import io
-
                     st.markdown("### 📊 Extracted Invoice Data")
                     
-                    text = extracted_text
-                    
-                    # -------------------------------------------------
-                    # UNIVERSAL HELPER FUNCTIONS
-                    # -------------------------------------------------
-                    def find_multi(patterns, text, default=""):
-                        """Try multiple patterns and return first match"""
-                        try:
-                            for pattern in patterns if isinstance(patterns, list) else [patterns]:
-                                match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-                                if match:
-                                    return match.group(1).strip()
-                            return default
-                        except:
-                            return default
-                    
-                    def find_all_multi(patterns, text):
-                        """Try multiple patterns and return all matches"""
-                        try:
-                            for pattern in patterns if isinstance(patterns, list) else [patterns]:
-                                matches = re.findall(pattern, text, re.IGNORECASE | re.DOTALL)
-                                if matches:
-                                    return matches
-                            return []
-                        except:
-                            return []
-                    
-                    # -------------------------------------------------
-                    # UNIVERSAL INVOICE EXTRACTION
-                    # -------------------------------------------------
-                    invoice_data = {}
-                    
-                    # ========== INVOICE IDENTIFIERS ==========
-                    invoice_data["Invoice Number"] = find_multi([
-                        r"Invoice\s+No[\.:\s]+([A-Z]{2,4}\d+)",
-                        r"Invoice\s+No[\.:\s]+(\d+)",
-                        r"Invoice\s*#[:\s]*([A-Z0-9\-]+)",
-                        r"Bill\s+No[\.:\s]+([A-Z0-9\-]+)",
-                        r"Tax\s+Invoice[^\n]*\n[^\n]*Invoice\s+No[\.:\s]+([A-Z0-9/\-]+)"
-                    ], text)
-                    
-                    invoice_data["Invoice Date"] = find_multi([
-                        r"Invoice\s+Date[\.:\s]+([\d/\-]+)",
-                        r"Dated[\.:\s]+([\d/\-]+)",
-                        r"Date[\.:\s]+([\d]{1,2}[/-][A-Za-z]{3}[/-][\d]{2,4})",
-                        r"Date[\.:\s]+([\d]{1,2}[/-][\d]{1,2}[/-][\d]{2,4})",
-                        r"Invoice\s+No[^\n]+\n[^\n]*Dated[^\n]*\n([^\n]*\d{2}[-/]\d{2}[-/]\d{4})"
-                    ], text)
-                    
-                    invoice_data["Due Date"] = find_multi([
-                        r"Due\s+Date[\.:\s]+([\d/\-]+)",
-                        r"Payment\s+Due[\.:\s]+([\d/\-]+)"
-                    ], text)
-                    
-                    # ========== ACKNOWLEDGMENT & REFERENCE ==========
-                    invoice_data["Ack No"] = find_multi([
-                        r"Ack\s+No[\.:\s]+([A-Z0-9]+)",
-                        r"Acknowledgment[\.:\s]+([A-Z0-9]+)",
-                        r"No\.[\.:\s]+(\d{12,})"  # Long numeric ack numbers
-                    ], text)
-                    
-                    invoice_data["Ack Date"] = find_multi([
-                        r"Ack\s+Date[\.:\s]+([\d/\-]+)",
-                        r"Date\s+r[\.:\s]+([\d\-]+[A-Za-z]{3}\-[\d]{2})"  # Date r format
-                    ], text)
-                    
-                    invoice_data["IRN Number"] = find_multi([
-                        r"IRN[\.:\s]+([A-Za-z0-9\-]+)",
-                        r"IRN\s+No[\.:\s]+([A-Za-z0-9\-]+)",
-                        r"IRN[\.:\s]*\n[\.:\s]*([a-z0-9\-]{40,})"  # Long IRN on next line
-                    ], text)
-                    
-                    invoice_data["CIN Number"] = find_multi([
-                        r"CIN\s+NO[\.:\s]+([A-Z0-9]+)"
-                    ], text)
-                    
-                    invoice_data["PAN"] = find_multi([
-                        r"PAN[\.:\s]+([A-Z]{5}\d{4}[A-Z])"
-                    ], text)
-                    
-                    # ========== E-WAY BILL ==========
-                    invoice_data["E-Way Bill No"] = find_multi([
-                        r"e-Way\s+Bill\s+No[\.:\s]+(\d+)",
-                        r"EWAY\s+Bill\s+No[\.:\s]+(\d+)",
-                        r"EWB\s+No[\.:\s]+(\d+)"
-                    ], text)
-                    
-                    invoice_data["EWB Expiry Date"] = find_multi([
-                        r"EWB\s+Expiry[^\n:]+([\d/\.\s:]+)",
-                        r"e-Way.*?Expiry[^\n:]+([\d/\.\s:]+)"
-                    ], text)
-                    
-                    # ========== ORDER DETAILS ==========
-                    invoice_data["Sales Order No"] = find_multi([
-                        r"S\.?O\.?\s+No[\.:\s]+(\d+)",
-                        r"Sales\s+Order[\.:\s]+([A-Z0-9\-]+)"
-                    ], text)
-                    
-                    invoice_data["Sales Order Date"] = find_multi([
-                        r"S\.?O\.?\s+No[^&\n]+&\s*([\d/]+)",
-                        r"S\.?O\.?\s+Date[\.:\s]+([\d/]+)"
-                    ], text)
-                    
-                    # ========== ORDER DETAILS ==========
-                    invoice_data["Purchase Order No"] = find_multi([
-                        r"(?:Cust|Customer|Buyer[^\n]*)\s*(?:PO|P\.O\.)\s+No[\.:\s]+([A-Z0-9\-]+)",
-                        r"PO\s+NO[\.:\-\s]+([A-Z0-9\-]+)",
-                        r"Buyer'?s?\s+Order\s+No[\.:\-\s]+([A-Z0-9\-]+)"
-                    ], text)
-                    
-                    invoice_data["Reference No"] = find_multi([
-                        r"(?:Our\s+)?Ref(?:erence)?[\.:\s]+No[\.:\s&]+Date[\.:\s]+([A-Z0-9]+)",
-                        r"Reference\s+No[\.:\s&]+Date[^\n]*?([A-Z0-9]+)\s+dt\.",
-                        r"Other\s+References[\.:\s]+([A-Z0-9\-]+)"
-                    ], text)
-                    
-                    invoice_data["Reference Date"] = find_multi([
-                        r"Reference\s+No[^d]+dt\.\s*([\d\-/A-Za-z]+)"
-                    ], text)
-                    
-                    # ========== DELIVERY/DISPATCH ==========
-                    invoice_data["Delivery Note No"] = find_multi([
-                        r"Delivery\s+(?:Note\s+)?No[\.:\s]+([A-Z0-9\-]+)",
-                        r"Dispatch\s+Doc\s+No[\.:\s]+([A-Z0-9\-]+)"
-                    ], text)
-                    
-                    invoice_data["Delivery Date"] = find_multi([
-                        r"Delivery\s+(?:Note\s+)?Date[\.:\s]+([\d/\-]+)",
-                        r"Delivery\s+No[^&\n]+&\s*([\d/]+)"
-                    ], text)
-                    
-                    invoice_data["Shipment No"] = find_multi([
-                        r"Shipment\s+No[\.:\s]+([A-Z0-9\-]+)"
-                    ], text)
-                    
-                    invoice_data["Shipment Date"] = find_multi([
-                        r"Shipment\s+No[^&\n]+&\s*([\d/]+)",
-                        r"Shipment\s+Date[\.:\s]+([\d/]+)"
-                    ], text)
-                    
-                    # ========== SELLER/SUPPLIER DETAILS ==========
-                    # Try to find seller name (could be individual or company)
-                    invoice_data["Seller Name"] = find_multi([
-                        r"^([A-Z][A-Z\s&\.]+(?:LIMITED|LTD|PVT|PRIVATE|LLP|ASSOCIATES|COMPANY))",
-                        r"(?:Seller|Supplier|From)[^\n:]*:\s*([A-Z][^\n]+(?:LIMITED|LTD|PVT))",
-                        r"^([A-Z]{2,}(?:\s+[A-Z]{2,})+)\n",  # Individual name in caps
-                        r"(STAR\s+CEMENT\s+LIMITED)"
-                    ], text)
-                    
-                    # Seller address/location
-                    invoice_data["Seller Address"] = find_multi([
-                        r"^[A-Z\s]+\n([A-Z][^\n]+)\n([A-Z][^\n]+)\n([A-Z][^\n,]+,\s*[A-Z\s]+-\s*\d{6})"
-                    ], text)
-                    
-                    invoice_data["Seller Location"] = find_multi([
-                        r"^[A-Z\s&]+\n[A-Z\s]+\n([A-Z\s,]+?)(?:,\s*[A-Z\s]+-\s*\d{6})",
-                        r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*),\s*([A-Z\s]+)-\s*(\d{6})"
-                    ], text)
-                    
-                    # Extract all GSTIN
-                    all_gstins = find_all_multi([
-                        r"GSTIN[/\\]?UIN[\.:\s]*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[0-9A-Z]{1}[Z]{1}[0-9A-Z]{1})",
-                        r"GSTIN\s+No[\.:\s]*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[0-9A-Z]{3})"
-                    ], text)
-                    
-                    if len(all_gstins) >= 1:
-                        invoice_data["Seller GSTIN"] = all_gstins[0]
-                    if len(all_gstins) >= 2:
-                        invoice_data["Customer GSTIN"] = all_gstins[1]
-                    if len(all_gstins) >= 3:
-                        invoice_data["Ship To GSTIN"] = all_gstins[2]
-                    
-                    # Extract all PIN codes
-                    all_pins = find_all_multi([
-                        r"PIN[\.:\s]+(\d{6})",
-                        r"\b(\d{6})\b"
-                    ], text)
-                    # Filter valid Indian PINs
-                    valid_pins = [p for p in all_pins if p.startswith(('1','2','3','4','5','6','7','8','9'))]
-                    if len(valid_pins) >= 1:
-                        invoice_data["Seller PIN"] = valid_pins[0]
-                    if len(valid_pins) >= 2:
-                        invoice_data["Customer PIN"] = valid_pins[1]
-                    
-                    # Extract State Codes
-                    all_state_codes = find_all_multi([
-                        r"(?:State\s+)?Code[\.:\s]*(\d{1,2})",
-                        r"State\s+Name[^\n]+Code[\.:\s]*(\d{1,2})"
-                    ], text)
-                    if len(all_state_codes) >= 1:
-                        invoice_data["Seller State Code"] = all_state_codes[0]
-                    if len(all_state_codes) >= 2:
-                        invoice_data["Customer State Code"] = all_state_codes[1]
-                    
-                    # Extract State Names
-                    all_states = find_all_multi([
-                        r"State\s+Name[\.:\s]*([A-Z][A-Za-z\s]+?)(?:,|Code|\d|$)",
-                        r"STATE[\.:\s]*([A-Z\s]+?)(?:\n|STATE CODE|GSTIN)"
-                    ], text)
-                    if len(all_states) >= 1:
-                        invoice_data["Seller State"] = all_states[0].strip()
-                    if len(all_states) >= 2:
-                        invoice_data["Customer State"] = all_states[1].strip()
-                    
-                    # ========== BUYER/CUSTOMER DETAILS ==========
-                    invoice_data["Buyer/Customer Name"] = find_multi([
-                        r"Buyer\s+Name[\.:\s]+([A-Z][^\n]+)",
-                        r"(?:Consignee|Customer|Bill\s+to)[^\n:]*:\s*([A-Z][^\n]+)",
-                        r"Name[^\n]*Customer[^\n:]*:\s*([^\n]+)"
-                    ], text)
-                    
-                    invoice_data["Buyer Address"] = find_multi([
-                        r"Buyer\s+Address[\.:\s]+([^\n]+(?:\n[^\n]+)*?)(?=\n(?:District|GSTIN))",
-                        r"(?:Consignee|Customer)\s+Address[\.:\s]+([^\n]+)"
-                    ], text)
-                    
-                    invoice_data["Ship To Name"] = find_multi([
-                        r"(?:Ship\s+to|Delivery\s+Address)[^\n:]*:\s*([A-Z][^\n]+)"
-                    ], text)
-                    
-                    # ========== TRANSPORT DETAILS ==========
-                    invoice_data["Mode of Transport"] = find_multi([
-                        r"Mode\s+of\s+Transport[\.:\s]+([A-Za-z]+)",
-                        r"Transport\s+Mode[\.:\s]+([A-Za-z]+)"
-                    ], text)
-                    
-                    # Transporter extraction
-                    transporter_line = find_multi([
-                        r"Transporter\s+Code\s*&\s*Name[\.:\s]+(\d+\s+[A-Z\s]+?)(?=\n|Vehicle|$)",
-                        r"Transporter[\.:\s]+([^\n]+)"
-                    ], text)
-                    
-                    if transporter_line and re.match(r'\d+\s+', transporter_line):
-                        parts = transporter_line.split(None, 1)
-                        if len(parts) >= 1:
-                            invoice_data["Transporter Code"] = parts[0]
-                        if len(parts) >= 2:
-                            invoice_data["Transporter Name"] = parts[1].strip()
-                    else:
-                        invoice_data["Transporter Name"] = transporter_line
-                    
-                    # ========== ADDITIONAL FIELDS FOR SIMPLE INVOICES ==========
-                    invoice_data["Vehicle No"] = find_multi([
-                        r"Vehicle\s+No[\.:\s]+([A-Z]{2}[-\s]?\d{2}[A-Z]{1,2}[-\s]?\d{4})",
-                        r"Vehicle\s+(?:Reg\.?\s+)?No[\.:\s]+([A-Z0-9\-]+)"
-                    ], text)
-                    
-                    invoice_data["Place of Supply"] = find_multi([
-                        r"Place\s+of\s+Supply[\.:\s]+([A-Z][^\n]+)"
-                    ], text)
-                    
-                    invoice_data["Order No"] = find_multi([
-                        r"Order\s+No[\.:\s]+([A-Z0-9]+)",
-                        r"Order\s+No[\.:\s]+([\d]+)"
-                    ], text)
-                    
-                    invoice_data["LR/RR No"] = find_multi([
-                        r"L[\.\/]?R[\.\/]?R\.?R[\.:\s]+No[\.:\s]+(\d+)",
-                        r"L\.R[\.:\s]+No[\.:\s]+(\d+)",
-                        r"Bill\s+of\s+Lading[\.:/]*LR-RR\s+No[\.:\s]+([A-Z0-9\-]+)"
-                    ], text)
-                    
-                    invoice_data["LR/RR Date"] = find_multi([
-                        r"L[\.\/]?R[\.\/]?R\.?R[\.:\s]+No[^&\n]+&\s*Date[\.:\s]+([\d/]+)",
-                        r"L\.R[\.:\s]+No[^&\n]+&\s*([\d/]+)"
-                    ], text)
-                    
-                    invoice_data["Route"] = find_multi([
-                        r"Route\s+Name[\.:\s]+([^\n]+?)(?=\n|Incoterms|$)",
-                        r"Route[\.:\s]+([^\n]+)"
-                    ], text)
-                    
-                    invoice_data["Destination"] = find_multi([
-                        r"Destination[\.:\s]+([A-Z0-9\s]+?)(?=\n|Batch|$)",
-                        r"Dispatched\s+through[\.:\s]+Destination[\.:\s]+([^\n]+)"
-                    ], text)
-                    
-                    invoice_data["Terms of Delivery"] = find_multi([
-                        r"Terms\s+of\s+Delivery[\.:\s]+([^\n]+)",
-                        r"Incoterms[\.:\s]+([^\n]+?)(?=\n|Terms|$)"
-                    ], text)
-                    
-                    invoice_data["Batch No"] = find_multi([
-                        r"Batch\s+No[\.:\s]+([A-Z0-9]+)"
-                    ], text)
-                    
-                    # ========== PAYMENT & FINANCIAL ==========
-                    invoice_data["Mode/Terms of Payment"] = find_multi([
-                        r"Mode[/\\]Terms\s+of\s+Payment[\.:\s]+([^\n]+)",
-                        r"Payment\s+Terms[\.:\s]+([^\n]+)"
-                    ], text)
-                    
-                    invoice_data["Taxable Amount"] = find_multi([
-                        r"Taxable\s+(?:Amount|Value)[\.:\s]*([\d,]+\.?\d*)",
-                        r"Total\s+Taxable[\.:\s]*([\d,]+\.?\d*)"
-                    ], text)
-                    
-                    invoice_data["CGST"] = find_multi([
-                        r"CGST[\.:\s]*([\d,]+\.?\d*)",
-                        r"Central\s+Tax[^\n]*Amount[\.:\s]*([\d,]+\.?\d*)"
-                    ], text)
-                    
-                    invoice_data["SGST"] = find_multi([
-                        r"SGST[\.:\s]*([\d,]+\.?\d*)",
-                        r"State\s+Tax[^\n]*Amount[\.:\s]*([\d,]+\.?\d*)"
-                    ], text)
-                    
-                    invoice_data["IGST Rate"] = find_multi([
-                        r"IGST[\.:\s@]*(\d+\.?\d*)%"
-                    ], text)
-                    
-                    invoice_data["IGST Amount"] = find_multi([
-                        r"IGST[\.:\s]*([\d,]+\.?\d*)",
-                        r"Integrated\s+Tax[^\n]+Amount[\.:\s]*([\d,]+\.?\d*)"
-                    ], text)
-                    
-                    invoice_data["TCS"] = find_multi([
-                        r"TCS[\.:\-\s]*([\d,]+\.?\d*)"
-                    ], text)
-                    
-                    invoice_data["Round Off"] = find_multi([
-                        r"ROUND(?:ED)?\s+OFF[\.:\s]*([\-\d,\.]+)",
-                        r"R[/\\]?OFF[\.:\s\-•]*([\-\d,\.]+)"
-                    ], text)
-                    
-                    invoice_data["Total Amount"] = find_multi([
-                        r"TOTAL[\.:\s]*([\d,]+\.?\d*)",
-                        r"Total\s+Invoice[\.:\s]*([\d,]+\.?\d*)",
-                        r"Grand\s+Total[\.:\s]*([\d,]+\.?\d*)",
-                        r"₹\s*([\d,]+\.?\d*)\s*$"
-                    ], text)
-                    
-                    invoice_data["Amount in Words"] = find_multi([
-                        r"(?:Total\s+)?(?:Invoice\s+)?(?:value\s+)?[Ii]n\s+words[\.:\s]*(.*?ONLY)",
-                        r"(?:INR|Rs\.?)\s+([A-Z][a-z]+.*?[Oo]nly)"
-                    ], text)
-                    
-                    invoice_data["Reverse Charge"] = find_multi([
-                        r"(?:Amount\s+of\s+Tax\s+)?Subject\s+[Tt]o\s+Reverse\s+Charge[\.:\s]*(YES|NO|Y|N)",
-                        r"Reverse\s+Charge[\.:\s]*(YES|NO|Y|N)"
-                    ], text)
-                    
-                    # ========== ADDITIONAL INFO ==========
-                    invoice_data["Freight"] = find_multi([
-                        r"FREIGHT[\.:\-\s]*([\d,]+\.?\d*)"
-                    ], text)
-                    
-                    invoice_data["POD"] = find_multi([
-                        r"POD[\.:\s]+([^\n]+)"
-                    ], text)
-                    
-                    # -------------------------------------------------
-                    # UNIVERSAL LINE ITEMS EXTRACTION
-                    # -------------------------------------------------
-                    line_items = []
-                    
-                    # Multiple pattern attempts for different formats
-                    patterns = [
-                        # Format 1: Simple vendor invoice (Challan/Material based)
-                        re.compile(
-                            r"(?P<sl>\d+)\s+"
-                            r"(?P<challan>\d+)\s+"
-                            r"(?P<date>[\d\-/]+)\s+"
-                            r"(?P<vehicle>[A-Z]{2}[-\s]?\d{2}[A-Z]{1,2}[-\s]?\d{4})\s+"
-                            r"(?P<material>[A-Z][A-Z\s]+?)\s+"
-                            r"(?P<qty>[\d,]+\.?\d*)\s+"
-                            r"(?P<rate>[\d,]+\.?\d*)\s+"
-                            r"(?P<amount>[\d,]+\.?\d*)",
-                            re.IGNORECASE
-                        ),
-                        # Format 2: Corporate B2B with HSN (ICA style) - handles multi-line descriptions
-                        re.compile(
-                            r"(?P<sl>\d+)\s+"
-                            r"(?P<hsn>\d{8})\s+"
-                            r"(?P<description>.+?)\s+"
-                            r"(?P<qty>[\d,]+\.?\d*)\s+(?P<uom>PCS|MT|KG|TON|UNIT)\s+"
-                            r"(?P<rate>[\d,]+\.?\d*)\s+"
-                            r"(?P<per>PCS|MT|KG|TON|UNIT)\s+"
-                            r"(?P<amount>[\d,]+\.?\d*)",
-                            re.IGNORECASE | re.DOTALL
-                        ),
-                        # Format 3: Star Cement corporate style
-                        re.compile(
-                            r"(?P<sl>\d+)\s+"
-                            r"(?P<description>(?:CEMENT|CLINKER|GRADE)[^\n]+?)\s+"
-                            r"(?P<hsn>\d{6,8})\s+"
-                            r"(?P<qty>[\d,]+\.?\d*)\s+(?P<uom>[A-Z]{2,3})\s+"
-                            r"(?P<rate>[\d,]+\.?\d*)",
-                            re.IGNORECASE
-                        ),
-                        # Format 4: With package info
-                        re.compile(
-                            r"(?P<description>(?:CEMENT|CLINKER)[^\n]*?)\s+"
-                            r"(?P<hsn>\d{6,8})\s+"
-                            r"(?P<package>[A-Z]+)\s+"
-                            r"(?P<bags>[\d,]*)\s*"
-                            r"(?P<uom>[A-Z]{2})\s+"
-                            r"(?P<qty>[\d,.]+)\s+"
-                            r"(?P<rate>[\d,.]+)",
-                            re.IGNORECASE
-                        ),
-                        # Format 5: Standard GST invoice table
-                        re.compile(
-                            r"(?P<sl>\d+)\s+"
-                            r"(?P<description>[A-Z][A-Z\s,\-:]+?)\s+"
-                            r"(?P<hsn>\d{6,8})\s+"
-                            r"(?P<qty>[\d,]+\.?\d*)\s+"
-                            r"(?P<rate>[\d,]+\.?\d*)\s+"
-                            r"(?P<per>[A-Z]{2,3})\s+"
-                            r"(?P<amount>[\d,]+\.?\d*)",
-                            re.IGNORECASE
-                        ),
-                        # Format 6: Fallback - any row with quantity and amount
-                        re.compile(
-                            r"(?P<description>[A-Z][A-Z\s]+(?:SAND|CEMENT|CLINKER|MATERIAL|MOTOR)[^\d\n]*?)\s+"
-                            r"(?P<qty>[\d,]+\.?\d*)\s+"
-                            r"(?P<rate>[\d,]+\.?\d*)\s+"
-                            r"(?P<amount>[\d,]+\.?\d*)",
-                            re.IGNORECASE
-                        )
-                    ]
-                    
-                    for pattern in patterns:
-                        matches = list(pattern.finditer(text))
-                        if matches:
-                            for match in matches:
-                                item = {}
-                                try:
-                                    groups = match.groupdict()
-                                    
-                                    if "sl" in groups and groups["sl"]:
-                                        item["Sl No"] = groups["sl"]
-                                    if "challan" in groups and groups["challan"]:
-                                        item["Challan No"] = groups["challan"]
-                                    if "date" in groups and groups["date"]:
-                                        item["Date"] = groups["date"]
-                                    if "vehicle" in groups and groups["vehicle"]:
-                                        item["Vehicle No"] = groups["vehicle"]
-                                    if "material" in groups and groups["material"]:
-                                        # Clean up material description
-                                        material_desc = groups["material"].strip()
-                                        item["Material/Description"] = material_desc
-                                    if "description" in groups and groups["description"]:
-                                        # Clean multi-line descriptions
-                                        desc = groups["description"].strip()
-                                        desc = re.sub(r'\s+', ' ', desc)  # Collapse whitespace
-                                        item["Description"] = desc
-                                    if "hsn" in groups and groups["hsn"]:
-                                        item["HSN/SAC"] = groups["hsn"]
-                                    if "qty" in groups:
-                                        item["Quantity"] = groups["qty"]
-                                    if "uom" in groups and groups["uom"]:
-                                        item["UOM"] = groups["uom"]
-                                    if "rate" in groups:
-                                        item["Rate"] = groups["rate"]
-                                    if "per" in groups and groups["per"]:
-                                        item["Per"] = groups["per"]
-                                    if "amount" in groups:
-                                        item["Amount"] = groups["amount"]
-                                    if "package" in groups and groups.get("package"):
-                                        item["Package"] = groups["package"]
-                                    if "bags" in groups and groups.get("bags"):
-                                        item["No of Bags"] = groups["bags"]
-                                    
-                                    if item and len(item) >= 3:  # At least 3 fields
-                                        line_items.append(item)
-                                except Exception as e:
-                                    continue
-                            
-                            if line_items:
-                                break
-                    
-                    # -------------------------------------------------
-                    # FALLBACK: Manual parsing for broken table layouts
-                    # -------------------------------------------------
-                    if not line_items:
-                        # Try to find HSN codes and reconstruct items
-                        hsn_codes = re.findall(r'\b(\d{8})\b', text)
-                        
-                        if hsn_codes:
-                            # Find all amounts that look like prices
-                            amounts = re.findall(r'([\d,]+\.\d{2})', text)
-                            
-                            # Find quantities with units
-                            qty_matches = re.findall(r'(\d+)\s+(PCS|MT|KG|TON)', text, re.IGNORECASE)
-                            
-                            # Try to match them up
-                            for i, hsn in enumerate(hsn_codes):
-                                if i < len(qty_matches) and i < len(amounts):
-                                    item = {
-                                        "Sl No": str(i + 1),
-                                        "HSN/SAC": hsn,
-                                        "Quantity": qty_matches[i][0],
-                                        "UOM": qty_matches[i][1],
-                                        "Amount": amounts[i] if i < len(amounts) else ""
-                                    }
-                                    
-                                    # Try to find description near HSN
-                                    hsn_pos = text.find(hsn)
-                                    if hsn_pos > 0:
-                                        # Look for MOTOR/CEMENT/etc before HSN
-                                        before_hsn = text[max(0, hsn_pos-200):hsn_pos]
-                                        desc_match = re.search(r'(MOTOR[^\n]{0,80}|CEMENT[^\n]{0,80}|CLINKER[^\n]{0,80})', before_hsn, re.IGNORECASE)
-                                        if desc_match:
-                                            item["Description"] = desc_match.group(1).strip()
-                                    
-                                    if len(item) >= 3:
-                                        line_items.append(item)
+                    rule_timings = []
+                    invoice_data = invoice.extract_invoice_fields(extracted_text, rule_timings)
+                    # Table layout from the text layer first, text rules as fallback
+                    layout_pdf = searchable.pdf if searchable is not None else uploaded_file.getvalue()
+                    line_items = (
+                        result_cache.call(invoice_table.extract_line_items, layout_pdf)
+                        or invoice.extract_line_items(extracted_text, rule_timings)
+                    )
                     
                     # -------------------------------------------------
                     # DISPLAY EXTRACTED DATA
                     # -------------------------------------------------
                     # Remove empty values and create DataFrame
-                    header_df = pd.DataFrame([
-                        {"Field": k, "Value": v} 
-                        for k, v in invoice_data.items() 
-                        if v and str(v).strip()
-                    ])
+                    header_df = invoice.header_table(invoice_data)
                     
                     st.markdown("### 🧾 Invoice Header Information")
                     if not header_df.empty:
@@ -1193,6 +968,15 @@ elif feature == "📝 Extract Text":
                     else:
                         st.warning("⚠️ No line items detected")
                     
+                    slow = slow_rules(rule_timings)
+                    if slow:
+                        with st.expander(f"⏱️ {len(slow)} slow or skipped extraction rule(s)"):
+                            st.caption("Skipped rules ran out of their time budget and left their field empty.")
+                            st.dataframe(pd.DataFrame([
+                                {"Rule": t.rule, "Seconds": round(t.seconds, 3), "Skipped": t.skipped}
+                                for t in slow
+                            ]), use_container_width=True)
+
                     # Show raw text for debugging
                     with st.expander("🔍 View Extracted Text (for debugging)"):
                         st.text_area("Raw Text", extracted_text, height=300)
@@ -1200,25 +984,11 @@ elif feature == "📝 Extract Text":
                     # -------------------------------------------------
                     # EXPORT TO EXCEL
                     # -------------------------------------------------
-                    excel_buffer = io.BytesIO()
-                    
-                    with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-                        if not header_df.empty:
-                            header_df.to_excel(writer, sheet_name="Invoice_Header", index=False)
-                        
-                        if line_items:
-                            items_df = pd.DataFrame(line_items)
-                            items_df.to_excel(writer, sheet_name="Line_Items", index=False)
-                        
-                        # Add raw text for reference
-                        raw_df = pd.DataFrame({"Extracted_Text": [extracted_text]})
-                        raw_df.to_excel(writer, sheet_name="Raw_Text", index=False)
-                    
-                    excel_buffer.seek(0)
+                    excel_bytes = invoice.to_excel(invoice_data, line_items, extracted_text)
                     
                     st.download_button(
                         label="⬇️ Download Invoice Data (Excel)",
-                        data=excel_buffer,
+                        data=excel_bytes,
                         file_name="invoice_extracted_data.xlsx",
                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                         use_container_width=True
@@ -1238,117 +1008,19 @@ elif feature == "🖼️ Extract Images":
     st.header("🖼️ Extract Images from PDF")
     st.write("Extract embedded images (logos, photos). Auto-fallback for scanned PDFs.")
 
-    uploaded_file = st.file_uploader("Choose a PDF file", type=["pdf"])
+    uploaded_file = pdf_uploader("Choose a PDF file")
 
     if uploaded_file:
         try:
-            reader = PyPDF2.PdfReader(uploaded_file)
-
-            extracted_images = []
-            detected_images = 0
-            zip_buffer = io.BytesIO()
-
             # ==================================================
             # STEP 1: TRY EMBEDDED IMAGE EXTRACTION (PyPDF2)
+            # STEP 2: FALLBACK FOR SCANNED PDFs (full-page renders)
             # ==================================================
             with st.spinner("Scanning PDF for embedded images..."):
-                for page_num, page in enumerate(reader.pages, start=1):
-
-                    resources = page.get("/Resources")
-                    if not resources:
-                        continue
-
-                    xobjects = resources.get("/XObject")
-                    if not xobjects:
-                        continue
-
-                    xobjects = xobjects.get_object()
-
-                    for obj_name in xobjects:
-                        obj = xobjects[obj_name]
-
-                        if obj.get("/Subtype") != "/Image":
-                            continue
+                extracted_images, scanned = result_cache.call(pdf_ops.extract_images, uploaded_file.getvalue())
 
-                        detected_images += 1
-
-                        try:
-                            data = obj.get_data()
-
-                            filters = obj.get("/Filter")
-                            if filters and not isinstance(filters, list):
-                                filters = [filters]
-                            elif not filters:
-                                filters = []
-
-                            image_name = f"page_{page_num}_{obj_name[1:]}"
-                            img = None
-
-                            # JPEG / JPEG2000
-                            if "/DCTDecode" in filters or "/JPXDecode" in filters:
-                                img = Image.open(io.BytesIO(data)).convert("RGB")
-
-                            # RAW bitmap (logos, stamps)
-                            else:
-                                width = obj.get("/Width")
-                                height = obj.get("/Height")
-
-                                if not width or not height:
-                                    continue
-
-                                color_space = obj.get("/ColorSpace")
-
-                                if isinstance(color_space, list) and color_space[0] == "/ICCBased":
-                                    mode = "RGB"
-                                elif color_space == "/DeviceRGB":
-                                    mode = "RGB"
-                                elif color_space == "/DeviceCMYK":
-                                    mode = "CMYK"
-                                elif color_space == "/DeviceGray":
-                                    mode = "L"
-                                else:
-                                    continue
-
-                                try:
-                                    img = Image.frombytes(mode, (width, height), data)
-                                except Exception:
-                                    continue
-
-                            if img:
-                                buf = io.BytesIO()
-                                img.save(buf, format="PNG")
-                                buf.seek(0)
-
-                                extracted_images.append({
-                                    "name": f"{image_name}.png",
-                                    "data": buf.getvalue(),
-                                    "page": page_num
-                                })
-
-                        except Exception:
-                            continue
-
-            # ==================================================
-            # STEP 2: FALLBACK FOR SCANNED PDFs (pdf2image)
-            # ==================================================
-            if detected_images == 0 or not extracted_images:
-                st.info("ℹ️ No embedded images found. PDF appears scanned. Extracting full-page images...")
-
-                from pdf2image import convert_from_bytes
-
-                pages = convert_from_bytes(uploaded_file.getvalue(), dpi=300)
-
-                extracted_images = []
-                for i, page_img in enumerate(pages, start=1):
-                    buf = io.BytesIO()
-                    page_img.save(buf, format="PNG")
-                    buf.seek(0)
-
-                    extracted_images.append({
-                        "name": f"page_{i}.png",
-                        "data": buf.getvalue(),
-                        "page": i
-                    })
+            if scanned:
+                st.info("ℹ️ No embedded images found. PDF appears scanned. Extracted full-page images.")
 
             # ==================================================
             # RESULTS
@@ -1366,28 +1038,22 @@ elif feature == "🖼️ Extract Images":
             for idx, img in enumerate(extracted_images):
                 with cols[idx % 3]:
                     st.image(
-                        img["data"],
-                        caption=f"{img['name']} (Page {img['page']})",
+                        img.data,
+                        caption=f"{img.name} (Page {img.page})",
                         use_column_width=True
                     )
 
                     st.download_button(
                         "⬇️ Download",
-                        data=img["data"],
-                        file_name=img["name"],
-                        mime="image/png",
+                        data=img.data,
+                        file_name=img.name,
+                        mime=img.mime,
                         use_container_width=True
                     )
 
-            with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-                for img in extracted_images:
-                    zf.writestr(img["name"], img["data"])
-
-            zip_buffer.seek(0)
-
             st.download_button(
                 "📦 Download All Images as ZIP",
-                data=zip_buffer,
+                data=lambda: read_spooled(build_archive((img.name, img.data) for img in extracted_images)),
                 file_name="extracted_images.zip",
                 mime="application/zip",
                 use_container_width=True
@@ -1404,7 +1070,7 @@ elif feature == "🗜️ Compress PDF":
     st.header("🗜️ Compress PDF Size")
     st.write("Choose compression level based on quality vs file size.")
 
-    uploaded_file = st.file_uploader("Choose a PDF file", type=["pdf"])
+    uploaded_file = pdf_uploader("Choose a PDF file")
 
     if uploaded_file:
         original_bytes = uploaded_file.getvalue()
@@ -1423,59 +1089,31 @@ elif feature == "🗜️ Compress PDF":
                 "Text may not remain selectable."
             )
 
+        level = {
+            "Low (best quality)": pdf_ops.COMPRESS_LOW,
+            "Medium (balanced)": pdf_ops.COMPRESS_MEDIUM,
+            "High (smallest size)": pdf_ops.COMPRESS_HIGH,
+        }[compression_level]
+        compress_key = (uploaded_file.file_id, level)
+
         if st.button("🗜️ Compress PDF", use_container_width=True):
+            start_job(
+                "compress", "Compressing PDF",
+                background.cached_job, result_cache, pdf_ops.compress, original_bytes, level,
+                key=compress_key
+            )
+
+        job = slot_job("compress", compress_key)
+        if job is not None and job.status == background.CANCELLED:
+            st.warning("⏹️ Compression cancelled.")
+        elif job is not None and job.status == background.FAILED:
+            st.error(f"❌ Compression failed: {job.error}")
+        elif job is not None and job.status == background.DONE:
             try:
-                with st.spinner("Compressing PDF..."):
-
-                    # ---------- LOW: TEXT STREAM ----------
-                    reader = PyPDF2.PdfReader(io.BytesIO(original_bytes))
-                    writer = PyPDF2.PdfWriter()
-
-                    for page in reader.pages:
-                        page.compress_content_streams()
-                        writer.add_page(page)
-
-                    low_out = io.BytesIO()
-                    writer.write(low_out)
-                    low_bytes = low_out.getvalue()
-                    low_size = len(low_bytes) / 1024
-
-                    # ---------- IMAGE RASTER (Medium / High) ----------
-                    def raster_compress(dpi, quality):
-                        images = convert_from_bytes(original_bytes, dpi=dpi)
-                        img_buffers = []
-
-                        for img in images:
-                            buf = io.BytesIO()
-                            img.convert("RGB").save(
-                                buf,
-                                format="JPEG",
-                                quality=quality,
-                                optimize=True
-                            )
-                            img_buffers.append(buf.getvalue())
-
-                        out = io.BytesIO()
-                        out.write(img2pdf.convert(img_buffers))
-                        out.seek(0)
-                        return out.getvalue(), len(out.getvalue()) / 1024
-
-                    final_bytes = low_bytes
-                    final_size = low_size
-                    method = "Text stream compression"
-
-                    if compression_level == "Medium (balanced)":
-                        img_bytes, img_size = raster_compress(dpi=150, quality=70)
-                        if img_size < final_size:
-                            final_bytes = img_bytes
-                            final_size = img_size
-                            method = "Medium raster compression"
-
-                    elif compression_level == "High (smallest size)":
-                        img_bytes, img_size = raster_compress(dpi=72, quality=45)
-                        final_bytes = img_bytes
-                        final_size = img_size
-                        method = "Forced raster compression"
+                result = job.result
+                final_bytes = result.data
+                final_size = len(final_bytes) / 1024
+                method = result.method
 
                 reduction = ((original_size - final_size) / original_size) * 100
 
@@ -1497,7 +1135,7 @@ elif feature == "📸 PDF to Images":
     st.header("📸 Convert PDF to Images")
     st.write("Convert each page of a PDF into image files.")
 
-    uploaded_file = st.file_uploader("Choose a PDF file", type=["pdf"])
+    uploaded_file = pdf_uploader("Choose a PDF file")
 
     if uploaded_file:
         col1, col2 = st.columns(2)
@@ -1506,19 +1144,37 @@ elif feature == "📸 PDF to Images":
         with col2:
             dpi = st.slider("Quality (DPI)", 72, 300, 150)
 
+        images_key = (uploaded_file.file_id, dpi, image_format)
+
         if st.button("📸 Convert to Images", use_container_width=True):
+            start_job(
+                "to_images", "Converting pages to images",
+                background.pdf_to_images_job, result_cache, uploaded_file.getvalue(), dpi, image_format,
+                key=images_key
+            )
+
+        job = slot_job("to_images", images_key)
+        if job is not None and job.finished:
             try:
-                with st.spinner("Converting PDF pages to images..."):
-                    images = convert_from_bytes(
-                        uploaded_file.getvalue(),
-                        dpi=dpi
-                    )
+                if job.status == background.DONE:
+                    images = job.result
+                else:
+                    # Cancelled or failed: keep the pages converted before it stopped
+                    images = list(job.partial)
+                    if job.status == background.FAILED:
+                        st.error(f"❌ Failed to convert PDF to images: {job.error}")
+                    else:
+                        st.warning("⏹️ Conversion cancelled.")
+                    if images:
+                        st.info(f"ℹ️ {len(images)} page(s) were converted before it stopped.")
 
                 if not images:
-                    st.error("❌ No pages could be converted.")
+                    if job.status == background.DONE:
+                        st.error("❌ No pages could be converted.")
                     st.stop()
 
-                st.success(f"✅ Converted {len(images)} pages successfully!")
+                if job.status == background.DONE:
+                    st.success(f"✅ Converted {len(images)} pages successfully!")
 
                 # ===============================
                 # PREVIEW AS THUMBNAILS (GRID)
@@ -1526,71 +1182,40 @@ elif feature == "📸 PDF to Images":
                 st.markdown("### 🖼️ Image Preview & Download")
 
                 cols_per_row = 3
-                zip_buffer = io.BytesIO()
 
-                with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-
-                    for idx in range(0, len(images), cols_per_row):
-                        cols = st.columns(cols_per_row)
+                for idx in range(0, len(images), cols_per_row):
+                    cols = st.columns(cols_per_row)
 
-                        for col_idx in range(cols_per_row):
-                            page_index = idx + col_idx
-                            if page_index >= len(images):
-                                continue
-
-                            img = images[page_index]
-                            page_no = page_index + 1
+                    for col_idx in range(cols_per_row):
+                        page_index = idx + col_idx
+                        if page_index >= len(images):
+                            continue
 
-                            # --------- Thumbnail (small preview) ---------
-                            thumb = img.copy()
-                            thumb.thumbnail((350, 350))  # SMALL preview size
+                        img = images[page_index]
 
-                            with cols[col_idx]:
-                                st.markdown(f"**Page {page_no}**")
-                                st.image(thumb)
-
-                                # --------- Full-resolution image for download ---------
-                                full_img_buffer = io.BytesIO()
-
-                                if image_format == "PNG":
-                                    img.save(full_img_buffer, format="PNG")
-                                    ext = "png"
-                                    mime = "image/png"
-                                else:
-                                    img.convert("RGB").save(
-                                        full_img_buffer,
-                                        format="JPEG",
-                                        quality=90
-                                    )
-                                    ext = "jpg"
-                                    mime = "image/jpeg"
-
-                                full_img_buffer.seek(0)
-
-                                # Individual download button (FIXED)
-                                st.download_button(
-                                    label="⬇️ Download",
-                                    data=full_img_buffer.getvalue(),
-                                    file_name=f"page_{page_no}.{ext}",
-                                    mime=mime,
-                                    key=f"download_img_{page_no}",
-                                    use_container_width=True
-                                )
+                        # --------- Thumbnail (small preview) ---------
+                        thumb = pdf_ops.make_thumbnail(img.data, (350, 350))
 
-                                # Add to ZIP
-                                zip_file.writestr(
-                                    f"page_{page_no}.{ext}",
-                                    full_img_buffer.getvalue()
-                                )
+                        with cols[col_idx]:
+                            st.markdown(f"**Page {img.page}**")
+                            st.image(thumb)
 
-                zip_buffer.seek(0)
+                            # Individual download button (FIXED)
+                            st.download_button(
+                                label="⬇️ Download",
+                                data=img.data,
+                                file_name=img.name,
+                                mime=img.mime,
+                                key=f"download_img_{img.page}",
+                                use_container_width=True
+                            )
 
                 # ===============================
                 # ZIP DOWNLOAD
                 # ===============================
                 st.download_button(
                     label="📦 Download All Images as ZIP",
-                    data=zip_buffer.getvalue(),
+                    data=lambda: read_spooled(build_archive((img.name, img.data) for img in images)),
                     file_name="pdf_images.zip",
                     mime="application/zip",
                     use_container_width=True
@@ -1605,7 +1230,7 @@ elif feature == "✨ Highlight Text":
     st.header("Highlight Text (Visual Editor)")
     st.write("Visually annotate PDFs with pen, colors, eraser, undo and page navigation.")
 
-    uploaded_file = st.file_uploader("Upload a PDF", type=["pdf"])
+    uploaded_file = pdf_uploader("Upload a PDF")
 
     if uploaded_file:
         import base64
@@ -1840,12 +1465,11 @@ elif feature == "🔀 Reorder Pages":
     st.header("🔀 Reorder PDF Pages")
     st.write("Change the order of pages and preview before downloading.")
 
-    uploaded_file = st.file_uploader("Choose a PDF file", type=["pdf"])
+    uploaded_file = pdf_uploader("Choose a PDF file")
 
     if uploaded_file:
         try:
-            reader = PyPDF2.PdfReader(uploaded_file)
-            total_pages = len(reader.pages)
+            total_pages = result_cache.call(pdf_ops.page_count, uploaded_file.getvalue())
 
             st.info(f"📄 Total pages: {total_pages}")
 
@@ -1868,29 +1492,21 @@ elif feature == "🔀 Reorder Pages":
                         page_numbers = [
                             int(p.strip()) for p in page_order_input.split(",")
                         ]
+                    except ValueError:
+                        st.error("❌ Only numbers and commas are allowed.")
+                        page_numbers = None
 
-                        # Validation
-                        if len(page_numbers) != total_pages:
-                            st.error("❌ Page count mismatch.")
-                        elif sorted(page_numbers) != list(range(1, total_pages + 1)):
-                            st.error("❌ Invalid page numbers or duplicates detected.")
-                        else:
-                            writer = PyPDF2.PdfWriter()
-
-                            for p in page_numbers:
-                                writer.add_page(reader.pages[p - 1])
-
-                            output = io.BytesIO()
-                            writer.write(output)
-                            output.seek(0)
-
-                            # Save for preview & download
-                            st.session_state.reordered_pdf = output.getvalue()
+                    if page_numbers:
+                        try:
+                            # Validation (count, range, duplicates) happens in reorder()
+                            st.session_state.reordered_pdf = pdf_ops.reorder(
+                                uploaded_file.getvalue(), page_numbers
+                            )
 
                             st.success("✅ Pages reordered successfully!")
 
-                    except ValueError:
-                        st.error("❌ Only numbers and commas are allowed.")
+                        except ValueError as e:
+                            st.error(f"❌ {e}")
 
         except Exception as e:
             st.error(f"❌ Error reading PDF: {str(e)}")
@@ -1910,7 +1526,8 @@ elif feature == "🔀 Reorder Pages":
         )
 
         try:
-            images = convert_from_bytes(
+            images = result_cache.call(
+                pdf_ops.render_preview,
                 st.session_state.reordered_pdf,
                 dpi=90,
                 first_page=1,
@@ -1959,11 +1576,7 @@ if feature == "✍️ Sign PDF":
     col1, col2 = st.columns(2)
 
     with col1:
-        pdf_file = st.file_uploader(
-            "📄 Upload PDF",
-            type=["pdf"],
-            key="sign_pdf_upload"
-        )
+        pdf_file = pdf_uploader("📄 Upload PDF", key="sign_pdf_upload")
 
     with col2:
         sig_file = st.file_uploader(
@@ -2417,14 +2030,9 @@ elif feature == "🔐 Protect PDF":
         "(if you know the password)."
     )
 
-    uploaded_file = st.file_uploader(
-        "Upload PDF file",
-        type=["pdf"]
-    )
+    uploaded_file = pdf_uploader("Upload PDF file")
 
     if uploaded_file:
-        from PyPDF2 import PdfReader, PdfWriter
-
         action = st.radio(
             "Select action",
             [
@@ -2449,24 +2057,14 @@ elif feature == "🔐 Protect PDF":
                     st.stop()
 
                 try:
-                    reader = PdfReader(uploaded_file)
-                    writer = PdfWriter()
-
-                    for page in reader.pages:
-                        writer.add_page(page)
-
                     # Simple, reliable encryption
-                    writer.encrypt(user_password=user_pwd)
-
-                    output = io.BytesIO()
-                    writer.write(output)
-                    output.seek(0)
+                    protected = pdf_ops.protect(uploaded_file.getvalue(), user_pwd)
 
                     st.success("✅ PDF protected successfully!")
 
                     st.download_button(
                         label="⬇️ Download Protected PDF",
-                        data=output.getvalue(),
+                        data=protected,
                         file_name="protected.pdf",
                         mime="application/pdf",
                         use_container_width=True
@@ -2491,26 +2089,17 @@ elif feature == "🔐 Protect PDF":
                     st.stop()
 
                 try:
-                    reader = PdfReader(uploaded_file)
-
-                    if reader.is_encrypted:
-                        if reader.decrypt(current_pwd) == 0:
-                            st.error("❌ Incorrect password.")
-                            st.stop()
-
-                    writer = PdfWriter()
-                    for page in reader.pages:
-                        writer.add_page(page)
-
-                    output = io.BytesIO()
-                    writer.write(output)
-                    output.seek(0)
+                    try:
+                        unlocked = pdf_ops.unlock(uploaded_file.getvalue(), current_pwd)
+                    except ValueError:
+                        st.error("❌ Incorrect password.")
+                        st.stop()
 
                     st.success("✅ Password removed successfully!")
 
                     st.download_button(
                         label="⬇️ Download Unprotected PDF",
-                        data=output.getvalue(),
+                        data=unlocked,
                         file_name="unlocked.pdf",
                         mime="application/pdf",
                         use_container_width=True
@@ -2532,19 +2121,30 @@ elif feature == "🛑 Redact PDF":
 
     st.warning("⚠️ Redaction is permanent and cannot be undone.")
 
-    uploaded_file = st.file_uploader("Upload PDF", type=["pdf"])
+    uploaded_file = pdf_uploader("Upload PDF")
 
     if uploaded_file:
         import base64
-        import tempfile
         import json
-        import fitz  # PyMuPDF
         import streamlit.components.v1 as components
 
         # --------------------------------------------------
         # Read PDF
         # --------------------------------------------------
         pdf_bytes = uploaded_file.read()
+
+        # Scanned pages have no text to find; give them an OCR text layer
+        scanned = result_cache.call(pdf_ops.scanned_pages, pdf_bytes)
+        if scanned:
+            st.info(f"ℹ️ {len(scanned)} page(s) have no text layer (scanned): "
+                    + ", ".join(map(str, scanned)))
+            if st.checkbox("🔎 Run OCR on scanned pages so their text can be found and redacted"):
+                try:
+                    with st.spinner("Running OCR on scanned pages..."):
+                        pdf_bytes = result_cache.call(pdf_ops.searchable_pdf, pdf_bytes, dpi=300).pdf
+                except Exception as e:
+                    st.error(f"❌ OCR Error: {str(e)}")
+
         pdf_b64 = base64.b64encode(pdf_bytes).decode("utf-8")
 
         # --------------------------------------------------
@@ -2750,26 +2350,7 @@ pdfjsLib.getDocument({ data: pdfData }).promise.then(async pdf => {
                 st.warning("⚠️ Please enter text to redact.")
                 st.stop()
 
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(pdf_bytes)
-                input_path = tmp.name
-
-            doc = fitz.open(input_path)
-            total = 0
-
-            for page in doc:
-                for term in terms:
-                    for inst in page.search_for(term):
-                        page.add_redact_annot(inst, fill=(0, 0, 0))
-                        total += 1
-                page.apply_redactions()
-
-            output_path = input_path.replace(".pdf", "_redacted.pdf")
-            doc.save(output_path)
-            doc.close()
-
-            with open(output_path, "rb") as f:
-                redacted_bytes = f.read()
+            redacted_bytes, total = pdf_ops.redact(pdf_bytes, terms)
 
             st.success(f"✅ Redacted {total} exact match(es).")
 
@@ -2783,6 +2364,108 @@ pdfjsLib.getDocument({ data: pdfData }).promise.then(async pdf => {
 
 
 
+# ======================================================
+# Feature: Pipeline (several operations, one read + one write)
+# ======================================================
+elif feature == "⛓️ Pipeline":
+    st.header("⛓️ Operation Pipeline")
+    st.write(
+        "Queue several operations and run them on one upload. The PDF is "
+        "read once and written once, however many steps are queued."
+    )
+
+    steps = st.session_state.setdefault("pipeline_steps", [])
+
+    uploaded_file = pdf_uploader("Choose a PDF file")
+
+    # ---------------- ADD A STEP ----------------
+    st.markdown("### ➕ Add a step")
+    step_type = st.selectbox(
+        "Operation",
+        ["🔄 Rotate", "💧 Watermark", "🗜️ Compress (lossless)", "🔐 Protect"]
+    )
+
+    new_step = None
+    if step_type == "🔄 Rotate":
+        col1, col2 = st.columns(2)
+        with col1:
+            angle = st.selectbox("Rotation angle", [90, 180, 270])
+        with col2:
+            pages_spec = st.text_input("Pages (blank = all)", placeholder="1,3,5-7")
+        try:
+            pages = tuple(pdf_ops.parse_page_list(pages_spec)) if pages_spec.strip() else None
+            new_step = pipeline.RotateStep(angle, pages)
+        except ValueError:
+            st.warning("⚠️ Use page numbers like 1,3,5-7")
+
+    elif step_type == "💧 Watermark":
+        watermark_text = st.text_input("Watermark text", placeholder="CONFIDENTIAL")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            font_size = st.slider("Font size", 20, 120, 48)
+        with col2:
+            opacity = st.slider("Opacity", 0.05, 0.9, 0.25)
+        with col3:
+            rotation = st.slider("Rotation angle", -90, 90, 45)
+        if watermark_text.strip():
+            new_step = pipeline.WatermarkStep(pdf_ops.WatermarkSpec(
+                text=watermark_text,
+                font_size=font_size,
+                opacity=opacity,
+                rotation=rotation
+            ))
+
+    elif step_type == "🗜️ Compress (lossless)":
+        st.caption("Raster compression re-renders pages and is only available in 🗜️ Compress PDF.")
+        new_step = pipeline.CompressStep()
+
+    else:
+        password = st.text_input("Password", type="password")
+        if password:
+            new_step = pipeline.EncryptStep(password)
+        st.caption("The password is applied when the file is written, after every other step.")
+
+    if st.button("➕ Add to pipeline", use_container_width=True, disabled=new_step is None):
+        steps.append(new_step)
+        st.rerun()
+
+    # ---------------- QUEUE ----------------
+    st.markdown("### 📋 Queued steps")
+    if not steps:
+        st.info("No steps queued yet.")
+
+    for i, step in enumerate(steps):
+        col1, col2 = st.columns([6, 1])
+        with col1:
+            st.write(f"{i + 1}. {step.describe()}")
+        with col2:
+            if st.button("🗑️", key=f"pipeline_remove_{i}"):
+                del steps[i]
+                st.rerun()
+
+    if steps and st.button("🧹 Clear pipeline"):
+        steps.clear()
+        st.rerun()
+
+    # ---------------- RUN ----------------
+    if uploaded_file and steps:
+        if st.button("▶️ Run Pipeline", use_container_width=True):
+            try:
+                started = time.perf_counter()
+                result = result_cache.call(
+                    pipeline.run_pipeline,
+                    uploaded_file.getvalue(),
+                    tuple(steps)
+                )
+                elapsed = time.perf_counter() - started
+
+                st.success(f"✅ {len(steps)} step(s) applied in {elapsed:.2f}s")
+                create_download_button(result, "pipeline_output.pdf", "⬇️ Download Result")
+
+            except Exception as e:
+                st.error(f"❌ Error: {str(e)}")
+
+
 #######################################################################
 
 
@@ -2791,7 +2474,7 @@ st.markdown("---")
 st.markdown("""
 <div style='text-align: center; color: #666;'>
     <p>📄 Stat Cement PDF Editor Pro </p>
-    <p>💡 All processing happens securely on the server. Files are not stored </p>
+    <p>💡 All processing happens securely on the server. Uploads stay in your session's local workspace </p>
 </div>
 
 """, unsafe_allow_html=True)
@@ -0,0 +1,107 @@
+"""
+Streaming ZIP builder for bulk downloads.
+
+Entries are written to a SpooledTemporaryFile as they are produced: small
+archives stay in memory, larger ones roll over to disk. Content that is
+already compressed (PNG/JPEG/PDF/...) is stored rather than deflated
+again. The finished archive is returned as a rewound raw file handle, so
+callers that stream it to a file (the CLI, the job API) never hold a
+bytes copy of the whole archive. Callers own the handle and must close
+it; the Streamlit UI reads it into bytes because st.download_button
+keeps its payload in memory anyway.
+"""
+
+import io
+import os
+import tempfile
+import zipfile
+from typing import BinaryIO, Callable, Iterable, Tuple
+
+# Archives up to this size stay in memory before spilling to disk
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Already-compressed formats: deflating them again costs CPU for ~0% gain
+STORED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".pdf", ".zip", ".gz", ".xlsx", ".parquet"}
+
+
+class _RawReader(io.RawIOBase):
+    """Expose any seekable binary file as io.RawIOBase
+
+    A SpooledTemporaryFile is not an io.IOBase, which st.download_button
+    and other file-object consumers check for.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self._f = fileobj
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._f.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+    def readinto(self, buffer) -> int:
+        data = self._f.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+
+def compress_type_for(name: str) -> int:
+    """ZIP_STORED for already-compressed formats, ZIP_DEFLATED otherwise"""
+    ext = os.path.splitext(name)[1].lower()
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+class ArchiveBuilder:
+    """Add entries one at a time, then finish() for a readable handle"""
+
+    def __init__(self, max_memory_bytes: int = SPOOL_MAX_BYTES):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes)
+        self._zip = zipfile.ZipFile(self._file, "w")
+
+    def add(self, name: str, data: bytes) -> None:
+        self._zip.writestr(name, data, compress_type=compress_type_for(name))
+
+    def finish(self) -> BinaryIO:
+        self._zip.close()
+        self._file.seek(0)
+        return _RawReader(self._file)
+
+
+def build_archive(entries: Iterable[Tuple[str, bytes]], max_memory_bytes: int = SPOOL_MAX_BYTES) -> BinaryIO:
+    """Spool (name, data) pairs into a ZIP and return it as a file handle
+
+    Entries can come from a generator, so at most one entry needs to be in
+    memory at a time.
+    """
+    builder = ArchiveBuilder(max_memory_bytes)
+    for name, data in entries:
+        builder.add(name, data)
+    return builder.finish()
+
+
+def spool_output(write: Callable[[BinaryIO], None], max_memory_bytes: int = SPOOL_MAX_BYTES) -> BinaryIO:
+    """Run write(fileobj) against a spooled temp file and return it rewound
+
+    For single large outputs (merged PDFs) that should not be built up in a
+    BytesIO and then copied out with getvalue(). The caller closes it.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes)
+    try:
+        write(spooled)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return _RawReader(spooled)
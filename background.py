@@ -0,0 +1,154 @@
+"""
+Background jobs for the long-running tools.
+
+OCR, raster compression and page rendering used to run on the Streamlit
+script thread. Any widget change reruns the script, which threw away the
+work done so far, and the session could do nothing else until it ended.
+JobRunner runs them on a small thread pool shared by all sessions instead:
+the script submits a job once, keeps its id in session state and polls its
+progress on later reruns, so the job carries on whatever the user clicks.
+
+A job function gets the job as its first argument and reports progress
+with job.progress(done, total). Once the job is cancelled that call raises
+JobCancelled, so work stops at the next page. Whatever a job collected on
+job.partial before it stopped is kept for the UI.
+
+Configuration (environment variables):
+    PDF_JOB_THREADS     jobs run at once, default 2
+    PDF_JOB_KEEP_MIN    minutes a finished job is kept, default 30
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+import pdf_ops
+from result_cache import ResultCache
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised from BackgroundJob.progress() once the job is cancelled"""
+
+
+@dataclass(eq=False)
+class BackgroundJob:
+    id: str
+    label: str
+    key: Any = None  # the inputs the job was started for
+    status: str = QUEUED
+    done: int = 0
+    total: int = 0  # 0 until the job knows its page count
+    partial: list = field(default_factory=list)
+    result: Any = None
+    error: Optional[str] = None
+    exception: Optional[Exception] = None  # the exception behind error
+    finished_at: Optional[float] = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def cancelling(self) -> bool:
+        return self._cancel.is_set() and not self.finished
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def progress(self, done: int, total: int) -> None:
+        """Progress callback for the job function; raises JobCancelled on cancel"""
+        self.done, self.total = done, total
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+
+class JobRunner:
+    """Thread pool running BackgroundJobs, looked up by id"""
+
+    def __init__(self, threads: int = 2, keep_seconds: float = 1800):
+        self.keep_seconds = keep_seconds
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="pdf-job")
+        self._jobs: Dict[str, BackgroundJob] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "JobRunner":
+        return cls(
+            threads=int(os.environ.get("PDF_JOB_THREADS", "2")),
+            keep_seconds=float(os.environ.get("PDF_JOB_KEEP_MIN", "30")) * 60,
+        )
+
+    def submit(self, label: str, func: Callable, *args, key: Any = None, **kwargs) -> BackgroundJob:
+        """Queue func(job, *args, **kwargs) and return the job"""
+        self._expire()
+        job = BackgroundJob(uuid.uuid4().hex, label, key)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[BackgroundJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: BackgroundJob, func: Callable, args: tuple, kwargs: dict) -> None:
+        try:
+            if job._cancel.is_set():
+                raise JobCancelled()
+            job.status = RUNNING
+            job.result = func(job, *args, **kwargs)
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            job.exception = e
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.keep_seconds
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.finished_at is not None and job.finished_at < cutoff:
+                    del self._jobs[job_id]
+
+
+# ==========================================================
+# TOOL JOBS
+# ==========================================================
+def cached_job(job: BackgroundJob, cache: ResultCache, func: Callable, data: bytes, *args,
+               uncached: Optional[dict] = None, **params) -> Any:
+    """cache.call() with the job's progress callback
+
+    Results land under the same key as a direct cache.call(), so a job
+    that finished once is a lookup for the next one.
+    """
+    return cache.call(func, data, *args, uncached={**(uncached or {}), "progress": job.progress}, **params)
+
+
+def pdf_to_images_job(job: BackgroundJob, cache: ResultCache, data: bytes,
+                      dpi: int, image_format: str) -> list:
+    """pdf_ops.pdf_to_images() one page at a time, pages so far on job.partial"""
+    key = cache.key(pdf_ops.pdf_to_images, data, dpi=dpi, image_format=image_format)
+    images = cache.get(key)
+    if images is None:
+        total = pdf_ops.page_count(data)
+        for image in pdf_ops.iter_pdf_to_images(data, dpi, image_format):
+            job.partial.append(image)
+            job.progress(len(job.partial), total)
+        images = list(job.partial)
+        cache.set(key, images)
+    return images
@@ -0,0 +1,419 @@
+"""
+Command-line batch runner for the PDF tools.
+
+Runs the same pdf_ops calls (with the same defaults and output file names)
+as the Streamlit tools, over any number of files:
+
+    python cli.py rotate --angle 90 "scans/*.pdf" -o out/
+    python cli.py watermark --text CONFIDENTIAL "**/*.pdf" --jobs 4
+    python cli.py extract-text --method auto --invoice invoices/*.pdf
+    python cli.py merge a.pdf "b.pdf:1-3" c.pdf -o merged.pdf
+
+Inputs are file names or glob patterns ("**" recurses). Every command but
+merge handles each input separately and writes <stem>_<ui file name> into
+the output directory (rotated_document.pdf -> report_rotated_document.pdf).
+--jobs N processes N files at once in worker processes.
+
+Failures are reported per file on stderr and the exit status is 1 if any
+file failed.
+"""
+
+import argparse
+import getpass
+import glob
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Iterable, List, Optional, Tuple, Union
+
+import pdf_ops
+from archive import build_archive
+from preprocess import PreprocessOptions
+
+Output = Tuple[str, Union[bytes, BinaryIO]]  # (file name, data)
+
+
+@dataclass
+class FileResult:
+    source: str
+    written: List[str] = field(default_factory=list)
+    message: str = ""
+    error: str = ""
+
+
+# ==========================================================
+# INPUTS
+# ==========================================================
+def expand_inputs(patterns: Iterable[str]) -> List[str]:
+    """Files matching the patterns, in pattern order, each once
+
+    Raises ValueError for a pattern that matches no file.
+    """
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+        if not matches:
+            raise ValueError(f"No files match {pattern}")
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def output_stems(paths: List[str]) -> List[str]:
+    """File name stems for the outputs, " (2)", " (3)" ... for repeats"""
+    seen = {}
+    stems = []
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        stems.append(stem if seen[stem] == 1 else f"{stem} ({seen[stem]})")
+    return stems
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _page_list(spec: Optional[str]) -> Optional[List[int]]:
+    return pdf_ops.parse_page_list(spec) if spec else None
+
+
+# ==========================================================
+# TOOLS (one input PDF -> output files)
+# ==========================================================
+def run_split(data: bytes, args) -> Tuple[List[Output], str]:
+    if args.range:
+        start, end = map(int, args.range.split("-"))
+        return [(f"pages_{start}_to_{end}.pdf", pdf_ops.split_range(data, start, end))], ""
+    return [("split_pages.zip", pdf_ops.split_archive(data))], f"{pdf_ops.page_count(data)} pages"
+
+
+def run_extract_pages(data: bytes, args) -> Tuple[List[Output], str]:
+    pages = pdf_ops.parse_page_list(args.pages)
+    return [("extracted_pages.pdf", pdf_ops.extract_pages(data, pages))], f"{len(pages)} pages"
+
+
+def run_rotate(data: bytes, args) -> Tuple[List[Output], str]:
+    return [("rotated_document.pdf", pdf_ops.rotate(data, args.angle, _page_list(args.pages)))], ""
+
+
+def run_watermark(data: bytes, args) -> Tuple[List[Output], str]:
+    spec = pdf_ops.WatermarkSpec(
+        text=args.text,
+        font_size=args.font_size,
+        opacity=args.opacity,
+        rotation=args.rotation
+    )
+    return [("watermarked_document.pdf", pdf_ops.watermark(data, spec))], ""
+
+
+def run_extract_text(data: bytes, args) -> Tuple[List[Output], str]:
+    import invoice
+    import invoice_table
+
+    preprocess = PreprocessOptions() if args.clean else None
+    outputs = []
+    searchable = None
+
+    if args.method == "normal":
+        text = pdf_ops.extract_text(data)
+    elif args.searchable:
+        searchable = pdf_ops.searchable_pdf(data, dpi=300, workers=args.ocr_workers, preprocess=preprocess)
+        text = searchable.text
+        if searchable.ocr_pages:
+            outputs.append(("searchable.pdf", searchable.pdf))
+    elif args.method == "ocr":
+        text = pdf_ops.ocr_text(data, dpi=300, workers=args.ocr_workers, preprocess=preprocess)
+    else:
+        text = pdf_ops.hybrid_text(data, dpi=300, workers=args.ocr_workers, preprocess=preprocess).text
+
+    if not text.strip():
+        raise ValueError("No text could be extracted")
+
+    if not args.invoice:
+        outputs.append(("extracted_text.txt", text.encode("utf-8")))
+        return outputs, f"{len(text)} characters"
+
+    # Same steps as the Invoice / Bill mode of the Extract Text tool
+    timings = []
+    invoice_data = invoice.extract_invoice_fields(text, timings)
+    layout_pdf = searchable.pdf if searchable is not None else data
+    line_items = invoice_table.extract_line_items(layout_pdf) or invoice.extract_line_items(text, timings)
+    outputs.append(("invoice_extracted_data.xlsx", invoice.to_excel(invoice_data, line_items, text)))
+    return outputs, f"{len(invoice.header_table(invoice_data))} header fields, {len(line_items)} line items"
+
+
+def _image_archive(images: Iterable[pdf_ops.PageImage], empty_error: str) -> Tuple[BinaryIO, int]:
+    """ZIP of the images, written as they are produced, and their count"""
+    count = 0
+
+    def entries():
+        nonlocal count
+        for img in images:
+            count += 1
+            yield img.name, img.data
+
+    archive = build_archive(entries())
+    if not count:
+        archive.close()
+        raise ValueError(empty_error)
+    return archive, count
+
+
+def run_extract_images(data: bytes, args) -> Tuple[List[Output], str]:
+    images, rendered = pdf_ops.iter_extract_images(data)
+    archive, count = _image_archive(images, "No images could be extracted from this PDF")
+    note = " (scanned PDF: pages rendered)" if rendered else ""
+    return [("extracted_images.zip", archive)], f"{count} images{note}"
+
+
+def run_compress(data: bytes, args) -> Tuple[List[Output], str]:
+    result = pdf_ops.compress(data, args.level)
+    reduction = (len(data) - len(result.data)) / len(data) * 100
+    return [("compressed_document.pdf", result.data)], f"{result.method}, reduced by {reduction:.1f}%"
+
+
+def run_to_images(data: bytes, args) -> Tuple[List[Output], str]:
+    images = pdf_ops.iter_pdf_to_images(data, dpi=args.dpi, image_format=args.format)
+    archive, count = _image_archive(images, "No pages could be converted")
+    return [("pdf_images.zip", archive)], f"{count} pages"
+
+
+def run_reorder(data: bytes, args) -> Tuple[List[Output], str]:
+    try:
+        order = [int(p.strip()) for p in args.order.split(",")]
+    except ValueError:
+        raise ValueError("Only numbers and commas are allowed.")
+    return [("reordered_document.pdf", pdf_ops.reorder(data, order))], ""
+
+
+def run_protect(data: bytes, args) -> Tuple[List[Output], str]:
+    return [("protected.pdf", pdf_ops.protect(data, args.password))], ""
+
+
+def run_unlock(data: bytes, args) -> Tuple[List[Output], str]:
+    try:
+        unlocked = pdf_ops.unlock(data, args.password)
+    except ValueError:
+        raise ValueError("Incorrect password.")
+    return [("unlocked.pdf", unlocked)], ""
+
+
+def run_redact(data: bytes, args) -> Tuple[List[Output], str]:
+    terms = [t.strip() for t in args.term if t.strip()]
+    if args.ocr_scanned and pdf_ops.scanned_pages(data):
+        data = pdf_ops.searchable_pdf(data, dpi=300, workers=args.ocr_workers).pdf
+    redacted, total = pdf_ops.redact(data, terms)
+    return [("redacted.pdf", redacted)], f"{total} matches redacted"
+
+
+# ==========================================================
+# RUNNER
+# ==========================================================
+def _write_output(path: str, data: Union[bytes, BinaryIO]) -> None:
+    with open(path, "wb") as f:
+        if isinstance(data, (bytes, bytearray)):
+            f.write(data)
+        else:
+            with data:  # spooled temp file: release it once copied
+                shutil.copyfileobj(data, f)
+
+
+def process_file(path: str, stem: str, args) -> FileResult:
+    """Run args.tool on one input and write its outputs (worker process)"""
+    result = FileResult(path)
+    try:
+        outputs, result.message = args.tool(_read(path), args)
+        for name, data in outputs:
+            out_path = os.path.join(args.output_dir, f"{stem}_{name}")
+            _write_output(out_path, data)
+            result.written.append(out_path)
+    except Exception as e:
+        result.error = str(e) or type(e).__name__
+    return result
+
+
+def run_files(paths: List[str], args, on_result: Callable[[FileResult], None]) -> List[FileResult]:
+    """Process every input, args.jobs at a time; results in input order"""
+    workers = min(args.jobs, len(paths)) or 1
+    stems = output_stems(paths)
+    results: List[Optional[FileResult]] = [None] * len(paths)
+
+    # Single worker: no pool
+    if workers == 1:
+        for i, path in enumerate(paths):
+            results[i] = process_file(path, stems[i], args)
+            on_result(results[i])
+        return results
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {
+            executor.submit(process_file, path, stem, args): i
+            for i, (path, stem) in enumerate(zip(paths, stems))
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            on_result(results[futures[future]])
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return results
+
+
+def _report(result: FileResult) -> None:
+    if result.error:
+        print(f"✗ {result.source}: {result.error}", file=sys.stderr)
+    else:
+        note = f" ({result.message})" if result.message else ""
+        print(f"✓ {result.source} -> {', '.join(result.written)}{note}")
+
+
+def merge_files(args) -> int:
+    """Merge every input into args.output; "file.pdf:1-3" takes only those pages
+
+    Returns the number of files merged.
+    """
+    inputs = []
+    for spec in args.inputs:
+        pattern, pages = spec, None
+        if ":" in spec and not os.path.exists(spec):
+            pattern, page_spec = spec.rsplit(":", 1)
+            pages = pdf_ops.parse_page_list(page_spec)
+        inputs.extend(pdf_ops.MergeInput(path, pages) for path in expand_inputs([pattern]))
+
+    if len(inputs) < 2:
+        raise ValueError("Merge needs at least 2 PDF files")
+
+    merged = pdf_ops.merge_to_file(inputs, workers=args.jobs)
+    _write_output(args.output, merged)
+    return len(inputs)
+
+
+def run_merge(args) -> int:
+    count = merge_files(args)
+    print(f"✓ {count} files -> {args.output}")
+    return 0
+
+
+# ==========================================================
+# ARGUMENTS
+# ==========================================================
+def build_parser(parser_class=argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """Parser for every command; subcommand parsers use parser_class too"""
+    parser = parser_class(
+        prog="cli.py",
+        description="Run the PDF Editor Pro tools on files from the command line."
+    )
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+    parser.commands = commands.choices  # command name -> its parser
+
+    # Options shared by the per-file tools
+    per_file = parser_class(add_help=False)
+    per_file.add_argument("inputs", nargs="+", metavar="INPUT", help="PDF files or glob patterns")
+    per_file.add_argument("-o", "--output-dir", default=".", help="directory for the results (default: .)")
+    per_file.add_argument("-j", "--jobs", type=int, default=1, help="files processed in parallel (default: 1)")
+
+    def tool(name, func, help_text):
+        sub = commands.add_parser(name, parents=[per_file], help=help_text, description=help_text)
+        sub.set_defaults(tool=func)
+        return sub
+
+    merge = commands.add_parser("merge", help="merge PDFs into one, in the given order")
+    merge.add_argument("inputs", nargs="+", metavar="INPUT",
+                       help='PDF files or glob patterns, "file.pdf:1-3,5" for selected pages')
+    merge.add_argument("-o", "--output", default="merged_document.pdf", help="merged file (default: merged_document.pdf)")
+    merge.add_argument("-j", "--jobs", type=int, default=4, help="files read in parallel (default: 4)")
+
+    sub = tool("split", run_split, "split into one PDF per page (ZIP), or cut out a page range")
+    sub.add_argument("--range", metavar="START-END", help="write pages START..END as one PDF instead")
+
+    sub = tool("extract-pages", run_extract_pages, "copy selected pages into a new PDF")
+    sub.add_argument("--pages", required=True, help="page numbers, e.g. 1,3,5-7")
+
+    sub = tool("rotate", run_rotate, "rotate pages clockwise")
+    sub.add_argument("--angle", type=int, choices=[90, 180, 270], default=90)
+    sub.add_argument("--pages", help="page numbers to rotate (default: all)")
+
+    sub = tool("watermark", run_watermark, "add a transparent text watermark")
+    sub.add_argument("--text", required=True)
+    sub.add_argument("--font-size", type=int, default=48)
+    sub.add_argument("--opacity", type=float, default=0.25)
+    sub.add_argument("--rotation", type=int, default=45)
+
+    sub = tool("extract-text", run_extract_text, "extract text, or invoice data with --invoice")
+    sub.add_argument("--method", choices=["normal", "ocr", "auto"], default="normal",
+                     help="normal: text layer, ocr: every page, auto: OCR only scanned pages")
+    sub.add_argument("--invoice", action="store_true", help="write invoice fields and line items as Excel")
+    sub.add_argument("--clean", action="store_true", help="clean up scans before OCR")
+    sub.add_argument("--searchable", action="store_true", help="also write a searchable PDF (OCR methods)")
+    sub.add_argument("--ocr-workers", type=int, help="OCR processes per file (default: OCR_WORKERS or CPUs)")
+
+    tool("extract-images", run_extract_images, "extract embedded images (ZIP)")
+
+    sub = tool("compress", run_compress, "compress a PDF")
+    sub.add_argument("--level", choices=[pdf_ops.COMPRESS_LOW, pdf_ops.COMPRESS_MEDIUM, pdf_ops.COMPRESS_HIGH],
+                     default=pdf_ops.COMPRESS_LOW, help="medium/high rasterise pages (default: low)")
+
+    sub = tool("to-images", run_to_images, "render every page to an image (ZIP)")
+    sub.add_argument("--format", choices=["PNG", "JPEG"], default="PNG")
+    sub.add_argument("--dpi", type=int, default=150)
+
+    sub = tool("reorder", run_reorder, "rewrite pages in a new order")
+    sub.add_argument("--order", required=True, help="every page once, e.g. 3,1,2")
+
+    for name, func, help_text in (("protect", run_protect, "add a password"),
+                                  ("unlock", run_unlock, "remove a known password")):
+        sub = tool(name, func, help_text)
+        sub.add_argument("--password", help="prompted for when omitted")
+
+    sub = tool("redact", run_redact, "black out exact text matches")
+    sub.add_argument("--term", action="append", required=True, help="text to redact, repeatable")
+    sub.add_argument("--ocr-scanned", action="store_true", help="OCR scanned pages first so their text is found")
+    sub.add_argument("--ocr-workers", type=int)
+
+    return parser
+
+
+def check_args(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Reject option combinations argparse cannot express"""
+    if getattr(args, "searchable", False) and args.method == "normal":
+        parser.error("--searchable needs --method ocr or auto")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_args(parser, args)
+    if args.jobs < 1:
+        print("--jobs must be at least 1", file=sys.stderr)
+        return 2
+
+    try:
+        if args.command == "merge":
+            return run_merge(args)
+
+        paths = expand_inputs(args.inputs)
+        os.makedirs(args.output_dir, exist_ok=True)
+        if args.command in ("protect", "unlock") and not args.password:
+            args.password = getpass.getpass("Password: ")
+        if hasattr(args, "ocr_workers") and args.ocr_workers is None:
+            # Files already run in parallel: OCR each one's pages serially
+            args.ocr_workers = 1 if args.jobs > 1 else None
+    except ValueError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 1
+
+    results = run_files(paths, args, _report)
+    failed = sum(1 for r in results if r.error)
+    print(f"{len(results) - failed} of {len(results)} files done", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
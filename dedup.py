@@ -0,0 +1,138 @@
+"""
+Identical-object deduplication for PdfWriter output.
+
+Merging PDFs made from the same template copies the template's fonts,
+logo images and ICC profiles once per source file. dedupe_objects() hashes
+every shareable indirect object (streams by a digest of their raw data,
+dictionaries and arrays by their canonical content) and points all
+references at one copy, so each distinct resource is written once.
+
+Objects refer to each other (font -> descriptor -> font file), so this runs
+bottom-up until nothing changes: once the font files are merged, the
+descriptors that point at them become identical, then the fonts.
+
+Duplicates become null objects instead of being removed, which keeps
+PyPDF2's object numbering and xref table valid at ~20 bytes each.
+
+Page tree nodes, pages, annotations, outline items and form fields are
+never merged: they must stay distinct even when their content is equal.
+"""
+
+import hashlib
+from typing import Dict
+
+from PyPDF2 import PdfWriter
+from PyPDF2.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NullObject,
+    StreamObject,
+)
+
+# Dictionary /Type values that are structure, not shareable resources
+_STRUCTURAL_TYPES = {"/Catalog", "/Pages", "/Page", "/Annot", "/Outlines", "/Sig"}
+
+# Keys that tie a dictionary to one place in the document
+_STRUCTURAL_KEYS = {"/Parent", "/Rect", "/Kids", "/Fields"}
+
+
+def _shareable(obj) -> bool:
+    if isinstance(obj, StreamObject):
+        return True
+    if isinstance(obj, DictionaryObject):
+        if obj.get("/Type") in _STRUCTURAL_TYPES:
+            return False
+        return not any(key in obj for key in _STRUCTURAL_KEYS)
+    return isinstance(obj, ArrayObject)
+
+
+def _feed(h, obj) -> None:
+    """Hash obj's content; references by object number, dict keys sorted"""
+    if isinstance(obj, IndirectObject):
+        h.update(b"R%d " % obj.idnum)
+    elif isinstance(obj, DictionaryObject):
+        h.update(b"<<")
+        for key in sorted(obj):
+            h.update(key.encode("latin-1", "replace") + b" ")
+            _feed(h, obj[key])
+        h.update(b">>")
+    elif isinstance(obj, ArrayObject):
+        h.update(b"[")
+        for item in obj:
+            _feed(h, item)
+        h.update(b"]")
+    else:
+        h.update(type(obj).__name__.encode() + b":" + repr(obj).encode("utf-8", "replace") + b" ")
+
+
+class _Deduper:
+    def __init__(self, writer: PdfWriter):
+        self.writer = writer
+        self.objects = writer._objects
+        self.data_digests: Dict[int, bytes] = {}  # id(stream) -> digest of its data
+
+        # Document-level dictionaries stay where they are
+        self.protected = {writer._root.idnum, writer._pages.idnum}
+        if getattr(writer, "_info", None) is not None:
+            self.protected.add(writer._info.idnum)
+
+    def _key(self, obj) -> bytes:
+        h = hashlib.sha256()
+        if isinstance(obj, StreamObject):
+            digest = self.data_digests.get(id(obj))
+            if digest is None:
+                digest = self.data_digests[id(obj)] = hashlib.sha256(obj._data).digest()
+            h.update(b"stream" + digest)
+        _feed(h, obj)
+        return h.digest()
+
+    def _find_duplicates(self) -> Dict[int, int]:
+        """idnum -> idnum of the first identical object, for one pass"""
+        first: Dict[bytes, int] = {}
+        duplicates = {}
+        for index, obj in enumerate(self.objects):
+            idnum = index + 1
+            if idnum in self.protected or obj is None or not _shareable(obj):
+                continue
+            key = self._key(obj)
+            if key in first:
+                duplicates[idnum] = first[key]
+            else:
+                first[key] = idnum
+        return duplicates
+
+    def _rewrite(self, obj, duplicates: Dict[int, int]) -> None:
+        """Point references to duplicates at their originals, in place"""
+        stack = [obj]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, DictionaryObject):
+                items = list(node.items())
+            elif isinstance(node, ArrayObject):
+                items = list(enumerate(node))
+            else:
+                continue
+            for key, value in items:
+                if isinstance(value, IndirectObject):
+                    if value.idnum in duplicates and value.pdf is self.writer:
+                        node[key] = IndirectObject(duplicates[value.idnum], 0, self.writer)
+                elif isinstance(value, (DictionaryObject, ArrayObject)):
+                    stack.append(value)
+
+    def run(self) -> int:
+        removed = 0
+        while True:
+            duplicates = self._find_duplicates()
+            if not duplicates:
+                return removed
+            for idnum in duplicates:
+                self.objects[idnum - 1] = NullObject()
+            for obj in self.objects:
+                self._rewrite(obj, duplicates)
+            removed += len(duplicates)
+
+
+def dedupe_objects(writer: PdfWriter) -> int:
+    """Store identical resources once; returns how many copies were dropped"""
+    return _Deduper(writer).run()
@@ -0,0 +1,555 @@
+"""
+Invoice / bill field and line-item extraction from plain text.
+"""
+
+import io
+import re
+
+import pandas as pd
+
+from invoice_rules import Rule, RuleSet
+
+
+# -------------------------------------------------
+# HEADER FIELD RULES
+# -------------------------------------------------
+# Compiled once at import. Each rule's alternatives are tried in order and
+# the first one that matches wins; the lower-case keys collect every match
+# and are split into several fields by the handlers below. Dict order is
+# the order fields appear in the header table.
+HEADER_RULES = RuleSet({
+    # ========== INVOICE IDENTIFIERS ==========
+    "Invoice Number": Rule([
+        r"Invoice\s+No[\.:\s]+([A-Z]{2,4}\d+)",
+        r"Invoice\s+No[\.:\s]+(\d+)",
+        r"Invoice\s*#[:\s]*([A-Z0-9\-]+)",
+        r"Bill\s+No[\.:\s]+([A-Z0-9\-]+)",
+        r"Tax\s+Invoice[^\n]*\n[^\n]*Invoice\s+No[\.:\s]+([A-Z0-9/\-]+)"
+    ]),
+    "Invoice Date": Rule([
+        r"Invoice\s+Date[\.:\s]+([\d/\-]+)",
+        r"Dated[\.:\s]+([\d/\-]+)",
+        r"Date[\.:\s]+([\d]{1,2}[/-][A-Za-z]{3}[/-][\d]{2,4})",
+        r"Date[\.:\s]+([\d]{1,2}[/-][\d]{1,2}[/-][\d]{2,4})",
+        r"Invoice\s+No[^\n]+\n[^\n]*Dated[^\n]*\n([^\n]*\d{2}[-/]\d{2}[-/]\d{4})"
+    ]),
+    "Due Date": Rule([
+        r"Due\s+Date[\.:\s]+([\d/\-]+)",
+        r"Payment\s+Due[\.:\s]+([\d/\-]+)"
+    ]),
+
+    # ========== ACKNOWLEDGMENT & REFERENCE ==========
+    "Ack No": Rule([
+        r"Ack\s+No[\.:\s]+([A-Z0-9]+)",
+        r"Acknowledgment[\.:\s]+([A-Z0-9]+)",
+        r"No\.[\.:\s]+(\d{12,})"  # Long numeric ack numbers
+    ]),
+    "Ack Date": Rule([
+        r"Ack\s+Date[\.:\s]+([\d/\-]+)",
+        r"Date\s+r[\.:\s]+([\d\-]+[A-Za-z]{3}\-[\d]{2})"  # Date r format
+    ]),
+    "IRN Number": Rule([
+        r"IRN[\.:\s]+([A-Za-z0-9\-]+)",
+        r"IRN\s+No[\.:\s]+([A-Za-z0-9\-]+)",
+        r"IRN[\.:\s]*\n[\.:\s]*([a-z0-9\-]{40,})"  # Long IRN on next line
+    ]),
+    "CIN Number": Rule([
+        r"CIN\s+NO[\.:\s]+([A-Z0-9]+)"
+    ]),
+    "PAN": Rule([
+        r"PAN[\.:\s]+([A-Z]{5}\d{4}[A-Z])"
+    ]),
+
+    # ========== E-WAY BILL ==========
+    "E-Way Bill No": Rule([
+        r"e-Way\s+Bill\s+No[\.:\s]+(\d+)",
+        r"EWAY\s+Bill\s+No[\.:\s]+(\d+)",
+        r"EWB\s+No[\.:\s]+(\d+)"
+    ]),
+    "EWB Expiry Date": Rule([
+        r"EWB\s+Expiry[^\n:]+([\d/\.\s:]+)",
+        r"e-Way.*?Expiry[^\n:]+([\d/\.\s:]+)"
+    ]),
+
+    # ========== ORDER DETAILS ==========
+    "Sales Order No": Rule([
+        r"S\.?O\.?\s+No[\.:\s]+(\d+)",
+        r"Sales\s+Order[\.:\s]+([A-Z0-9\-]+)"
+    ]),
+    "Sales Order Date": Rule([
+        r"S\.?O\.?\s+No[^&\n]+&\s*([\d/]+)",
+        r"S\.?O\.?\s+Date[\.:\s]+([\d/]+)"
+    ]),
+
+    # ========== ORDER DETAILS ==========
+    "Purchase Order No": Rule([
+        r"(?:Cust|Customer|Buyer[^\n]*)\s*(?:PO|P\.O\.)\s+No[\.:\s]+([A-Z0-9\-]+)",
+        r"PO\s+NO[\.:\-\s]+([A-Z0-9\-]+)",
+        r"Buyer'?s?\s+Order\s+No[\.:\-\s]+([A-Z0-9\-]+)"
+    ]),
+    "Reference No": Rule([
+        r"(?:Our\s+)?Ref(?:erence)?[\.:\s]+No[\.:\s&]+Date[\.:\s]+([A-Z0-9]+)",
+        r"Reference\s+No[\.:\s&]+Date[^\n]*?([A-Z0-9]+)\s+dt\.",
+        r"Other\s+References[\.:\s]+([A-Z0-9\-]+)"
+    ]),
+    "Reference Date": Rule([
+        r"Reference\s+No[^d]+dt\.\s*([\d\-/A-Za-z]+)"
+    ]),
+
+    # ========== DELIVERY/DISPATCH ==========
+    "Delivery Note No": Rule([
+        r"Delivery\s+(?:Note\s+)?No[\.:\s]+([A-Z0-9\-]+)",
+        r"Dispatch\s+Doc\s+No[\.:\s]+([A-Z0-9\-]+)"
+    ]),
+    "Delivery Date": Rule([
+        r"Delivery\s+(?:Note\s+)?Date[\.:\s]+([\d/\-]+)",
+        r"Delivery\s+No[^&\n]+&\s*([\d/]+)"
+    ]),
+    "Shipment No": Rule([
+        r"Shipment\s+No[\.:\s]+([A-Z0-9\-]+)"
+    ]),
+    "Shipment Date": Rule([
+        r"Shipment\s+No[^&\n]+&\s*([\d/]+)",
+        r"Shipment\s+Date[\.:\s]+([\d/]+)"
+    ]),
+
+    # ========== SELLER/SUPPLIER DETAILS ==========
+    # Try to find seller name (could be individual or company)
+    "Seller Name": Rule([
+        r"^([A-Z][A-Z\s&\.]+(?:LIMITED|LTD|PVT|PRIVATE|LLP|ASSOCIATES|COMPANY))",
+        r"(?:Seller|Supplier|From)[^\n:]*:\s*([A-Z][^\n]+(?:LIMITED|LTD|PVT))",
+        r"^([A-Z]{2,}(?:\s+[A-Z]{2,})+)\n",  # Individual name in caps
+        r"(STAR\s+CEMENT\s+LIMITED)"
+    ]),
+    # Seller address/location
+    "Seller Address": Rule([
+        r"^[A-Z\s]+\n([A-Z][^\n]+)\n([A-Z][^\n]+)\n([A-Z][^\n,]+,\s*[A-Z\s]+-\s*\d{6})"
+    ]),
+    "Seller Location": Rule([
+        r"^[A-Z\s&]+\n[A-Z\s]+\n([A-Z\s,]+?)(?:,\s*[A-Z\s]+-\s*\d{6})",
+        r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*),\s*([A-Z\s]+)-\s*(\d{6})"
+    ]),
+    # Every GSTIN, in order: seller, customer, ship-to
+    "gstins": Rule([
+        r"GSTIN[/\\]?UIN[\.:\s]*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[0-9A-Z]{1}[Z]{1}[0-9A-Z]{1})",
+        r"GSTIN\s+No[\.:\s]*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[0-9A-Z]{3})"
+    ]),
+    # Every PIN code, in order: seller, customer
+    "pins": Rule([
+        r"PIN[\.:\s]+(\d{6})",
+        r"\b(\d{6})\b"
+    ]),
+    # Every state code, in order: seller, customer
+    "state_codes": Rule([
+        r"(?:State\s+)?Code[\.:\s]*(\d{1,2})",
+        r"State\s+Name[^\n]+Code[\.:\s]*(\d{1,2})"
+    ]),
+    # Every state name, in order: seller, customer
+    "states": Rule([
+        r"State\s+Name[\.:\s]*([A-Z][A-Za-z\s]+?)(?:,|Code|\d|$)",
+        r"STATE[\.:\s]*([A-Z\s]+?)(?:\n|STATE CODE|GSTIN)"
+    ]),
+
+    # ========== BUYER/CUSTOMER DETAILS ==========
+    "Buyer/Customer Name": Rule([
+        r"Buyer\s+Name[\.:\s]+([A-Z][^\n]+)",
+        r"(?:Consignee|Customer|Bill\s+to)[^\n:]*:\s*([A-Z][^\n]+)",
+        r"Name[^\n]*Customer[^\n:]*:\s*([^\n]+)"
+    ]),
+    "Buyer Address": Rule([
+        r"Buyer\s+Address[\.:\s]+([^\n]+(?:\n[^\n]+)*?)(?=\n(?:District|GSTIN))",
+        r"(?:Consignee|Customer)\s+Address[\.:\s]+([^\n]+)"
+    ]),
+    "Ship To Name": Rule([
+        r"(?:Ship\s+to|Delivery\s+Address)[^\n:]*:\s*([A-Z][^\n]+)"
+    ]),
+
+    # ========== TRANSPORT DETAILS ==========
+    "Mode of Transport": Rule([
+        r"Mode\s+of\s+Transport[\.:\s]+([A-Za-z]+)",
+        r"Transport\s+Mode[\.:\s]+([A-Za-z]+)"
+    ]),
+    # "Code Name" or just a name, split in _transporter()
+    "transporter": Rule([
+        r"Transporter\s+Code\s*&\s*Name[\.:\s]+(\d+\s+[A-Z\s]+?)(?=\n|Vehicle|$)",
+        r"Transporter[\.:\s]+([^\n]+)"
+    ]),
+
+    # ========== ADDITIONAL FIELDS FOR SIMPLE INVOICES ==========
+    "Vehicle No": Rule([
+        r"Vehicle\s+No[\.:\s]+([A-Z]{2}[-\s]?\d{2}[A-Z]{1,2}[-\s]?\d{4})",
+        r"Vehicle\s+(?:Reg\.?\s+)?No[\.:\s]+([A-Z0-9\-]+)"
+    ]),
+    "Place of Supply": Rule([
+        r"Place\s+of\s+Supply[\.:\s]+([A-Z][^\n]+)"
+    ]),
+    "Order No": Rule([
+        r"Order\s+No[\.:\s]+([A-Z0-9]+)",
+        r"Order\s+No[\.:\s]+([\d]+)"
+    ]),
+    "LR/RR No": Rule([
+        r"L[\.\/]?R[\.\/]?R\.?R[\.:\s]+No[\.:\s]+(\d+)",
+        r"L\.R[\.:\s]+No[\.:\s]+(\d+)",
+        r"Bill\s+of\s+Lading[\.:/]*LR-RR\s+No[\.:\s]+([A-Z0-9\-]+)"
+    ]),
+    "LR/RR Date": Rule([
+        r"L[\.\/]?R[\.\/]?R\.?R[\.:\s]+No[^&\n]+&\s*Date[\.:\s]+([\d/]+)",
+        r"L\.R[\.:\s]+No[^&\n]+&\s*([\d/]+)"
+    ]),
+    "Route": Rule([
+        r"Route\s+Name[\.:\s]+([^\n]+?)(?=\n|Incoterms|$)",
+        r"Route[\.:\s]+([^\n]+)"
+    ]),
+    "Destination": Rule([
+        r"Destination[\.:\s]+([A-Z0-9\s]+?)(?=\n|Batch|$)",
+        r"Dispatched\s+through[\.:\s]+Destination[\.:\s]+([^\n]+)"
+    ]),
+    "Terms of Delivery": Rule([
+        r"Terms\s+of\s+Delivery[\.:\s]+([^\n]+)",
+        r"Incoterms[\.:\s]+([^\n]+?)(?=\n|Terms|$)"
+    ]),
+    "Batch No": Rule([
+        r"Batch\s+No[\.:\s]+([A-Z0-9]+)"
+    ]),
+
+    # ========== PAYMENT & FINANCIAL ==========
+    "Mode/Terms of Payment": Rule([
+        r"Mode[/\\]Terms\s+of\s+Payment[\.:\s]+([^\n]+)",
+        r"Payment\s+Terms[\.:\s]+([^\n]+)"
+    ]),
+    "Taxable Amount": Rule([
+        r"Taxable\s+(?:Amount|Value)[\.:\s]*([\d,]+\.?\d*)",
+        r"Total\s+Taxable[\.:\s]*([\d,]+\.?\d*)"
+    ]),
+    "CGST": Rule([
+        r"CGST[\.:\s]*([\d,]+\.?\d*)",
+        r"Central\s+Tax[^\n]*Amount[\.:\s]*([\d,]+\.?\d*)"
+    ]),
+    "SGST": Rule([
+        r"SGST[\.:\s]*([\d,]+\.?\d*)",
+        r"State\s+Tax[^\n]*Amount[\.:\s]*([\d,]+\.?\d*)"
+    ]),
+    "IGST Rate": Rule([
+        r"IGST[\.:\s@]*(\d+\.?\d*)%"
+    ]),
+    "IGST Amount": Rule([
+        r"IGST[\.:\s]*([\d,]+\.?\d*)",
+        r"Integrated\s+Tax[^\n]+Amount[\.:\s]*([\d,]+\.?\d*)"
+    ]),
+    "TCS": Rule([
+        r"TCS[\.:\-\s]*([\d,]+\.?\d*)"
+    ]),
+    "Round Off": Rule([
+        r"ROUND(?:ED)?\s+OFF[\.:\s]*([\-\d,\.]+)",
+        r"R[/\\]?OFF[\.:\s\-•]*([\-\d,\.]+)"
+    ]),
+    "Total Amount": Rule([
+        r"TOTAL[\.:\s]*([\d,]+\.?\d*)",
+        r"Total\s+Invoice[\.:\s]*([\d,]+\.?\d*)",
+        r"Grand\s+Total[\.:\s]*([\d,]+\.?\d*)",
+        r"₹\s*([\d,]+\.?\d*)\s*$"
+    ]),
+    "Amount in Words": Rule([
+        r"(?:Total\s+)?(?:Invoice\s+)?(?:value\s+)?[Ii]n\s+words[\.:\s]*(.*?ONLY)",
+        r"(?:INR|Rs\.?)\s+([A-Z][a-z]+.*?[Oo]nly)"
+    ]),
+    "Reverse Charge": Rule([
+        r"(?:Amount\s+of\s+Tax\s+)?Subject\s+[Tt]o\s+Reverse\s+Charge[\.:\s]*(YES|NO|Y|N)",
+        r"Reverse\s+Charge[\.:\s]*(YES|NO|Y|N)"
+    ]),
+
+    # ========== ADDITIONAL INFO ==========
+    "Freight": Rule([
+        r"FREIGHT[\.:\-\s]*([\d,]+\.?\d*)"
+    ]),
+    "POD": Rule([
+        r"POD[\.:\s]+([^\n]+)"
+    ]),
+})
+
+
+_TRANSPORTER_CODE = re.compile(r'\d+\s+')
+
+
+def _gstins(scan, rule, invoice_data):
+    all_gstins = scan.all(rule)
+    if len(all_gstins) >= 1:
+        invoice_data["Seller GSTIN"] = all_gstins[0]
+    if len(all_gstins) >= 2:
+        invoice_data["Customer GSTIN"] = all_gstins[1]
+    if len(all_gstins) >= 3:
+        invoice_data["Ship To GSTIN"] = all_gstins[2]
+
+
+def _pins(scan, rule, invoice_data):
+    # Filter valid Indian PINs
+    valid_pins = [p for p in scan.all(rule) if p.startswith(('1','2','3','4','5','6','7','8','9'))]
+    if len(valid_pins) >= 1:
+        invoice_data["Seller PIN"] = valid_pins[0]
+    if len(valid_pins) >= 2:
+        invoice_data["Customer PIN"] = valid_pins[1]
+
+
+def _state_codes(scan, rule, invoice_data):
+    all_state_codes = scan.all(rule)
+    if len(all_state_codes) >= 1:
+        invoice_data["Seller State Code"] = all_state_codes[0]
+    if len(all_state_codes) >= 2:
+        invoice_data["Customer State Code"] = all_state_codes[1]
+
+
+def _states(scan, rule, invoice_data):
+    all_states = scan.all(rule)
+    if len(all_states) >= 1:
+        invoice_data["Seller State"] = all_states[0].strip()
+    if len(all_states) >= 2:
+        invoice_data["Customer State"] = all_states[1].strip()
+
+
+def _transporter(scan, rule, invoice_data):
+    transporter_line = scan.first(rule)
+
+    if transporter_line and _TRANSPORTER_CODE.match(transporter_line):
+        parts = transporter_line.split(None, 1)
+        if len(parts) >= 1:
+            invoice_data["Transporter Code"] = parts[0]
+        if len(parts) >= 2:
+            invoice_data["Transporter Name"] = parts[1].strip()
+    else:
+        invoice_data["Transporter Name"] = transporter_line
+
+
+MULTI_FIELD_HANDLERS = {
+    "gstins": _gstins,
+    "pins": _pins,
+    "state_codes": _state_codes,
+    "states": _states,
+    "transporter": _transporter,
+}
+
+
+# -------------------------------------------------
+# UNIVERSAL INVOICE EXTRACTION
+# -------------------------------------------------
+def extract_invoice_fields(text, timings=None):
+    """Extract header fields (numbers, dates, parties, taxes) from invoice text
+
+    Pass a list as timings to collect a RuleTiming per field; fields whose
+    rules ran out of time budget are left empty.
+    """
+    scan = HEADER_RULES.scan(text)
+    invoice_data = {}
+
+    for field, rule in HEADER_RULES.rules.items():
+        handler = MULTI_FIELD_HANDLERS.get(field)
+        if handler:
+            handler(scan, rule, invoice_data)
+        else:
+            invoice_data[field] = scan.first(rule)
+
+    if timings is not None:
+        timings.extend(scan.timings)
+    return invoice_data
+
+
+# -------------------------------------------------
+# UNIVERSAL LINE ITEMS EXTRACTION
+# -------------------------------------------------
+# Table formats tried in order, compiled once at import
+LINE_ITEM_RULES = RuleSet({
+    # Format 1: Simple vendor invoice (Challan/Material based)
+    "Format 1": Rule([
+        r"(?P<sl>\d+)\s+"
+        r"(?P<challan>\d+)\s+"
+        r"(?P<date>[\d\-/]+)\s+"
+        r"(?P<vehicle>[A-Z]{2}[-\s]?\d{2}[A-Z]{1,2}[-\s]?\d{4})\s+"
+        r"(?P<material>[A-Z][A-Z\s]+?)\s+"
+        r"(?P<qty>[\d,]+\.?\d*)\s+"
+        r"(?P<rate>[\d,]+\.?\d*)\s+"
+        r"(?P<amount>[\d,]+\.?\d*)"
+    ], re.IGNORECASE),
+    # Format 2: Corporate B2B with HSN (ICA style) - handles multi-line descriptions
+    "Format 2": Rule([
+        r"(?P<sl>\d+)\s+"
+        r"(?P<hsn>\d{8})\s+"
+        r"(?P<description>.+?)\s+"
+        r"(?P<qty>[\d,]+\.?\d*)\s+(?P<uom>PCS|MT|KG|TON|UNIT)\s+"
+        r"(?P<rate>[\d,]+\.?\d*)\s+"
+        r"(?P<per>PCS|MT|KG|TON|UNIT)\s+"
+        r"(?P<amount>[\d,]+\.?\d*)"
+    ], re.IGNORECASE | re.DOTALL),
+    # Format 3: Star Cement corporate style
+    "Format 3": Rule([
+        r"(?P<sl>\d+)\s+"
+        r"(?P<description>(?:CEMENT|CLINKER|GRADE)[^\n]+?)\s+"
+        r"(?P<hsn>\d{6,8})\s+"
+        r"(?P<qty>[\d,]+\.?\d*)\s+(?P<uom>[A-Z]{2,3})\s+"
+        r"(?P<rate>[\d,]+\.?\d*)"
+    ], re.IGNORECASE),
+    # Format 4: With package info
+    "Format 4": Rule([
+        r"(?P<description>(?:CEMENT|CLINKER)[^\n]*?)\s+"
+        r"(?P<hsn>\d{6,8})\s+"
+        r"(?P<package>[A-Z]+)\s+"
+        r"(?P<bags>[\d,]*)\s*"
+        r"(?P<uom>[A-Z]{2})\s+"
+        r"(?P<qty>[\d,.]+)\s+"
+        r"(?P<rate>[\d,.]+)"
+    ], re.IGNORECASE),
+    # Format 5: Standard GST invoice table
+    "Format 5": Rule([
+        r"(?P<sl>\d+)\s+"
+        r"(?P<description>[A-Z][A-Z\s,\-:]+?)\s+"
+        r"(?P<hsn>\d{6,8})\s+"
+        r"(?P<qty>[\d,]+\.?\d*)\s+"
+        r"(?P<rate>[\d,]+\.?\d*)\s+"
+        r"(?P<per>[A-Z]{2,3})\s+"
+        r"(?P<amount>[\d,]+\.?\d*)"
+    ], re.IGNORECASE),
+    # Format 6: Fallback - any row with quantity and amount
+    "Format 6": Rule([
+        r"(?P<description>[A-Z][A-Z\s]+(?:SAND|CEMENT|CLINKER|MATERIAL|MOTOR)[^\d\n]*?)\s+"
+        r"(?P<qty>[\d,]+\.?\d*)\s+"
+        r"(?P<rate>[\d,]+\.?\d*)\s+"
+        r"(?P<amount>[\d,]+\.?\d*)"
+    ], re.IGNORECASE)
+})
+
+# Fallback and clean-up patterns
+_WHITESPACE = re.compile(r'\s+')
+_HSN_CODE = re.compile(r'\b(\d{8})\b')
+_AMOUNT = re.compile(r'([\d,]+\.\d{2})')
+_QTY_WITH_UNIT = re.compile(r'(\d+)\s+(PCS|MT|KG|TON)', re.IGNORECASE)
+_HSN_DESCRIPTION = re.compile(r'(MOTOR[^\n]{0,80}|CEMENT[^\n]{0,80}|CLINKER[^\n]{0,80})', re.IGNORECASE)
+
+
+def extract_line_items(text, timings=None):
+    """Extract line items, trying known table formats before a loose fallback
+
+    timings works as in extract_invoice_fields(), one entry per format tried.
+    """
+    line_items = []
+    scan = LINE_ITEM_RULES.scan(text)
+
+    for rule in LINE_ITEM_RULES.rules.values():
+        matches = scan.matches(rule)
+        if matches:
+            for match in matches:
+                item = {}
+                try:
+                    groups = match.groupdict()
+
+                    if "sl" in groups and groups["sl"]:
+                        item["Sl No"] = groups["sl"]
+                    if "challan" in groups and groups["challan"]:
+                        item["Challan No"] = groups["challan"]
+                    if "date" in groups and groups["date"]:
+                        item["Date"] = groups["date"]
+                    if "vehicle" in groups and groups["vehicle"]:
+                        item["Vehicle No"] = groups["vehicle"]
+                    if "material" in groups and groups["material"]:
+                        # Clean up material description
+                        material_desc = groups["material"].strip()
+                        item["Material/Description"] = material_desc
+                    if "description" in groups and groups["description"]:
+                        # Clean multi-line descriptions
+                        desc = groups["description"].strip()
+                        desc = _WHITESPACE.sub(' ', desc)  # Collapse whitespace
+                        item["Description"] = desc
+                    if "hsn" in groups and groups["hsn"]:
+                        item["HSN/SAC"] = groups["hsn"]
+                    if "qty" in groups:
+                        item["Quantity"] = groups["qty"]
+                    if "uom" in groups and groups["uom"]:
+                        item["UOM"] = groups["uom"]
+                    if "rate" in groups:
+                        item["Rate"] = groups["rate"]
+                    if "per" in groups and groups["per"]:
+                        item["Per"] = groups["per"]
+                    if "amount" in groups:
+                        item["Amount"] = groups["amount"]
+                    if "package" in groups and groups.get("package"):
+                        item["Package"] = groups["package"]
+                    if "bags" in groups and groups.get("bags"):
+                        item["No of Bags"] = groups["bags"]
+
+                    if item and len(item) >= 3:  # At least 3 fields
+                        line_items.append(item)
+                except Exception as e:
+                    continue
+
+            if line_items:
+                break
+
+    # -------------------------------------------------
+    # FALLBACK: Manual parsing for broken table layouts
+    # -------------------------------------------------
+    if not line_items:
+        # Try to find HSN codes and reconstruct items
+        hsn_codes = _HSN_CODE.findall(text)
+
+        if hsn_codes:
+            # Find all amounts that look like prices
+            amounts = _AMOUNT.findall(text)
+
+            # Find quantities with units
+            qty_matches = _QTY_WITH_UNIT.findall(text)
+
+            # Try to match them up
+            for i, hsn in enumerate(hsn_codes):
+                if i < len(qty_matches) and i < len(amounts):
+                    item = {
+                        "Sl No": str(i + 1),
+                        "HSN/SAC": hsn,
+                        "Quantity": qty_matches[i][0],
+                        "UOM": qty_matches[i][1],
+                        "Amount": amounts[i] if i < len(amounts) else ""
+                    }
+
+                    # Try to find description near HSN
+                    hsn_pos = text.find(hsn)
+                    if hsn_pos > 0:
+                        # Look for MOTOR/CEMENT/etc before HSN
+                        before_hsn = text[max(0, hsn_pos-200):hsn_pos]
+                        desc_match = _HSN_DESCRIPTION.search(before_hsn)
+                        if desc_match:
+                            item["Description"] = desc_match.group(1).strip()
+
+                    if len(item) >= 3:
+                        line_items.append(item)
+
+    if timings is not None:
+        timings.extend(scan.timings)
+    return line_items
+
+
+# -------------------------------------------------
+# EXPORT
+# -------------------------------------------------
+def header_table(invoice_data):
+    """Field/Value DataFrame of the non-empty header fields"""
+    return pd.DataFrame([
+        {"Field": k, "Value": v}
+        for k, v in invoice_data.items()
+        if v and str(v).strip()
+    ])
+
+
+def to_excel(invoice_data, line_items, raw_text):
+    """Build the invoice workbook (header, line items, raw text) as bytes"""
+    header_df = header_table(invoice_data)
+    excel_buffer = io.BytesIO()
+
+    with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
+        if not header_df.empty:
+            header_df.to_excel(writer, sheet_name="Invoice_Header", index=False)
+
+        if line_items:
+            items_df = pd.DataFrame(line_items)
+            items_df.to_excel(writer, sheet_name="Line_Items", index=False)
+
+        # Add raw text for reference
+        raw_df = pd.DataFrame({"Extracted_Text": [raw_text]})
+        raw_df.to_excel(writer, sheet_name="Raw_Text", index=False)
+
+    return excel_buffer.getvalue()
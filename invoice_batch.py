@@ -0,0 +1,208 @@
+"""
+Batch invoice extraction.
+
+Takes many PDFs (or ZIPs of PDFs), extracts the text of each one and runs
+the invoice rules on it across a process pool, and consolidates the results
+into one header table (one row per source file) and one line-items table,
+both keyed by source file. Output is Excel or Parquet.
+"""
+
+import io
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+import invoice
+import invoice_table
+import ocr
+import pdf_ops
+from invoice_rules import RuleTiming, slow_rules
+from preprocess import PreprocessOptions
+
+# Text extraction methods
+METHOD_TEXT = "text"
+METHOD_OCR = "ocr"
+METHOD_AUTO = "auto"  # OCR only pages without a text layer
+
+SOURCE_COLUMN = "Source File"
+ITEM_COLUMN = "Item No"
+
+
+@dataclass
+class InvoiceResult:
+    source: str
+    header: dict = field(default_factory=dict)
+    line_items: list = field(default_factory=list)
+    error: str = ""
+    slow_rules: List[RuleTiming] = field(default_factory=list)  # skipped or slow rules
+
+
+@dataclass
+class BatchResult:
+    results: List[InvoiceResult]
+    elapsed: float
+
+    @property
+    def invoices_per_second(self) -> float:
+        return len(self.results) / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def failed(self) -> List[InvoiceResult]:
+        return [r for r in self.results if r.error]
+
+    def header_table(self) -> pd.DataFrame:
+        """One row per invoice, fields as columns"""
+        rows = [{SOURCE_COLUMN: r.source, **r.header} for r in self.results if not r.error]
+        return pd.DataFrame(rows, columns=None if rows else [SOURCE_COLUMN])
+
+    def line_items_table(self) -> pd.DataFrame:
+        """One row per line item, numbered within its invoice"""
+        rows = [
+            {SOURCE_COLUMN: r.source, ITEM_COLUMN: n, **item}
+            for r in self.results if not r.error
+            for n, item in enumerate(r.line_items, start=1)
+        ]
+        return pd.DataFrame(rows, columns=None if rows else [SOURCE_COLUMN, ITEM_COLUMN])
+
+    def error_table(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            [{SOURCE_COLUMN: r.source, "Error": r.error} for r in self.failed],
+            columns=[SOURCE_COLUMN, "Error"],
+        )
+
+    def slow_rules_table(self) -> pd.DataFrame:
+        """Rules that ran out of time budget or were slow, per invoice"""
+        return pd.DataFrame(
+            [
+                {SOURCE_COLUMN: r.source, "Rule": t.rule, "Seconds": round(t.seconds, 3), "Skipped": t.skipped}
+                for r in self.results for t in r.slow_rules
+            ],
+            columns=[SOURCE_COLUMN, "Rule", "Seconds", "Skipped"],
+        )
+
+
+# ==========================================================
+# INPUTS
+# ==========================================================
+def iter_sources(files: Iterable[Tuple[str, bytes]]) -> Iterator[Tuple[str, bytes]]:
+    """Yield (source name, pdf bytes), expanding ZIP archives
+
+    PDFs inside a ZIP are named "archive.zip/path/in/archive.pdf"; entries
+    that are not PDFs are skipped. Repeated names get a " (2)", " (3)", ...
+    suffix so every source key is unique.
+    """
+    seen = {}
+
+    def unique(name):
+        seen[name] = seen.get(name, 0) + 1
+        return name if seen[name] == 1 else f"{name} ({seen[name]})"
+
+    for name, data in files:
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for info in archive.infolist():
+                    entry = info.filename
+                    if info.is_dir() or not entry.lower().endswith(".pdf") or entry.startswith("__MACOSX/"):
+                        continue
+                    yield unique(f"{name}/{entry}"), archive.read(info)
+        else:
+            yield unique(name), data
+
+
+# ==========================================================
+# EXTRACTION
+# ==========================================================
+def extract_invoice(source: str, pdf_bytes: bytes, method: str = METHOD_TEXT, dpi: int = 300,
+                    preprocess: Optional[PreprocessOptions] = None) -> InvoiceResult:
+    """Text extraction plus header and line-item rules for one PDF"""
+    try:
+        # Already one document per worker: OCR its pages serially
+        searchable = None
+        if method in (METHOD_OCR, METHOD_AUTO):
+            # Scanned pages get an OCR text layer, so the table reader has
+            # word positions; METHOD_OCR reads every page in the same run
+            searchable = pdf_ops.searchable_pdf(pdf_bytes, dpi=dpi, workers=1, preprocess=preprocess,
+                                                ocr_every_page=method == METHOD_OCR)
+            text = searchable.text
+        else:
+            text = pdf_ops.extract_text(pdf_bytes)
+
+        if not text.strip():
+            return InvoiceResult(source, error="No text could be extracted")
+
+        timings = []
+        header = invoice.extract_invoice_fields(text, timings)
+        layout_pdf = searchable.pdf if searchable is not None else pdf_bytes
+        line_items = invoice_table.extract_line_items(layout_pdf) or invoice.extract_line_items(text, timings)
+        return InvoiceResult(source, header, line_items, slow_rules=slow_rules(timings))
+    except Exception as e:
+        return InvoiceResult(source, error=str(e) or type(e).__name__)
+
+
+def run_batch(sources: Iterable[Tuple[str, bytes]], method: str = METHOD_TEXT, dpi: int = 300,
+              workers: Optional[int] = None,
+              progress: Optional[ocr.ProgressCallback] = None,
+              preprocess: Optional[PreprocessOptions] = None) -> BatchResult:
+    """Extract every (name, pdf bytes) source, one document per worker
+
+    Results keep the input order regardless of completion order.
+    """
+    sources = list(sources)
+    total = len(sources)
+    workers = min(workers or os.cpu_count() or 1, total) or 1
+    results: List[Optional[InvoiceResult]] = [None] * total
+    start = time.perf_counter()
+
+    # Single worker: no pool
+    if workers == 1:
+        for i, (name, data) in enumerate(sources):
+            results[i] = extract_invoice(name, data, method, dpi, preprocess)
+            if progress:
+                progress(i + 1, total)
+        return BatchResult(results, time.perf_counter() - start)
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {
+            executor.submit(extract_invoice, name, data, method, dpi, preprocess): i
+            for i, (name, data) in enumerate(sources)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if progress:
+                progress(done, total)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return BatchResult(results, time.perf_counter() - start)
+
+
+# ==========================================================
+# EXPORT
+# ==========================================================
+def to_excel(batch: BatchResult) -> bytes:
+    """Workbook with the consolidated headers, line items and any errors"""
+    excel_buffer = io.BytesIO()
+
+    with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
+        batch.header_table().to_excel(writer, sheet_name="Invoice_Headers", index=False)
+        batch.line_items_table().to_excel(writer, sheet_name="Line_Items", index=False)
+        if batch.failed:
+            batch.error_table().to_excel(writer, sheet_name="Errors", index=False)
+        slow = batch.slow_rules_table()
+        if not slow.empty:
+            slow.to_excel(writer, sheet_name="Slow_Rules", index=False)
+
+    return excel_buffer.getvalue()
+
+
+def to_parquet(df: pd.DataFrame) -> bytes:
+    """One table as Parquet bytes"""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
@@ -0,0 +1,420 @@
+"""
+Compiled rule engine for invoice field extraction.
+
+Each field is a Rule: an ordered list of alternative regexes, compiled once
+at import. The first alternative that matches anywhere in the text wins,
+exactly like the old find_multi() helper, so alternatives are kept in
+order rather than merged into one regex (a merged alternation would return
+the leftmost match instead).
+
+What makes it cheap is the label index. Most alternatives can only start
+at a literal label ("Invoice", "GSTIN", "(?:State\\s+)?Code", ...), worked
+out once per pattern at import. scan(text) lower-cases the text once;
+anchored alternatives are then only tried at the offsets where one of
+their labels occurs (found with C substring search), and skipped outright
+when none does, instead of each of ~150 patterns running the regex engine
+over every position of the text. Alternatives without a literal start fall
+back to an ordinary search.
+
+Guarding against backtracking: patterns like ([^\n]+(?:\n[^\n]+)*?)(?=...)
+or DOTALL .+? retry to the end of the text from every start, which turns
+quadratic on large OCR dumps. Every regex call is therefore bounded to a
+window of MAX_MATCH_CHARS (no field value is that long), and each rule
+has a time budget checked between calls. A rule that runs out of budget
+is skipped for that text. Every rule's time is recorded in
+TextScan.timings, so slow rules can be reported.
+"""
+
+import heapq
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_FLAGS = re.IGNORECASE | re.DOTALL
+
+# Longest text one match may span; regex calls never look further
+MAX_MATCH_CHARS = 1000
+
+# Seconds one rule may spend on a text before it is skipped
+RULE_BUDGET_SECONDS = float(os.environ.get("INVOICE_RULE_BUDGET", "0.25"))
+
+# Rules slower than this are reported as slow
+SLOW_RULE_SECONDS = 0.02
+
+# Labels shorter than this ("S", "L") occur everywhere; indexing them costs
+# more than searching
+MIN_ANCHOR_LENGTH = 2
+
+# Escaped characters that stand for themselves
+_LITERAL_ESCAPES = set(".-/#&'\\()[]{}*+?|^$%@:,₹ ")
+_LITERAL_CHARS = set("#&'₹,:-/@%< >=\"")
+_QUANTIFIERS = set("?*{")
+
+# The only characters IGNORECASE matches to an ASCII letter without
+# str.lower() mapping them to it one-to-one (İ, ı, long s, Kelvin sign)
+_FOLDS_TO_ASCII = str.maketrans("\u0130\u0131\u017f\u212a", "iisk")
+
+
+def literal_prefix(pattern: str) -> str:
+    """Leading literal text of a pattern without top-level alternation"""
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("\\b", i):
+            i += 2  # zero-width, the match still starts at the literal
+            continue
+        if c == "\\":
+            if i + 1 < len(pattern) and pattern[i + 1] in _LITERAL_ESCAPES:
+                literal, step = pattern[i + 1], 2
+            else:
+                break  # \s, \d, ...
+        elif c == "[":
+            # [Ii] is just "i" under IGNORECASE
+            end = pattern.find("]", i + 1)
+            members = set(pattern[i + 1:end].lower()) if end != -1 else set()
+            if len(members) != 1 or not members <= set("abcdefghijklmnopqrstuvwxyz"):
+                break
+            literal, step = members.pop(), end + 1 - i
+        elif c.isalnum() or c in _LITERAL_CHARS:
+            literal, step = c, 1
+        else:
+            break
+
+        following = pattern[i + step:i + step + 1]
+        if following and following in _QUANTIFIERS:
+            break  # optional / repeated: not guaranteed
+        prefix.append(literal)
+        if following == "+":
+            break
+        i += step
+
+    return "".join(prefix)
+
+
+def _split_top_level(pattern: str) -> List[str]:
+    """Split a pattern on | outside groups and character classes"""
+    branches = []
+    depth = 0
+    in_class = False
+    start = 0
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            if c == "]":
+                in_class = False
+        elif c == "[":
+            in_class = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            branches.append(pattern[start:i])
+            start = i + 1
+        i += 1
+    branches.append(pattern[start:])
+    return branches
+
+
+def _group_end(pattern: str, start: int) -> int:
+    """Index of the ) closing the group opened at pattern[start]"""
+    depth = 0
+    in_class = False
+    i = start
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            if c == "]":
+                in_class = False
+        elif c == "[":
+            in_class = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return -1
+
+
+def literal_starts(pattern: str) -> List[str]:
+    """Labels one of which every match must start with ([] if unknown)
+
+    Handles plain literal prefixes, top-level and grouped alternatives
+    ("(?:Seller|Supplier)") and optional leading groups
+    ("(?:State\\s+)?Code" starts with "State" or "Code").
+    """
+    branches = _split_top_level(pattern)
+    if len(branches) > 1:
+        starts = []
+        for branch in branches:
+            branch_starts = literal_starts(branch)
+            if not branch_starts:
+                return []
+            starts.extend(branch_starts)
+        return starts
+
+    while pattern.startswith("\\b"):
+        pattern = pattern[2:]
+
+    if pattern.startswith("("):
+        if pattern.startswith("(?") and not pattern.startswith("(?:"):
+            return []  # lookaround, flags, named groups
+        end = _group_end(pattern, 0)
+        if end == -1:
+            return []
+
+        inner = pattern[3 if pattern.startswith("(?:") else 1:end]
+        starts = literal_starts(inner)
+        rest = pattern[end + 1:]
+
+        if rest[:1] in ("?", "*"):
+            rest = rest[2:] if rest[1:2] == "?" else rest[1:]
+            rest_starts = literal_starts(rest)
+            return starts + rest_starts if starts and rest_starts else []
+        if rest[:1] == "{":
+            return []
+        return starts
+
+    prefix = literal_prefix(pattern)
+    return [prefix] if prefix else []
+
+
+# ==========================================================
+# RULES
+# ==========================================================
+class Alternative:
+    """One compiled pattern plus what the scanner needs to know about it"""
+
+    def __init__(self, pattern: str, flags: int = DEFAULT_FLAGS):
+        self.pattern = pattern
+        self.regex = re.compile(pattern, flags)
+        anchors = sorted({start.lower() for start in literal_starts(pattern)})
+        if all(len(a) >= MIN_ANCHOR_LENGTH and a.isascii() for a in anchors):
+            self.anchors = tuple(anchors)
+        else:
+            self.anchors = ()
+
+        # Without MULTILINE a leading ^ can only match at offset 0
+        self.at_start = pattern.startswith("^") and not flags & re.MULTILINE
+
+
+class Rule:
+    """Ordered alternatives for one field"""
+
+    def __init__(self, patterns: Iterable[str], flags: int = DEFAULT_FLAGS, name: str = ""):
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        self.name = name
+        self.alternatives = [Alternative(p, flags) for p in patterns]
+
+
+def _match_value(match):
+    """What re.findall would report for this match"""
+    groups = match.groups()
+    if not groups:
+        return match.group(0)
+    return groups[0] if len(groups) == 1 else groups
+
+
+class RuleSet:
+    """A named, ordered collection of rules"""
+
+    def __init__(self, rules: Dict[str, Rule]):
+        self.rules = rules
+        for name, rule in rules.items():
+            rule.name = rule.name or name
+
+    def __getitem__(self, name: str) -> Rule:
+        return self.rules[name]
+
+    def scan(self, text: str, budget: float = RULE_BUDGET_SECONDS) -> "TextScan":
+        return TextScan(text, budget)
+
+
+@dataclass
+class RuleTiming:
+    rule: str
+    seconds: float
+    skipped: bool = False  # budget ran out, the rule gave no result
+
+    @property
+    def flagged(self) -> bool:
+        return self.skipped or self.seconds >= SLOW_RULE_SECONDS
+
+
+def slow_rules(timings: Iterable[RuleTiming]) -> List[RuleTiming]:
+    """Timings of rules that were skipped or slow, slowest first"""
+    return sorted((t for t in timings if t.flagged), key=lambda t: t.seconds, reverse=True)
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+class TextScan:
+    """Label offsets for one text, and rule lookups against it"""
+
+    def __init__(self, text: str, budget: float = RULE_BUDGET_SECONDS):
+        self.text = text
+        self.budget = budget
+        self.timings: List[RuleTiming] = []
+        self._deadline = float("inf")
+
+        # Labels are ASCII, so after folding the few characters IGNORECASE
+        # matches to an ASCII letter, a plain substring search of the
+        # lower-cased copy finds exactly the offsets the regexes match at
+        self.lowered = text.translate(_FOLDS_TO_ASCII).lower()
+
+    def offsets(self, anchor: str) -> Iterator[int]:
+        """Offsets where a label occurs, found lazily in C"""
+        pos = self.lowered.find(anchor)
+        while pos != -1:
+            yield pos
+            pos = self.lowered.find(anchor, pos + 1)
+
+    def candidates(self, anchors) -> Iterator[int]:
+        """Ascending, distinct offsets where any of the labels occurs"""
+        if len(anchors) == 1:
+            yield from self.offsets(anchors[0])
+            return
+
+        last = -1
+        for pos in heapq.merge(*(self.offsets(a) for a in anchors)):
+            if pos != last:
+                yield pos
+                last = pos
+
+    # ------------------------------------------------------
+    # Bounded regex calls
+    # ------------------------------------------------------
+    def _check_time(self) -> None:
+        if time.perf_counter() > self._deadline:
+            raise _OutOfTime
+
+    def _truncated(self, match: re.Match, endpos: int) -> bool:
+        """Whether the match only exists because the window cut the text
+
+        At the window end, $ and \b see an end of string that is not
+        there ($ also just before a final newline).
+        """
+        return endpos < len(self.text) and match.end() >= endpos - 1
+
+    def _match_at(self, alt: Alternative, pos: int) -> Optional[re.Match]:
+        self._check_time()
+        endpos = min(len(self.text), pos + MAX_MATCH_CHARS)
+        match = alt.regex.match(self.text, pos, endpos)
+        return None if match is None or self._truncated(match, endpos) else match
+
+    def _search_from(self, alt: Alternative, pos: int) -> Optional[re.Match]:
+        """First match starting at pos or later, one window at a time
+
+        Each call covers starts in [pos, pos + MAX_MATCH_CHARS) and may look
+        MAX_MATCH_CHARS further, so every match up to that long is found.
+        """
+        n = len(self.text)
+        start = pos
+        while start <= n:
+            self._check_time()
+            window_end = start + MAX_MATCH_CHARS
+            endpos = min(n, window_end + MAX_MATCH_CHARS)
+            if endpos == n:
+                # Last window: nothing is cut off, anything found is final
+                return alt.regex.search(self.text, start)
+
+            match = alt.regex.search(self.text, start, endpos)
+            while match and match.start() < window_end and self._truncated(match, endpos):
+                match = alt.regex.search(self.text, match.start() + 1, endpos)
+            if match and match.start() < window_end:
+                return match
+            start = window_end
+        return None
+
+    # ------------------------------------------------------
+    # Single alternative
+    # ------------------------------------------------------
+    def _search(self, alt: Alternative) -> Optional[re.Match]:
+        if alt.at_start:
+            return self._match_at(alt, 0)
+        if not alt.anchors:
+            return self._search_from(alt, 0)
+
+        for pos in self.candidates(alt.anchors):
+            match = self._match_at(alt, pos)
+            if match:
+                return match
+        return None
+
+    def _finditer(self, alt: Alternative) -> List[re.Match]:
+        """Non-overlapping matches, like re.finditer"""
+        if alt.at_start:
+            match = self._match_at(alt, 0)
+            return [match] if match else []
+
+        matches = []
+        if not alt.anchors:
+            match = self._search_from(alt, 0)
+            while match:
+                matches.append(match)
+                match = self._search_from(alt, max(match.end(), match.start() + 1))
+            return matches
+
+        end = 0
+        for pos in self.candidates(alt.anchors):
+            if pos < end:
+                continue  # findall does not report overlapping matches
+            match = self._match_at(alt, pos)
+            if match:
+                matches.append(match)
+                end = match.end()
+        return matches
+
+    def _timed(self, rule: Rule, lookup, default):
+        start = time.perf_counter()
+        self._deadline = start + self.budget
+        try:
+            result, skipped = lookup(), False
+        except _OutOfTime:
+            result, skipped = default, True
+        finally:
+            self._deadline = float("inf")
+        self.timings.append(RuleTiming(rule.name, time.perf_counter() - start, skipped))
+        return result
+
+    # ------------------------------------------------------
+    # Rules
+    # ------------------------------------------------------
+    def first(self, rule: Rule, default: str = "") -> str:
+        """Group 1 of the first alternative that matches, stripped"""
+        def lookup():
+            for alt in rule.alternatives:
+                match = self._search(alt)
+                if match:
+                    return match.group(1).strip()
+            return default
+        return self._timed(rule, lookup, default)
+
+    def matches(self, rule: Rule) -> List[re.Match]:
+        """Every match of the first alternative that matches at all"""
+        def lookup():
+            for alt in rule.alternatives:
+                found = self._finditer(alt)
+                if found:
+                    return found
+            return []
+        return self._timed(rule, lookup, [])
+
+    def all(self, rule: Rule) -> list:
+        """Like matches(), as re.findall values"""
+        return [_match_value(match) for match in self.matches(rule)]
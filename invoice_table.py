@@ -0,0 +1,242 @@
+"""
+Layout-aware line-item extraction from positioned words.
+
+Works on the words of a page's text layer (PyMuPDF get_text("words")),
+including an OCR text layer added by searchable_pdf(), instead of
+flattened text:
+
+1. Words are grouped into rows by clustering their vertical centres
+   (one sort, then a linear pass over the gaps).
+2. The table header row is the first row naming at least three known
+   columns (Description, HSN/SAC, Qty, Rate, Amount ...). Its cells fix the
+   column boundaries, and each body word is assigned to a column with
+   one vectorised searchsorted.
+3. A row with a serial number or an amount starts a new item. Rows with
+   neither are continuation lines and join the previous item, so
+   descriptions wrapped over several lines stay together.
+4. The table ends at a "Total" / "Amount in words" row. A page without
+   a header (continuation page) reuses the previous page's columns while
+   the table is still open, and only if its first item row fits them
+   (numbers under the numeric columns); numbered terms and conditions
+   after the table do not.
+
+When a header repeats a column (Taxable Value, CGST Amount and Total are
+all amounts), the rightmost amount-like cell is the line "Amount" and the
+first cell of any other column keeps its key; the rest are keyed by their
+own header text.
+
+Items use the same keys as invoice.extract_line_items().
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Header cell text -> item key, first match wins
+COLUMN_KEYS = [
+    (re.compile(r"\b(sl|sr|s\.?\s*no|sno|#)\b", re.IGNORECASE), "Sl No"),
+    (re.compile(r"hsn|sac", re.IGNORECASE), "HSN/SAC"),
+    (re.compile(r"challan", re.IGNORECASE), "Challan No"),
+    (re.compile(r"vehicle|truck|lorry", re.IGNORECASE), "Vehicle No"),
+    (re.compile(r"\bdate\b", re.IGNORECASE), "Date"),
+    (re.compile(r"bags", re.IGNORECASE), "No of Bags"),
+    (re.compile(r"package|pkg", re.IGNORECASE), "Package"),
+    (re.compile(r"desc|particular|material|goods|item|product", re.IGNORECASE), "Description"),
+    (re.compile(r"qty|quantity", re.IGNORECASE), "Quantity"),
+    (re.compile(r"uom|unit", re.IGNORECASE), "UOM"),
+    (re.compile(r"rate|price", re.IGNORECASE), "Rate"),
+    (re.compile(r"^per$", re.IGNORECASE), "Per"),
+    (re.compile(r"amount|value|total", re.IGNORECASE), "Amount"),
+]
+
+# A header row must name at least this many known columns
+MIN_HEADER_COLUMNS = 3
+
+# Rows whose centres are closer than this fraction of the median word
+# height are one row
+ROW_TOLERANCE = 0.5
+
+# Words in a header row further apart than this fraction of the median
+# word height start a new header cell
+CELL_GAP = 0.8
+
+_TABLE_END = re.compile(r"^(sub\s*-?\s*|grand\s+)?total\b|amount\s+(chargeable|in\s+words)|in\s+words",
+                        re.IGNORECASE)
+_NUMBER = re.compile(r"^[\d,]+(\.\d+)?$")
+_SERIAL = re.compile(r"^\d{1,4}\.?$")
+
+# Columns holding a number on every item row
+NUMERIC_KEYS = ("Quantity", "Rate", "Amount")
+
+
+@dataclass
+class Columns:
+    keys: List[str]
+    bounds: np.ndarray  # len(keys) - 1 x-positions between columns
+
+
+def _column_key(text: str) -> Optional[str]:
+    for pattern, key in COLUMN_KEYS:
+        if pattern.search(text):
+            return key
+    return None
+
+
+def _unique_keys(keys: List[Optional[str]], texts: List[str]) -> List[str]:
+    """One key per header cell; repeats and unknown cells use their text"""
+    owner = {}
+    for i, key in enumerate(keys):
+        # Rightmost amount (the line total), otherwise the first cell
+        if key and (key not in owner or key == "Amount"):
+            owner[key] = i
+
+    used = set(owner)
+    unique = []
+    for i, (key, text) in enumerate(zip(keys, texts)):
+        if key and owner[key] == i:
+            unique.append(key)
+            continue
+        name, n = text, 1
+        while name in used:
+            n += 1
+            name = f"{text} ({n})"
+        used.add(name)
+        unique.append(name)
+    return unique
+
+
+# ==========================================================
+# ROWS
+# ==========================================================
+def _rows(words: list) -> List[list]:
+    """Words grouped into rows, top to bottom, each row left to right"""
+    if not words:
+        return []
+    boxes = np.array([w[:4] for w in words], dtype=np.float64)
+    centres = (boxes[:, 1] + boxes[:, 3]) / 2
+    heights = boxes[:, 3] - boxes[:, 1]
+    tolerance = ROW_TOLERANCE * max(float(np.median(heights)), 1.0)
+
+    order = np.argsort(centres, kind="stable")
+    # A new row starts wherever the next centre is further than tolerance
+    row_ids = np.concatenate([[0], np.cumsum(np.diff(centres[order]) > tolerance)])
+
+    # Left to right within a row: sort by (row, x0) in one pass
+    order = order[np.lexsort((boxes[order, 0], row_ids))]
+    row_ids = np.sort(row_ids)
+    splits = np.flatnonzero(np.diff(row_ids)) + 1
+    return [[words[i] for i in chunk] for chunk in np.split(order, splits)]
+
+
+def _header_columns(row: list, height: float) -> Optional[Columns]:
+    """Columns from a header row, None if it does not look like one"""
+    cells = []
+    for word in row:
+        if cells and word[0] - cells[-1][2] <= CELL_GAP * height:
+            x0, _, _, text = cells[-1]
+            cells[-1] = (x0, 0, word[2], f"{text} {word[4]}")
+        else:
+            cells.append((word[0], 0, word[2], word[4]))
+
+    keys = [_column_key(text) for _, _, _, text in cells]
+    if len({k for k in keys if k}) < MIN_HEADER_COLUMNS:
+        return None
+
+    keys = _unique_keys(keys, [text for _, _, _, text in cells])
+    bounds = np.array([(cells[i][2] + cells[i + 1][0]) / 2 for i in range(len(cells) - 1)])
+    return Columns(keys, bounds)
+
+
+# ==========================================================
+# ITEMS
+# ==========================================================
+def _cells(row: list, columns: Columns) -> Dict[str, str]:
+    centres = np.array([(w[0] + w[2]) / 2 for w in row])
+    indexes = np.searchsorted(columns.bounds, centres)
+    cells: Dict[str, str] = {}
+    for word, index in zip(row, indexes):
+        key = columns.keys[index]
+        cells[key] = f"{cells[key]} {word[4]}" if key in cells else word[4]
+    return cells
+
+
+def _starts_item(cells: Dict[str, str]) -> bool:
+    if _SERIAL.match(cells.get("Sl No", "")):
+        return True
+    return bool(_NUMBER.match(cells.get("Amount", "")))
+
+
+def _fits(cells: Dict[str, str]) -> bool:
+    """Whether an item row has numbers, and only numbers, under the numeric columns"""
+    numeric = [cells[key] for key in NUMERIC_KEYS if key in cells]
+    return bool(numeric) and all(_NUMBER.match(text) for text in numeric)
+
+
+def _merge(item: Dict[str, str], cells: Dict[str, str]) -> None:
+    for key, text in cells.items():
+        item[key] = f"{item[key]} {text}" if key in item else text
+
+
+def table_items(pages: List[list]) -> List[Dict[str, str]]:
+    """Line items from per-page word lists (x0, y0, x1, y1, text, ...)"""
+    items: List[Dict[str, str]] = []
+    columns = None  # columns of the open table, None once it has ended
+
+    for words in pages:
+        if not words:
+            continue
+        height = max(float(np.median([w[3] - w[1] for w in words])), 1.0)
+        in_table = False
+        continuing = columns is not None  # no header of its own (yet)
+        pending: Dict[str, str] = {}  # description lines above the first item
+
+        for row in _rows(words):
+            # Look for the header until the table starts
+            header = None if in_table else _header_columns(row, height)
+            if header is not None:
+                columns, in_table, continuing = header, True, False
+                pending = {}
+                continue
+            if columns is None:
+                continue
+
+            line = " ".join(w[4] for w in row)
+            if _TABLE_END.search(line):
+                if in_table or items:
+                    columns = None
+                    break
+                continue
+
+            cells = _cells(row, columns)
+            if _starts_item(cells):
+                if continuing:
+                    if not _fits(cells):
+                        # Not the table carrying on (numbered clauses, notes)
+                        columns = None
+                        break
+                    continuing = False
+                if pending:
+                    below = cells.get("Description")
+                    cells["Description"] = f"{pending['Description']} {below}" if below else pending["Description"]
+                    pending = {}
+                items.append(cells)
+                in_table = True
+            elif in_table and items:
+                _merge(items[-1], cells)
+            elif "Description" in cells:
+                _merge(pending, {"Description": cells["Description"]})
+
+    # Rows need some substance to count as items, as in the text rules
+    return [item for item in items if len(item) >= 3]
+
+
+def extract_line_items(pdf_bytes: bytes) -> List[Dict[str, str]]:
+    """Line items from the text layer of every page, [] if none found"""
+    import fitz  # PyMuPDF
+    from raster import FITZ_LOCK
+
+    with FITZ_LOCK, fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        pages = [page.get_text("words") for page in doc]
+    return table_items(pages)
@@ -0,0 +1,566 @@
+"""
+Local HTTP job API for the PDF tools.
+
+Lets other systems (the ERP exporting invoices, scripts) run the tools as
+asynchronous jobs without the Streamlit UI:
+
+    POST   /jobs/{tool}              multipart: "file" part(s) + tool options
+    GET    /jobs/{id}                status, messages and result file URLs
+    GET    /jobs/{id}/files/{name}   download one result file
+    DELETE /jobs/{id}                cancel a queued job, drop a finished one
+    GET    /tools                    tools and the pool each one runs on
+
+Tools and options are the cli.py commands, so results are the same as the
+CLI's and the UI's. A form field "angle=90" is "--angle 90",
+"invoice=true" is "--invoice", and repeated fields repeat the option.
+For merge, "pages" fields give each file's page range, in file order.
+
+Jobs run on two bounded process pools. OCR, compression and rendering
+tools use the heavy pool and page operations use the light pool, so a
+queue of long OCR jobs never delays a merge or rotate. A pool with too
+many unfinished jobs answers 503. A client (the X-Client-Id header,
+else its address) with too many unfinished jobs gets 429. Uploads and
+results live in a directory per job, downloads are streamed from disk,
+and finished jobs are removed after JOB_API_TTL_SECONDS.
+
+Run:
+    python job_api.py [--host 127.0.0.1] [--port 8600]
+
+Configuration (environment variables):
+    JOB_API_DIR             job directory, default <tmp>/pdf-editor-jobs
+    JOB_API_LIGHT_WORKERS   light pool processes, default 2
+    JOB_API_HEAVY_WORKERS   heavy pool processes, default CPUs - 2 (min 1)
+    JOB_API_MAX_QUEUE       unfinished jobs per pool, default 32
+    JOB_API_CLIENT_JOBS     unfinished jobs per client, default 4
+    JOB_API_MAX_UPLOAD_MB   request size limit, default 200
+    JOB_API_TTL_SECONDS     how long finished jobs are kept, default 3600
+"""
+
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse
+from starlette.routing import Route
+
+import cli
+
+LIGHT = "light"
+HEAVY = "heavy"
+
+# Tools that render or OCR pages; everything else is a page operation
+HEAVY_TOOLS = {"extract-text", "extract-images", "compress", "to-images", "redact"}
+
+# CLI options a request may not set (paths and parallelism are the server's)
+_RESERVED_FIELDS = {"file", "help", "output", "output-dir", "jobs", "inputs"}
+
+_CHUNK = 1024 * 1024
+
+
+class _UploadTooLarge(Exception):
+    """The request body went past the upload limit while streaming in"""
+
+
+class _FormParser(argparse.ArgumentParser):
+    """Reports bad options as ValueError instead of exiting"""
+
+    def error(self, message):
+        raise ValueError(message)
+
+
+# ==========================================================
+# WORKER SIDE
+# ==========================================================
+def run_job(args) -> List[cli.FileResult]:
+    """Run one job in a pool process; outputs go to args.output_dir"""
+    if args.command == "merge":
+        result = cli.FileResult("merge")
+        try:
+            count = cli.merge_files(args)
+            result.written.append(args.output)
+            result.message = f"{count} files merged"
+        except Exception as e:
+            result.error = str(e) or type(e).__name__
+        return [result]
+
+    stems = cli.output_stems(args.inputs)
+    return [cli.process_file(path, stem, args) for path, stem in zip(args.inputs, stems)]
+
+
+# ==========================================================
+# POOLS
+# ==========================================================
+class _Pool:
+    """A process pool fed from our own queue, one job per worker at a time
+
+    Handing every job to ProcessPoolExecutor at once would mark queued
+    jobs as running and make them impossible to cancel. Here a job stays
+    in the queue (its future pending, so cancel() works) until a worker is
+    free.
+
+    A worker that dies (out of memory, a crash in a native PDF library)
+    breaks a ProcessPoolExecutor for good. The pool then fails the jobs it
+    had in flight and in the queue and starts a fresh executor, so later
+    jobs run again.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.waiting = deque()  # (future, args)
+        self.running: Dict[Future, Future] = {}  # executor future -> job future
+        self.lock = threading.Lock()
+
+    @property
+    def active(self) -> int:
+        return len(self.running)
+
+    def submit(self, args: argparse.Namespace) -> Future:
+        future = Future()
+        with self.lock:
+            self.waiting.append((future, args))
+        self._dispatch()
+        return future
+
+    def _dispatch(self) -> None:
+        started = []
+        with self.lock:
+            while self.active < self.workers and self.waiting:
+                future, args = self.waiting.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue  # cancelled while queued
+                try:
+                    inner = self.executor.submit(run_job, args)
+                except BrokenProcessPool:
+                    self.waiting.appendleft((future, args))
+                    self._restart()
+                    break
+                self.running[inner] = future
+                started.append(inner)
+        # Outside the lock: a future that is already done runs its callback here
+        for inner in started:
+            inner.add_done_callback(self._done)
+
+    def _done(self, inner: Future) -> None:
+        with self.lock:
+            future = self.running.get(inner)
+            if future is None:
+                return  # failed already by _restart()
+            if not inner.cancelled() and isinstance(inner.exception(), BrokenProcessPool):
+                self._restart()
+                return
+            del self.running[inner]
+        if inner.cancelled():
+            future.set_exception(RuntimeError("Server shutting down"))
+        elif inner.exception() is not None:
+            future.set_exception(inner.exception())
+        else:
+            future.set_result(inner.result())
+        self._dispatch()
+
+    def _restart(self) -> None:
+        """Fail every unfinished job and replace the broken executor (lock held)"""
+        error = RuntimeError("A worker process crashed; submit the job again")
+        failed = list(self.running.values()) + [future for future, _ in self.waiting]
+        self.running.clear()
+        self.waiting.clear()
+        broken, self.executor = self.executor, ProcessPoolExecutor(max_workers=self.workers)
+        broken.shutdown(wait=False, cancel_futures=True)
+        for future in failed:
+            if not future.done():
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(error)
+
+    def shutdown(self) -> None:
+        with self.lock:
+            for future, _ in self.waiting:
+                future.cancel()
+            self.waiting.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ==========================================================
+# JOBS
+# ==========================================================
+@dataclass
+class Job:
+    id: str
+    client: str
+    tool: str
+    pool: str
+    directory: str
+    future: Future
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    discard: bool = False  # deleted while running: drop once finished
+
+    @property
+    def status(self) -> str:
+        if self.future.cancelled():
+            return "cancelled"
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        if self.future.exception() is not None:
+            return "failed"
+        return "failed" if all(r.error for r in self.future.result()) else "done"
+
+    @property
+    def unfinished(self) -> bool:
+        return not self.future.done()
+
+    def results(self) -> List[cli.FileResult]:
+        if not self.future.done() or self.future.cancelled():
+            return []
+        if self.future.exception() is not None:
+            return [cli.FileResult(self.tool, error=str(self.future.exception()))]
+        return self.future.result()
+
+    def files(self) -> Dict[str, str]:
+        """Result file name -> path"""
+        return {os.path.basename(p): p for r in self.results() for p in r.written}
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "tool": self.tool,
+            "pool": self.pool,
+            "status": self.status,
+            "created": self.created,
+            "finished": self.finished,
+            "results": [
+                {
+                    "source": os.path.basename(r.source),
+                    "message": r.message,
+                    "error": r.error,
+                    "files": [f"/jobs/{self.id}/files/{os.path.basename(p)}" for p in r.written],
+                }
+                for r in self.results()
+            ],
+        }
+
+
+class JobManager:
+    """Job table and the two process pools"""
+
+    def __init__(self, root: str, light_workers: int = 2, heavy_workers: int = 1,
+                 max_queue: int = 32, client_jobs: int = 4, ttl_seconds: float = 3600):
+        self.root = root
+        self.max_queue = max_queue
+        self.client_jobs = client_jobs
+        self.ttl_seconds = ttl_seconds
+        self.pools = {LIGHT: _Pool(light_workers), HEAVY: _Pool(heavy_workers)}
+        self.jobs: Dict[str, Job] = {}
+        self.parser = cli.build_parser(_FormParser)
+        self._reserved = Counter()  # ("pool", name) / ("client", id) -> uploads in progress
+        self._lock = threading.Lock()
+
+        # Job directories left over from an earlier run
+        os.makedirs(root, exist_ok=True)
+        for name in os.listdir(root):
+            if re.fullmatch(r"[0-9a-f]{32}", name):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    @classmethod
+    def from_env(cls) -> "JobManager":
+        return cls(
+            root=os.environ.get("JOB_API_DIR") or os.path.join(tempfile.gettempdir(), "pdf-editor-jobs"),
+            light_workers=int(os.environ.get("JOB_API_LIGHT_WORKERS", "2")),
+            heavy_workers=int(os.environ.get("JOB_API_HEAVY_WORKERS", "0")) or max(1, (os.cpu_count() or 1) - 2),
+            max_queue=int(os.environ.get("JOB_API_MAX_QUEUE", "32")),
+            client_jobs=int(os.environ.get("JOB_API_CLIENT_JOBS", "4")),
+            ttl_seconds=float(os.environ.get("JOB_API_TTL_SECONDS", "3600")),
+        )
+
+    def shutdown(self) -> None:
+        for pool in self.pools.values():
+            pool.shutdown()
+
+    def tool_args(self, tool: str, fields: List[tuple], inputs: List[str], out_dir: str) -> argparse.Namespace:
+        """Parse form fields as the CLI options of tool
+
+        Raises ValueError for an unknown tool or a bad option.
+        """
+        sub = self.parser.commands.get(tool)
+        if sub is None:
+            raise ValueError(f"Unknown tool: {tool}")
+        flags = {o: a for a in sub._actions for o in a.option_strings}
+
+        argv = [tool]
+        merge_pages = []
+        for name, value in fields:
+            key = name.replace("_", "-")
+            option = "--" + key
+            if tool == "merge" and key == "pages":
+                merge_pages.append(value)
+                continue
+            if key in _RESERVED_FIELDS or option not in flags:
+                raise ValueError(f"Unknown option for {tool}: {name}")
+            if isinstance(flags[option], argparse._StoreTrueAction):
+                if value.lower() in ("1", "true", "yes", "on"):
+                    argv.append(option)
+            else:
+                argv += [option, value]
+
+        if tool == "merge":
+            specs = [f"{path}:{pages}" if pages.strip() else path
+                     for path, pages in zip(inputs, merge_pages + [""] * len(inputs))]
+            argv += specs + ["-o", os.path.join(out_dir, "merged_document.pdf")]
+        else:
+            argv += inputs + ["-o", out_dir]
+
+        args = self.parser.parse_args(argv)
+        cli.check_args(self.parser, args)
+        if getattr(args, "password", "") is None:
+            raise ValueError("password is required")
+        if hasattr(args, "ocr_workers") and args.ocr_workers is None:
+            args.ocr_workers = 1  # the pool is the parallelism
+        return args
+
+    def unfinished(self, attr: str, value: str) -> int:
+        """Unfinished jobs plus uploads holding a slot, for one pool or client"""
+        jobs = sum(1 for job in self.jobs.values() if job.unfinished and getattr(job, attr) == value)
+        return jobs + self._reserved[(attr, value)]
+
+    def reserve(self, client: str, tool: str) -> Optional[JSONResponse]:
+        """Take a queue and a client slot for a job, or an error response
+
+        Checked and taken in one step before the body is read, so uploads
+        running at the same time cannot all pass the limits. Every
+        successful reserve() must be paired with release().
+        """
+        pool = HEAVY if tool in HEAVY_TOOLS else LIGHT
+        with self._lock:
+            if self.unfinished("pool", pool) >= self.max_queue:
+                return JSONResponse({"error": f"The {pool} job queue is full, try again later"}, status_code=503)
+            if self.unfinished("client", client) >= self.client_jobs:
+                return JSONResponse(
+                    {"error": f"At most {self.client_jobs} unfinished jobs per client"}, status_code=429
+                )
+            self._reserved[("pool", pool)] += 1
+            self._reserved[("client", client)] += 1
+        return None
+
+    def release(self, client: str, tool: str) -> None:
+        """Give back the slots of reserve(); a submitted job now counts itself"""
+        pool = HEAVY if tool in HEAVY_TOOLS else LIGHT
+        with self._lock:
+            self._reserved[("pool", pool)] -= 1
+            self._reserved[("client", client)] -= 1
+
+    def submit(self, job_id: str, client: str, tool: str, args: argparse.Namespace) -> Job:
+        pool = HEAVY if tool in HEAVY_TOOLS else LIGHT
+        job = Job(job_id, client, tool, pool, os.path.join(self.root, job_id),
+                  self.pools[pool].submit(args))
+        self.jobs[job_id] = job
+        job.future.add_done_callback(lambda _: self._finished(job))
+        return job
+
+    def _finished(self, job: Job) -> None:
+        # Pool thread: only stamp the job, the table is changed by expire()
+        job.finished = time.time()
+
+    def remove(self, job: Job) -> None:
+        self.jobs.pop(job.id, None)
+        shutil.rmtree(job.directory, ignore_errors=True)
+
+    def expire(self) -> None:
+        """Drop finished jobs older than the TTL or deleted while running"""
+        now = time.time()
+        for job in list(self.jobs.values()):
+            if job.finished is not None and (job.discard or now - job.finished > self.ttl_seconds):
+                self.remove(job)
+
+
+# ==========================================================
+# HTTP
+# ==========================================================
+def _client(request: Request) -> str:
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+
+def _safe_name(name: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9._ -]", "_", os.path.basename(name or "")) or "upload.pdf"
+    return name if name.lower().endswith(".pdf") else name + ".pdf"
+
+
+def _limit_body(request: Request, max_bytes: int) -> Request:
+    """The request with a body that raises _UploadTooLarge past max_bytes
+
+    Content-Length is checked up front, but chunked requests have none,
+    so the bytes are counted as they stream in.
+    """
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise _UploadTooLarge()
+        return message
+
+    return Request(request.scope, receive)
+
+
+async def submit_job(request: Request) -> JSONResponse:
+    jobs: JobManager = request.app.state.jobs
+    jobs.expire()
+    tool = request.path_params["tool"]
+    client = _client(request)
+
+    if tool not in jobs.parser.commands:
+        return JSONResponse({"error": f"Unknown tool: {tool}"}, status_code=400)
+
+    max_bytes = int(os.environ.get("JOB_API_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+    if int(request.headers.get("content-length") or 0) > max_bytes:
+        return JSONResponse({"error": "Upload too large"}, status_code=413)
+
+    limited = jobs.reserve(client, tool)
+    if limited is not None:
+        return limited
+    try:
+        return await _accept_job(jobs, _limit_body(request, max_bytes), client, tool)
+    finally:
+        jobs.release(client, tool)
+
+
+async def _accept_job(jobs: JobManager, request: Request, client: str, tool: str) -> JSONResponse:
+    """Save the uploads and queue the job; nothing is left on disk on failure"""
+    job_id = uuid.uuid4().hex
+    directory = os.path.join(jobs.root, job_id)
+    out_dir = os.path.join(directory, "out")
+    os.makedirs(out_dir)
+
+    try:
+        inputs = []
+        fields = []
+        async with request.form() as form:
+            for name, value in form.multi_items():
+                if name != "file":
+                    fields.append((name, value))
+                    continue
+                if isinstance(value, str):
+                    raise ValueError('"file" must be a file upload')
+                # One directory per upload keeps the original name as the stem
+                path = os.path.join(directory, "in", str(len(inputs)), _safe_name(value.filename))
+                os.makedirs(os.path.dirname(path))
+                with open(path, "wb") as f:
+                    while chunk := await value.read(_CHUNK):
+                        f.write(chunk)
+                inputs.append(path)
+
+        if not inputs:
+            raise ValueError('Upload at least one PDF as "file"')
+        args = jobs.tool_args(tool, fields, inputs, out_dir)
+        job = jobs.submit(job_id, client, tool, args)
+    except ValueError as e:
+        shutil.rmtree(directory, ignore_errors=True)
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except HTTPException as e:  # malformed multipart body
+        shutil.rmtree(directory, ignore_errors=True)
+        return JSONResponse({"error": e.detail}, status_code=e.status_code)
+    except _UploadTooLarge:
+        shutil.rmtree(directory, ignore_errors=True)
+        return JSONResponse({"error": "Upload too large"}, status_code=413)
+    except Exception as e:
+        shutil.rmtree(directory, ignore_errors=True)
+        return JSONResponse({"error": str(e) or type(e).__name__}, status_code=500)
+    except BaseException:  # client went away mid-upload
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    return JSONResponse(job.to_json(), status_code=202, headers={"Location": f"/jobs/{job_id}"})
+
+
+def _job_or_404(request: Request):
+    job = request.app.state.jobs.jobs.get(request.path_params["job_id"])
+    if job is None:
+        return None, JSONResponse({"error": "No such job"}, status_code=404)
+    return job, None
+
+
+async def job_status(request: Request) -> JSONResponse:
+    request.app.state.jobs.expire()
+    job, missing = _job_or_404(request)
+    return missing or JSONResponse(job.to_json())
+
+
+async def job_file(request: Request):
+    request.app.state.jobs.expire()
+    job, missing = _job_or_404(request)
+    if missing:
+        return missing
+    path = job.files().get(request.path_params["name"])
+    if path is None or not os.path.exists(path):
+        return JSONResponse({"error": "No such file"}, status_code=404)
+    # Streamed from disk in chunks, never read whole into memory
+    return FileResponse(path, filename=os.path.basename(path))
+
+
+async def delete_job(request: Request) -> JSONResponse:
+    jobs: JobManager = request.app.state.jobs
+    jobs.expire()
+    job, missing = _job_or_404(request)
+    if missing:
+        return missing
+    if job.future.cancel() or job.future.done():
+        jobs.remove(job)
+        return JSONResponse({"id": job.id, "status": "deleted"})
+    # A running job cannot be interrupted; its files go when it finishes
+    job.discard = True
+    return JSONResponse({"id": job.id, "status": "running, will be deleted"}, status_code=202)
+
+
+async def list_tools(request: Request) -> JSONResponse:
+    commands = request.app.state.jobs.parser.commands
+    return JSONResponse({name: HEAVY if name in HEAVY_TOOLS else LIGHT for name in commands})
+
+
+def create_app(jobs: Optional[JobManager] = None) -> Starlette:
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.jobs = jobs or JobManager.from_env()
+        try:
+            yield
+        finally:
+            app.state.jobs.shutdown()
+
+    return Starlette(
+        routes=[
+            Route("/tools", list_tools, methods=["GET"]),
+            Route("/jobs/{tool}", submit_job, methods=["POST"]),
+            Route("/jobs/{job_id}", job_status, methods=["GET"]),
+            Route("/jobs/{job_id}", delete_job, methods=["DELETE"]),
+            Route("/jobs/{job_id}/files/{name}", job_file, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local HTTP job API for the PDF tools")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    args = parser.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Parallel OCR across pages.
+
+Each worker process receives the PDF bytes once and opens them with the
+render backend (pool initializer), then rasterises and OCRs individual
+pages on request, so tesseract runs on every core instead of one page
+after another. Results are returned in page order regardless of
+completion order.
+
+ocr_pages() returns plain text per page; ocr_page_words() also keeps the
+tesseract word boxes (image_to_data), in rendered-page pixels, for
+building a searchable text layer.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import sqlite3
+
+import numpy as np
+import pytesseract
+
+from ocr_store import OcrEntry, OcrStore, WordBox, image_key
+from preprocess import PreprocessOptions, preprocess as preprocess_image
+from raster import iter_page_images, open_document, page_count, render_page
+
+# Called as progress(pages_done, total_pages)
+ProgressCallback = Callable[[int, int], None]
+
+# Opened once per worker process by _init_worker
+_worker_doc = None
+
+_UNSET = object()
+_store = _UNSET
+
+
+def default_workers() -> int:
+    """Worker count from OCR_WORKERS, else one per CPU"""
+    return int(os.environ.get("OCR_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def get_store():
+    """The persistent OCR store for this process, None if disabled"""
+    global _store
+    if _store is _UNSET:
+        try:
+            _store = OcrStore.from_env()
+        except (OSError, sqlite3.Error):
+            _store = None  # read-only or broken cache location: OCR uncached
+    return _store
+
+
+def _lookup(img, lang: str, config: str):
+    """(store, key, stored entry or None); the store is None when disabled"""
+    store = get_store()
+    if store is None:
+        return None, None, None
+    key = image_key(img, lang, config)
+    try:
+        return store, key, store.get(key)
+    except sqlite3.Error:
+        return store, key, None
+
+
+def _save(store, key: str, text: str, words: Optional[List[WordBox]] = None) -> None:
+    if store is not None:
+        try:
+            store.put(key, text, words)
+        except sqlite3.Error:
+            pass
+
+
+def image_to_text(img, lang: str = "eng", config: str = "") -> str:
+    """tesseract image_to_string, answered from the OCR store when possible"""
+    store, key, entry = _lookup(img, lang, config)
+    if entry is not None:
+        return entry.text
+
+    text = pytesseract.image_to_string(img, lang=lang, config=config)
+    _save(store, key, text)
+    return text
+
+
+def _words_from_data(data) -> Tuple[str, List[WordBox]]:
+    """Text and word boxes from an image_to_data dict
+
+    Words on a line are joined with spaces, lines with newlines and
+    paragraphs with a blank line, like image_to_string output.
+    """
+    words = []
+    lines = []
+    last_line = last_par = None
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        if not word or float(data["conf"][i]) < 0:
+            continue
+        words.append((word, int(data["left"][i]), int(data["top"][i]),
+                      int(data["width"][i]), int(data["height"][i]), float(data["conf"][i])))
+
+        par = (data["block_num"][i], data["par_num"][i])
+        line = par + (data["line_num"][i],)
+        if line != last_line:
+            if last_par is not None and par != last_par:
+                lines.append("")
+            lines.append(word)
+        else:
+            lines[-1] += " " + word
+        last_line, last_par = line, par
+
+    return "\n".join(lines) + "\n" if lines else "", words
+
+
+def image_to_words(img, lang: str = "eng", config: str = "") -> OcrEntry:
+    """tesseract image_to_data as text plus word boxes, via the OCR store
+
+    A stored entry from a plain-text run keeps its text; only the boxes
+    are added.
+    """
+    store, key, entry = _lookup(img, lang, config)
+    if entry is not None and entry.words is not None:
+        return entry
+
+    data = pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+    text, words = _words_from_data(data)
+    if entry is not None:
+        text = entry.text
+    _save(store, key, text, words)
+    return OcrEntry(text, words)
+
+
+@dataclass
+class PageWords:
+    text: str
+    words: List[WordBox]   # boxes in rendered-page pixels
+    size: Tuple[int, int]  # rendered page (width, height) in pixels
+
+
+def _unmap_boxes(words: List[WordBox], matrix: np.ndarray) -> List[WordBox]:
+    """Map boxes from the preprocessed image back to the rendered page
+
+    Centres go through the inverse transform; sizes are only rescaled, as
+    an upright word on the deskewed image is a slightly tilted one on the
+    page and its bounding box would overstate the height.
+    """
+    if not words:
+        return []
+    boxes = np.array([w[1:5] for w in words], dtype=np.float64)
+    cx = boxes[:, 0] + boxes[:, 2] / 2
+    cy = boxes[:, 1] + boxes[:, 3] / 2
+
+    inverse = np.linalg.inv(matrix)
+    px = inverse[0, 0] * cx + inverse[0, 1] * cy + inverse[0, 2]
+    py = inverse[1, 0] * cx + inverse[1, 1] * cy + inverse[1, 2]
+    scale = np.sqrt(abs(np.linalg.det(inverse[:2, :2])))
+    width, height = boxes[:, 2] * scale, boxes[:, 3] * scale
+
+    return [
+        (w[0], int(round(x - wd / 2)), int(round(y - ht / 2)), int(round(wd)), int(round(ht)), w[5])
+        for w, x, y, wd, ht in zip(words, px, py, width, height)
+    ]
+
+
+def recognise_words(img, dpi: int, lang: str = "eng",
+                    preprocess: Optional[PreprocessOptions] = None) -> PageWords:
+    """Word-level OCR of one rendered page, boxes in its pixel space"""
+    if preprocess is None:
+        entry = image_to_words(img, lang=lang)
+        return PageWords(entry.text, entry.words, img.size)
+
+    prepared = preprocess_image(img, dpi, preprocess)
+    try:
+        entry = image_to_words(prepared.image, lang=lang, config=f"--dpi {prepared.dpi}")
+    finally:
+        prepared.image.close()
+    return PageWords(entry.text, _unmap_boxes(entry.words, prepared.matrix), img.size)
+
+
+def recognise_page(img, dpi: int, lang: str = "eng",
+                   preprocess: Optional[PreprocessOptions] = None) -> str:
+    """OCR one rendered page, cleaning it up first if options are given"""
+    if preprocess is None:
+        return image_to_text(img, lang=lang)
+
+    prepared = preprocess_image(img, dpi, preprocess)
+    try:
+        # Tell tesseract the real resolution, PIL images carry none
+        return image_to_text(prepared.image, lang=lang, config=f"--dpi {prepared.dpi}")
+    finally:
+        prepared.image.close()
+
+
+def _init_worker(pdf_bytes: bytes) -> None:
+    global _worker_doc
+    _worker_doc = open_document(pdf_bytes)
+
+
+def ocr_page(pdf_bytes: bytes, page_no: int, dpi: int = 300, lang: str = "eng",
+             preprocess: Optional[PreprocessOptions] = None) -> str:
+    """Rasterise one 1-based page and return its tesseract text"""
+    for _, img in iter_page_images(pdf_bytes, dpi=dpi, first_page=page_no, last_page=page_no):
+        return recognise_page(img, dpi, lang, preprocess)
+    return ""
+
+
+class TesseractMissing(OSError):
+    """TesseractNotFoundError raised in a worker process
+
+    pytesseract's own exception cannot be unpickled, so coming back from
+    a pool it would surface as BrokenProcessPool instead.
+    """
+
+
+def is_tesseract_missing(error: Optional[BaseException]) -> bool:
+    return isinstance(error, (pytesseract.TesseractNotFoundError, TesseractMissing))
+
+
+def _ocr_worker_page(recognise, page_no: int, dpi: int, lang: str, preprocess: Optional[PreprocessOptions]):
+    img = render_page(_worker_doc, page_no - 1, dpi)
+    try:
+        return recognise(img, dpi, lang, preprocess)
+    except pytesseract.TesseractNotFoundError as e:
+        raise TesseractMissing(str(e)) from None
+    finally:
+        img.close()
+
+
+def _iter_selected(pdf_bytes: bytes, pages: Sequence[int], dpi: int):
+    """Like iter_page_images, for an arbitrary list of 1-based pages"""
+    with open_document(pdf_bytes) as doc:
+        for page_no in pages:
+            img = render_page(doc, page_no - 1, dpi)
+            try:
+                yield page_no, img
+            finally:
+                img.close()
+
+
+def _map_pages(recognise, pdf_bytes: bytes, dpi: int, lang: str,
+               workers: Optional[int], progress: Optional[ProgressCallback],
+               pages: Optional[Sequence[int]], preprocess: Optional[PreprocessOptions]) -> list:
+    """Run recognise(img, dpi, lang, preprocess) over pages, results in order"""
+    all_pages = pages is None
+    if all_pages:
+        pages = range(1, page_count(pdf_bytes) + 1)
+    pages = list(pages)
+    total = len(pages)
+    workers = min(workers or default_workers(), total) or 1
+    results = [None] * total
+
+    # Single worker: no pool, stream pages in-process
+    if workers == 1:
+        images = iter_page_images(pdf_bytes, dpi=dpi) if all_pages else _iter_selected(pdf_bytes, pages, dpi)
+        for done, (_, img) in enumerate(images, start=1):
+            results[done - 1] = recognise(img, dpi, lang, preprocess)
+            if progress:
+                progress(done, total)
+        return results
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pdf_bytes,))
+    try:
+        futures = {
+            executor.submit(_ocr_worker_page, recognise, page_no, dpi, lang, preprocess): i
+            for i, page_no in enumerate(pages)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if progress:
+                progress(done, total)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return results
+
+
+def ocr_pages(pdf_bytes: bytes, dpi: int = 300, lang: str = "eng",
+              workers: Optional[int] = None,
+              progress: Optional[ProgressCallback] = None,
+              pages: Optional[Sequence[int]] = None,
+              preprocess: Optional[PreprocessOptions] = None) -> List[str]:
+    """OCR pages concurrently and return the texts in order
+
+    pages selects 1-based pages to OCR (default: all); the result has one
+    text per selected page, in the order given. preprocess enables the
+    OpenCV clean-up stage (see preprocess.py) with the given options.
+    """
+    return _map_pages(recognise_page, pdf_bytes, dpi, lang, workers, progress, pages, preprocess)
+
+
+def ocr_page_words(pdf_bytes: bytes, dpi: int = 300, lang: str = "eng",
+                   workers: Optional[int] = None,
+                   progress: Optional[ProgressCallback] = None,
+                   pages: Optional[Sequence[int]] = None,
+                   preprocess: Optional[PreprocessOptions] = None) -> List[PageWords]:
+    """Like ocr_pages(), keeping each page's word boxes"""
+    return _map_pages(recognise_words, pdf_bytes, dpi, lang, workers, progress, pages, preprocess)
+
+
+def ocr_text(pdf_bytes: bytes, dpi: int = 300, lang: str = "eng",
+             workers: Optional[int] = None,
+             progress: Optional[ProgressCallback] = None,
+             preprocess: Optional[PreprocessOptions] = None) -> str:
+    """OCR every page and join the texts the way extract_text() does"""
+    texts = ocr_pages(pdf_bytes, dpi, lang, workers, progress, preprocess=preprocess)
+    return "".join(text + "\n\n" for text in texts)
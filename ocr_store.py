@@ -0,0 +1,170 @@
+"""
+Persistent OCR result store.
+
+Tesseract output is saved in a SQLite file keyed by the SHA-256 of the
+rendered page bitmap plus the language and tesseract config, so the same
+scanned page OCR'd again (re-upload, another user, another process) is a
+lookup instead of a tesseract run. Entries hold the text and, when the
+caller has them, the word boxes. The file is trimmed least-recently-used
+first once it grows past its byte budget.
+
+Configuration (environment variables):
+    OCR_CACHE_PATH   SQLite file, default ~/.cache/pdf-editor-pro/ocr.sqlite
+    OCR_CACHE_MB     byte budget, default 256; 0 disables the store
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pdf-editor-pro", "ocr.sqlite")
+
+# Trim to this fraction of the budget so eviction does not run on every put
+EVICT_TO = 0.9
+
+# (text, left, top, width, height, confidence)
+WordBox = Tuple[str, int, int, int, int, float]
+
+
+@dataclass
+class OcrEntry:
+    text: str
+    words: Optional[List[WordBox]] = None
+
+
+def image_key(img: Image.Image, lang: str = "eng", config: str = "") -> str:
+    """Hash of the bitmap (mode, size, pixels) plus OCR settings"""
+    h = hashlib.sha256()
+    h.update(f"{img.mode}\0{img.size}\0{lang}\0{config}\0".encode("utf-8"))
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+class OcrStore:
+    """SQLite-backed OCR results with size-based LRU eviction
+
+    A connection is opened per operation, so one store object is safe to
+    use from Streamlit threads and from forked OCR worker processes.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ocr (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    words TEXT,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ocr_last_used ON ocr (last_used)")
+
+            # Running byte total kept by triggers, so a put does not re-sum
+            # the table and every process sharing the file sees the same total
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ocr_total (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    bytes INTEGER NOT NULL
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO ocr_total VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM ocr))")
+            conn.executescript("""
+                CREATE TRIGGER IF NOT EXISTS ocr_total_insert AFTER INSERT ON ocr
+                BEGIN UPDATE ocr_total SET bytes = bytes + NEW.size; END;
+                CREATE TRIGGER IF NOT EXISTS ocr_total_delete AFTER DELETE ON ocr
+                BEGIN UPDATE ocr_total SET bytes = bytes - OLD.size; END;
+                CREATE TRIGGER IF NOT EXISTS ocr_total_update AFTER UPDATE OF size ON ocr
+                BEGIN UPDATE ocr_total SET bytes = bytes - OLD.size + NEW.size; END;
+            """)
+
+    @classmethod
+    def from_env(cls) -> Optional["OcrStore"]:
+        """Store configured from the environment, None when disabled"""
+        max_mb = int(os.environ.get("OCR_CACHE_MB", "256"))
+        if max_mb <= 0:
+            return None
+        return cls(os.environ.get("OCR_CACHE_PATH") or DEFAULT_PATH, max_mb * 1024 * 1024)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    # ------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------
+    def get(self, key: str) -> Optional[OcrEntry]:
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT text, words FROM ocr WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE ocr SET last_used = ? WHERE key = ?", (time.time(), key))
+
+        text, words = row
+        return OcrEntry(text, [tuple(w) for w in json.loads(words)] if words is not None else None)
+
+    def put(self, key: str, text: str, words: Optional[List[WordBox]] = None) -> None:
+        words_json = json.dumps(words) if words is not None else None
+        size = len(key) + len(text.encode("utf-8")) + len(words_json or "")
+        if size > self.max_bytes:
+            return
+
+        # Upserts, not INSERT OR REPLACE: a replace would skip the delete trigger
+        with closing(self._connect()) as conn, conn:
+            if words_json is None:
+                # Keep word boxes stored by an earlier, word-level run (JSON, so ASCII)
+                conn.execute(
+                    "INSERT INTO ocr (key, text, words, size, last_used) VALUES (?, ?, NULL, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET text = excluded.text, "
+                    "size = excluded.size + COALESCE(LENGTH(ocr.words), 0), last_used = excluded.last_used",
+                    (key, text, size, time.time()),
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO ocr (key, text, words, size, last_used) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET text = excluded.text, words = excluded.words, "
+                    "size = excluded.size, last_used = excluded.last_used",
+                    (key, text, words_json, size, time.time()),
+                )
+            self._evict(conn)
+
+    def total_bytes(self) -> int:
+        with closing(self._connect()) as conn:
+            return self._total(conn)
+
+    def clear(self) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM ocr")
+
+    # ------------------------------------------------------
+    # Eviction
+    # ------------------------------------------------------
+    @staticmethod
+    def _total(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT bytes FROM ocr_total").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = self._total(conn)
+        if total <= self.max_bytes:
+            return
+
+        # Oldest first, read only as far as needed
+        target = self.max_bytes * EVICT_TO
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM ocr ORDER BY last_used"):
+            if total <= target:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM ocr WHERE key = ?", stale)
@@ -0,0 +1,636 @@
+"""
+UI-free PDF operations.
+
+Every tool in app.py calls into this module so the same code path can be
+used from batch jobs, benchmarks and worker pools without a Streamlit
+session. Functions take raw PDF bytes (or a binary file object) and return
+bytes or plain data objects.
+"""
+
+import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import BinaryIO, Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import PyPDF2
+import img2pdf
+from PIL import Image
+
+import ocr
+from archive import build_archive, spool_output
+from dedup import dedupe_objects
+from preprocess import PreprocessOptions
+from raster import FITZ_LOCK, iter_page_images, render_pages
+from watermark import WatermarkSpec, apply_watermark
+
+PdfSource = Union[bytes, BinaryIO]
+
+# Compression levels understood by compress()
+COMPRESS_LOW = "low"
+COMPRESS_MEDIUM = "medium"
+COMPRESS_HIGH = "high"
+
+# Pages whose text layer has fewer non-whitespace characters than this are
+# treated as scanned by hybrid_text()
+MIN_TEXT_LAYER_CHARS = 20
+
+
+# ==========================================================
+# HELPERS
+# ==========================================================
+def _to_bytes(pdf: PdfSource) -> bytes:
+    """Return the raw bytes of a PDF given as bytes or a file object"""
+    if isinstance(pdf, (bytes, bytearray)):
+        return bytes(pdf)
+    if hasattr(pdf, "getvalue"):
+        return pdf.getvalue()
+    pdf.seek(0)
+    return pdf.read()
+
+
+def open_reader(pdf: PdfSource) -> PyPDF2.PdfReader:
+    """Open a PdfReader over bytes or a file object"""
+    if isinstance(pdf, (bytes, bytearray)):
+        return PyPDF2.PdfReader(io.BytesIO(pdf))
+    return PyPDF2.PdfReader(pdf)
+
+
+def _write(writer: PyPDF2.PdfWriter) -> bytes:
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def page_count(pdf: PdfSource) -> int:
+    return len(open_reader(pdf).pages)
+
+
+def parse_page_list(spec: str) -> List[int]:
+    """Parse '1,3,5-7' into a sorted, de-duplicated list of page numbers"""
+    pages = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = map(int, part.split("-"))
+            pages.extend(range(start, end + 1))
+        else:
+            pages.append(int(part))
+    return sorted(set(pages))
+
+
+# ==========================================================
+# PAGE OPERATIONS
+# ==========================================================
+@dataclass
+class MergeInput:
+    pdf: Union[PdfSource, str]  # a str is a file path, opened when the merge reaches it
+    pages: Optional[Sequence[int]] = None  # 1-based pages to take, default all
+
+
+def _parse_merge_input(item: MergeInput) -> Tuple[PyPDF2.PdfReader, List[int]]:
+    """Open one input and load its selected page objects (pool thread)"""
+    if isinstance(item.pdf, str):
+        reader = PyPDF2.PdfReader(open(item.pdf, "rb"))
+    else:
+        reader = open_reader(item.pdf)
+    try:
+        total = len(reader.pages)
+        if item.pages is None:
+            indexes = list(range(total))
+        else:
+            bad = [p for p in item.pages if not 1 <= p <= total]
+            if bad:
+                raise ValueError(f"Page {bad[0]} is out of range (1-{total})")
+            indexes = [p - 1 for p in item.pages]
+
+        for index in indexes:
+            reader.pages[index]
+    except BaseException:
+        _close_merge_input(item, reader)
+        raise
+    return reader, indexes
+
+
+def _close_merge_input(item: MergeInput, reader: PyPDF2.PdfReader) -> None:
+    """Close the file _parse_merge_input() opened for a path input"""
+    if isinstance(item.pdf, str):
+        reader.stream.close()
+
+
+def merge_to_file(inputs: Sequence[Union[MergeInput, PdfSource]], workers: int = 4,
+                  dedupe: bool = True) -> BinaryIO:
+    """Merge PDFs (optionally page ranges of them) into a spooled file
+
+    Inputs are parsed in a thread pool, at most `workers` ahead of the one
+    being appended, and each reader is dropped once its pages are copied
+    into the output, so memory holds a few parsed inputs rather than all
+    of them. Inputs given as file paths are opened only when the window
+    reaches them and closed once appended. With dedupe, fonts, images and
+    other resources repeated across inputs are stored once (see dedup.py).
+    The output is written to a temp file that spills to disk; the caller
+    closes the handle.
+    """
+    items = [item if isinstance(item, MergeInput) else MergeInput(item) for item in inputs]
+    writer = PyPDF2.PdfWriter()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = deque()
+        queued = iter(items)
+        for item in islice(queued, max(1, workers)):
+            pending.append((item, executor.submit(_parse_merge_input, item)))
+
+        try:
+            while pending:
+                item, future = pending.popleft()
+                reader, indexes = future.result()
+                for queued_item in islice(queued, 1):
+                    pending.append((queued_item, executor.submit(_parse_merge_input, queued_item)))
+                try:
+                    writer.append(reader, pages=indexes)
+                finally:
+                    _close_merge_input(item, reader)
+                del reader
+        finally:
+            # A failed input stops the merge: close what the window opened
+            for item, future in pending:
+                if not future.cancel() and future.exception() is None:
+                    _close_merge_input(item, future.result()[0])
+
+    if dedupe:
+        dedupe_objects(writer)
+    return spool_output(writer.write)
+
+
+def merge(inputs: Sequence[Union[MergeInput, PdfSource]], workers: int = 4, dedupe: bool = True) -> bytes:
+    """Merge several PDFs into one, in the given order"""
+    with merge_to_file(inputs, workers, dedupe) as merged:
+        return merged.read()
+
+
+def iter_split_pages(pdf: PdfSource) -> Iterator[bytes]:
+    """Yield one single-page PDF per page, in order"""
+    reader = open_reader(pdf)
+    for page in reader.pages:
+        writer = PyPDF2.PdfWriter()
+        writer.add_page(page)
+        yield _write(writer)
+
+
+def split_pages(pdf: PdfSource) -> List[bytes]:
+    """Split a PDF into one single-page PDF per page"""
+    return list(iter_split_pages(pdf))
+
+
+def split_page(pdf: PdfSource, page_no: int) -> bytes:
+    """Return a single 1-based page as its own PDF"""
+    return split_range(pdf, page_no, page_no)
+
+
+def split_archive(pdf: PdfSource) -> BinaryIO:
+    """ZIP of one PDF per page, spooled entry by entry; the caller closes it"""
+    return build_archive(
+        (f"page_{page_no}.pdf", data)
+        for page_no, data in enumerate(iter_split_pages(pdf), start=1)
+    )
+
+
+def split_range(pdf: PdfSource, start: int, end: int) -> bytes:
+    """Return pages start..end (1-based, inclusive) as a new PDF"""
+    reader = open_reader(pdf)
+    writer = PyPDF2.PdfWriter()
+    for i in range(start - 1, end):
+        writer.add_page(reader.pages[i])
+    return _write(writer)
+
+
+def extract_pages(pdf: PdfSource, pages: Sequence[int]) -> bytes:
+    """Return the given 1-based pages as a new PDF
+
+    Raises ValueError if a page number is out of range.
+    """
+    reader = open_reader(pdf)
+    num_pages = len(reader.pages)
+    if not all(1 <= p <= num_pages for p in pages):
+        raise ValueError("Invalid page numbers")
+
+    writer = PyPDF2.PdfWriter()
+    for page_num in pages:
+        writer.add_page(reader.pages[page_num - 1])
+    return _write(writer)
+
+
+def rotate(pdf: PdfSource, angle: int, pages: Optional[Sequence[int]] = None) -> bytes:
+    """Rotate pages clockwise by angle; pages=None rotates every page"""
+    reader = open_reader(pdf)
+    writer = PyPDF2.PdfWriter()
+    selected = set(pages) if pages is not None else None
+
+    for i, page in enumerate(reader.pages, 1):
+        if selected is None or i in selected:
+            page = page.rotate(angle)
+        writer.add_page(page)
+    return _write(writer)
+
+
+def reorder(pdf: PdfSource, order: Sequence[int]) -> bytes:
+    """Rewrite the PDF with pages in the given 1-based order
+
+    Raises ValueError unless order is a permutation of every page.
+    """
+    reader = open_reader(pdf)
+    total_pages = len(reader.pages)
+    if len(order) != total_pages:
+        raise ValueError("Page count mismatch.")
+    if sorted(order) != list(range(1, total_pages + 1)):
+        raise ValueError("Invalid page numbers or duplicates detected.")
+
+    writer = PyPDF2.PdfWriter()
+    for p in order:
+        writer.add_page(reader.pages[p - 1])
+    return _write(writer)
+
+
+# ==========================================================
+# WATERMARK
+# ==========================================================
+def watermark(pdf: PdfSource, spec: WatermarkSpec) -> bytes:
+    """Stamp a centred, rotated, semi-transparent text on every page
+
+    The stamp is rendered once per distinct page size and shared by all
+    pages of that size (see watermark.apply_watermark).
+    """
+    return _write(apply_watermark(open_reader(pdf), spec))
+
+
+# ==========================================================
+# COMPRESSION
+# ==========================================================
+@dataclass
+class CompressResult:
+    data: bytes
+    method: str
+
+
+def compress_streams(pdf: PdfSource) -> bytes:
+    """Lossless compression of page content streams"""
+    reader = open_reader(pdf)
+    writer = PyPDF2.PdfWriter()
+    for page in reader.pages:
+        page.compress_content_streams()
+        writer.add_page(page)
+    return _write(writer)
+
+
+def raster_compress(pdf: PdfSource, dpi: int, quality: int,
+                    progress: Optional[ocr.ProgressCallback] = None) -> bytes:
+    """Re-encode every page as a JPEG image and rebuild the PDF
+
+    Pages are rendered one at a time; only the encoded JPEGs are kept.
+    progress(done, total) is called after each page.
+    """
+    pdf_bytes = _to_bytes(pdf)
+    total = page_count(pdf_bytes) if progress else 0
+    img_buffers = []
+
+    for page_no, img in iter_page_images(pdf_bytes, dpi=dpi):
+        buf = io.BytesIO()
+        img.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True)
+        img_buffers.append(buf.getvalue())
+        if progress:
+            progress(page_no, total)
+
+    return img2pdf.convert(img_buffers)
+
+
+def compress(pdf: PdfSource, level: str = COMPRESS_LOW,
+             progress: Optional[ocr.ProgressCallback] = None) -> CompressResult:
+    """Compress a PDF; medium/high fall back to rasterised pages
+
+    Low and medium never return a file larger than the stream-compressed
+    version; high always rasterises. progress counts rasterised pages.
+    """
+    result = CompressResult(compress_streams(pdf), "Text stream compression")
+
+    if level == COMPRESS_MEDIUM:
+        img_bytes = raster_compress(pdf, dpi=150, quality=70, progress=progress)
+        if len(img_bytes) < len(result.data):
+            result = CompressResult(img_bytes, "Medium raster compression")
+
+    elif level == COMPRESS_HIGH:
+        result = CompressResult(raster_compress(pdf, dpi=72, quality=45, progress=progress),
+                                "Forced raster compression")
+
+    return result
+
+
+# ==========================================================
+# PASSWORDS
+# ==========================================================
+def protect(pdf: PdfSource, password: str) -> bytes:
+    """Encrypt the PDF with a user password"""
+    reader = open_reader(pdf)
+    writer = PyPDF2.PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+    writer.encrypt(user_password=password)
+    return _write(writer)
+
+
+def unlock(pdf: PdfSource, password: str) -> bytes:
+    """Remove the password from an encrypted PDF
+
+    Raises ValueError if the password is wrong.
+    """
+    reader = open_reader(pdf)
+    if reader.is_encrypted and reader.decrypt(password) == 0:
+        raise ValueError("Incorrect password.")
+
+    writer = PyPDF2.PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+    return _write(writer)
+
+
+# ==========================================================
+# REDACTION
+# ==========================================================
+def redact(pdf: PdfSource, terms: Sequence[str]) -> Tuple[bytes, int]:
+    """Permanently black out every exact match of terms
+
+    Returns the redacted PDF and the number of redacted matches.
+    """
+    import fitz  # PyMuPDF
+
+    with FITZ_LOCK:
+        doc = fitz.open(stream=_to_bytes(pdf), filetype="pdf")
+        total = 0
+
+        for page in doc:
+            for term in terms:
+                for inst in page.search_for(term):
+                    page.add_redact_annot(inst, fill=(0, 0, 0))
+                    total += 1
+            page.apply_redactions()
+
+        redacted = doc.tobytes()
+        doc.close()
+    return redacted, total
+
+
+# ==========================================================
+# TEXT
+# ==========================================================
+# Called as on_page(page_no, total_pages, page_text) as each page finishes
+PageTextCallback = Callable[[int, int, str], None]
+
+
+def iter_page_texts(pdf: PdfSource) -> Iterator[Tuple[int, int, str]]:
+    """(page_no, total_pages, text) for each page, as it is extracted"""
+    reader = open_reader(pdf)
+    total = len(reader.pages)
+    for page_no, page in enumerate(reader.pages, start=1):
+        yield page_no, total, page.extract_text() or ""
+
+
+def extract_text(pdf: PdfSource, on_page: Optional[PageTextCallback] = None) -> str:
+    """Extract the text layer of every page
+
+    Pages are collected in a list and joined once; on_page sees each page
+    as soon as it is extracted, for showing early results.
+    """
+    parts = []
+    for page_no, total, txt in iter_page_texts(pdf):
+        if txt:
+            parts.append(txt + "\n\n")
+        if on_page:
+            on_page(page_no, total, txt)
+    return "".join(parts)
+
+
+def ocr_text(pdf: PdfSource, dpi: int = 300, workers: Optional[int] = None,
+             progress: Optional[ocr.ProgressCallback] = None,
+             preprocess: Optional[PreprocessOptions] = None) -> str:
+    """Rasterise and OCR every page across a process pool, in page order"""
+    return ocr.ocr_text(_to_bytes(pdf), dpi=dpi, workers=workers, progress=progress, preprocess=preprocess)
+
+
+@dataclass
+class HybridText:
+    text: str
+    ocr_pages: List[int]  # 1-based pages whose text came from OCR
+
+
+def _layer_texts(reader: PyPDF2.PdfReader, min_chars: int) -> Tuple[List[str], List[int]]:
+    """Each page's text layer, and the 1-based pages with too little of one"""
+    texts = []
+    scanned = []
+    for page_no, page in enumerate(reader.pages, start=1):
+        txt = page.extract_text() or ""
+        texts.append(txt)
+        if len("".join(txt.split())) < min_chars:
+            scanned.append(page_no)
+    return texts, scanned
+
+
+def scanned_pages(pdf: PdfSource, min_chars: int = MIN_TEXT_LAYER_CHARS) -> List[int]:
+    """1-based pages with little or no text layer"""
+    return _layer_texts(open_reader(pdf), min_chars)[1]
+
+
+def hybrid_text(pdf: PdfSource, dpi: int = 300, min_chars: int = MIN_TEXT_LAYER_CHARS,
+                workers: Optional[int] = None,
+                progress: Optional[ocr.ProgressCallback] = None,
+                preprocess: Optional[PreprocessOptions] = None) -> HybridText:
+    """Use each page's text layer, OCR only pages with little or none
+
+    A page is OCR'd when its text layer has fewer than min_chars
+    non-whitespace characters (scanned pages, image-only annexures).
+    progress counts OCR'd pages only.
+    """
+    pdf_bytes = _to_bytes(pdf)
+    texts, scanned = _layer_texts(open_reader(pdf_bytes), min_chars)
+
+    if scanned:
+        ocr_texts = ocr.ocr_pages(pdf_bytes, dpi=dpi, workers=workers, progress=progress,
+                                  pages=scanned, preprocess=preprocess)
+        for page_no, txt in zip(scanned, ocr_texts):
+            texts[page_no - 1] = txt
+
+    return HybridText("".join(txt + "\n\n" for txt in texts if txt), scanned)
+
+
+@dataclass
+class SearchablePdf:
+    pdf: bytes
+    text: str
+    ocr_pages: List[int]  # 1-based pages that got an OCR text layer
+
+
+def searchable_pdf(pdf: PdfSource, dpi: int = 300, min_chars: int = MIN_TEXT_LAYER_CHARS,
+                   workers: Optional[int] = None,
+                   progress: Optional[ocr.ProgressCallback] = None,
+                   preprocess: Optional[PreprocessOptions] = None,
+                   ocr_every_page: bool = False) -> SearchablePdf:
+    """Add an invisible OCR text layer to pages that lack one
+
+    Pages are chosen as in hybrid_text(); the text is returned as well,
+    so one OCR run serves both the download and the extraction. With
+    ocr_every_page the text is OCR'd from every page (as ocr_text()),
+    in the same run, but the text layer still goes only on pages that
+    lack one.
+    """
+    from text_layer import make_searchable
+
+    pdf_bytes = _to_bytes(pdf)
+    texts, scanned = _layer_texts(open_reader(pdf_bytes), min_chars)
+    ocr_pages = list(range(1, len(texts) + 1)) if ocr_every_page else scanned
+    if not ocr_pages:
+        return SearchablePdf(pdf_bytes, "".join(txt + "\n\n" for txt in texts if txt), [])
+
+    page_words = dict(zip(ocr_pages, ocr.ocr_page_words(pdf_bytes, dpi=dpi, workers=workers, progress=progress,
+                                                          pages=ocr_pages, preprocess=preprocess)))
+    for page_no, words in page_words.items():
+        texts[page_no - 1] = words.text
+
+    return SearchablePdf(
+        make_searchable(pdf_bytes, {page_no: page_words[page_no] for page_no in scanned}) if scanned else pdf_bytes,
+        "".join(txt + "\n\n" for txt in texts if txt),
+        scanned
+    )
+
+
+# ==========================================================
+# IMAGES
+# ==========================================================
+@dataclass
+class PageImage:
+    name: str
+    data: bytes
+    page: int
+    mime: str = "image/png"
+
+
+def _embedded_image(obj) -> Optional[Image.Image]:
+    """Decode an image XObject into a PIL image, or None if unsupported"""
+    data = obj.get_data()
+
+    filters = obj.get("/Filter")
+    if filters and not isinstance(filters, list):
+        filters = [filters]
+    elif not filters:
+        filters = []
+
+    # JPEG / JPEG2000
+    if "/DCTDecode" in filters or "/JPXDecode" in filters:
+        return Image.open(io.BytesIO(data)).convert("RGB")
+
+    # RAW bitmap (logos, stamps)
+    width = obj.get("/Width")
+    height = obj.get("/Height")
+    if not width or not height:
+        return None
+
+    color_space = obj.get("/ColorSpace")
+    if isinstance(color_space, list) and color_space[0] == "/ICCBased":
+        mode = "RGB"
+    elif color_space == "/DeviceRGB":
+        mode = "RGB"
+    elif color_space == "/DeviceCMYK":
+        mode = "CMYK"
+    elif color_space == "/DeviceGray":
+        mode = "L"
+    else:
+        return None
+
+    try:
+        return Image.frombytes(mode, (width, height), data)
+    except Exception:
+        return None
+
+
+def extract_embedded_images(pdf: PdfSource) -> List[PageImage]:
+    """Extract embedded image XObjects as PNGs"""
+    reader = open_reader(pdf)
+    extracted = []
+
+    for page_num, page in enumerate(reader.pages, start=1):
+        resources = page.get("/Resources")
+        if not resources:
+            continue
+
+        xobjects = resources.get("/XObject")
+        if not xobjects:
+            continue
+
+        xobjects = xobjects.get_object()
+
+        for obj_name in xobjects:
+            obj = xobjects[obj_name]
+            if obj.get("/Subtype") != "/Image":
+                continue
+
+            try:
+                img = _embedded_image(obj)
+            except Exception:
+                continue
+
+            if img:
+                buf = io.BytesIO()
+                img.save(buf, format="PNG")
+                extracted.append(PageImage(f"page_{page_num}_{obj_name[1:]}.png", buf.getvalue(), page_num))
+
+    return extracted
+
+
+def iter_pdf_to_images(pdf: PdfSource, dpi: int = 150, image_format: str = "PNG") -> Iterator[PageImage]:
+    """Render pages one at a time and yield each as an encoded PNG or JPEG"""
+    for page_no, img in iter_page_images(_to_bytes(pdf), dpi=dpi):
+        buf = io.BytesIO()
+        if image_format == "PNG":
+            img.save(buf, format="PNG")
+            ext, mime = "png", "image/png"
+        else:
+            img.convert("RGB").save(buf, format="JPEG", quality=90)
+            ext, mime = "jpg", "image/jpeg"
+        yield PageImage(f"page_{page_no}.{ext}", buf.getvalue(), page_no, mime)
+
+
+def pdf_to_images(pdf: PdfSource, dpi: int = 150, image_format: str = "PNG") -> List[PageImage]:
+    """Render every page to a PNG or JPEG image"""
+    return list(iter_pdf_to_images(pdf, dpi, image_format))
+
+
+def iter_extract_images(pdf: PdfSource) -> Tuple[Iterator[PageImage], bool]:
+    """Embedded images, or full-page renders yielded one page at a time
+
+    Returns the images and whether the scanned-PDF fallback was used.
+    """
+    images = extract_embedded_images(pdf)
+    if images:
+        return iter(images), False
+    return iter_pdf_to_images(pdf, dpi=300, image_format="PNG"), True
+
+
+def extract_images(pdf: PdfSource) -> Tuple[List[PageImage], bool]:
+    """Extract embedded images, falling back to full-page renders
+
+    Returns the images and whether the scanned-PDF fallback was used.
+    """
+    images, rendered = iter_extract_images(pdf)
+    return list(images), rendered
+
+
+def make_thumbnail(image_data: bytes, size: Tuple[int, int] = (350, 350)) -> Image.Image:
+    """Return a small preview image bounded by size"""
+    thumb = Image.open(io.BytesIO(image_data))
+    thumb.thumbnail(size)
+    return thumb
+
+
+def render_preview(pdf: PdfSource, dpi: int = 90, first_page: int = 1, last_page: int = 1) -> List[Image.Image]:
+    """Render a page range for on-screen previews"""
+    return render_pages(_to_bytes(pdf), dpi=dpi, first_page=first_page, last_page=last_page)
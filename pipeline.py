@@ -0,0 +1,131 @@
+"""
+Single-pass multi-operation pipeline.
+
+Rotating, watermarking, compressing and protecting one after another
+through the individual tools parses and re-serialises the whole PDF once
+per tool. run_pipeline() parses the input once, applies every queued step
+to the pages of one in-memory PdfWriter and serialises once at the end,
+so a job of N steps costs one read and one write.
+
+Steps are small frozen dataclasses so a queue can be kept in session
+state and used as part of a result-cache key.
+"""
+
+import io
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple, Union
+
+import PyPDF2
+from PyPDF2.generic import ArrayObject, IndirectObject
+
+from pdf_ops import PdfSource, open_reader
+from watermark import WatermarkSpec, stamp_pages
+
+
+@dataclass(frozen=True)
+class RotateStep:
+    angle: int
+    pages: Optional[Tuple[int, ...]] = None  # 1-based, None = every page
+
+    def describe(self) -> str:
+        where = "all pages" if self.pages is None else "pages " + ", ".join(map(str, self.pages))
+        return f"🔄 Rotate {self.angle}° ({where})"
+
+
+@dataclass(frozen=True)
+class WatermarkStep:
+    spec: WatermarkSpec
+
+    def describe(self) -> str:
+        return f"💧 Watermark \"{self.spec.text}\""
+
+
+@dataclass(frozen=True)
+class CompressStep:
+    """Lossless content stream compression
+
+    The raster levels of compress() re-render every page as an image, so
+    they cannot be applied to pages kept in a writer and are not offered.
+    """
+
+    def describe(self) -> str:
+        return "🗜️ Compress (lossless)"
+
+
+@dataclass(frozen=True)
+class EncryptStep:
+    password: str
+
+    def describe(self) -> str:
+        return "🔐 Protect with password"
+
+
+Step = Union[RotateStep, WatermarkStep, CompressStep, EncryptStep]
+
+
+def _page_indexes(pages: Optional[Sequence[int]], total: int) -> Sequence[int]:
+    if pages is None:
+        return range(total)
+    bad = [p for p in pages if not 1 <= p <= total]
+    if bad:
+        raise ValueError(f"Page {bad[0]} is out of range (1-{total})")
+    return [p - 1 for p in pages]
+
+
+def _compress_contents(writer: PyPDF2.PdfWriter, page: PyPDF2.PageObject) -> None:
+    """Flate-encode the page's content streams in place
+
+    PageObject.compress_content_streams() would merge a page's streams
+    into a new one, leaving the old objects (and the shared watermark
+    streams) to be written alongside it. Encoding each stream object where
+    it is keeps shared streams shared and adds nothing to the file.
+    """
+    if "/Contents" not in page:
+        return
+    contents = page.raw_get("/Contents")
+    refs = contents.get_object() if isinstance(contents.get_object(), ArrayObject) else [contents]
+    for ref in refs:
+        if not isinstance(ref, IndirectObject) or ref.pdf is not writer:
+            continue
+        stream = ref.get_object()
+        if "/Filter" not in stream:
+            writer._objects[ref.idnum - 1] = stream.flate_encode()
+
+
+def run_pipeline(pdf: PdfSource, steps: Sequence[Step]) -> bytes:
+    """Apply the steps in order with one parse and one write
+
+    Raises ValueError for an empty queue or a page number out of range.
+    Encryption happens while writing, so a protect step takes effect at
+    the end wherever it is queued; if several are queued the last wins.
+    """
+    if not steps:
+        raise ValueError("Add at least one step to the pipeline")
+
+    reader = open_reader(pdf)
+    writer = PyPDF2.PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+    pages = writer.pages
+    password = None
+
+    for step in steps:
+        if isinstance(step, RotateStep):
+            for i in _page_indexes(step.pages, len(pages)):
+                pages[i].rotate(step.angle)
+        elif isinstance(step, WatermarkStep):
+            stamp_pages(writer, pages, step.spec)
+        elif isinstance(step, CompressStep):
+            for page in pages:
+                _compress_contents(writer, page)
+        elif isinstance(step, EncryptStep):
+            password = step.password
+        else:
+            raise TypeError(f"Unknown pipeline step: {step!r}")
+
+    if password is not None:
+        writer.encrypt(user_password=password)
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
@@ -0,0 +1,179 @@
+"""
+Page rasterisation with pluggable render backends.
+
+The default backend renders in-process with PyMuPDF (fitz) pixmaps; the
+poppler backend (pdf2image / pdftoppm subprocess) is the fallback when
+PyMuPDF is unavailable or cannot open a file. Select one explicitly with
+PDF_RENDER_BACKEND=pymupdf|poppler.
+
+All callers go through one API:
+
+    doc = open_document(pdf_bytes)
+    img = render_page(doc, index, dpi)     # index is 0-based
+
+iter_page_images() streams pages one at a time (or in small windows for
+poppler) and closes each image once the caller moves on, keeping peak
+memory flat regardless of page count.
+
+PyMuPDF is not safe to drive from two threads at once, even on separate
+documents, and the script thread, background jobs and the thumbnail
+prefetcher all use it. Every fitz call in the process holds FITZ_LOCK;
+the backend takes it per page, so threads interleave page by page.
+"""
+
+import io
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Tuple
+
+import PyPDF2
+from PIL import Image
+from pdf2image import convert_from_bytes
+
+# Pages rendered per poppler call; small enough to bound memory, large
+# enough to amortise the subprocess start-up
+DEFAULT_WINDOW = 4
+
+# Held around every PyMuPDF call in this process (see above)
+FITZ_LOCK = threading.RLock()
+
+
+def page_count(pdf_bytes: bytes) -> int:
+    return len(PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+
+# ==========================================================
+# BACKENDS
+# ==========================================================
+class PyMuPDFBackend:
+    """In-process rendering through fitz pixmaps"""
+
+    name = "pymupdf"
+
+    def open(self, pdf_bytes: bytes) -> Any:
+        import fitz  # PyMuPDF
+        with FITZ_LOCK:
+            return fitz.open(stream=pdf_bytes, filetype="pdf")
+
+    def page_count(self, handle: Any) -> int:
+        with FITZ_LOCK:
+            return handle.page_count
+
+    def render_pages(self, handle: Any, first: int, last: int, dpi: int) -> Iterator[Image.Image]:
+        for index in range(first, last + 1):
+            with FITZ_LOCK:
+                pix = handle[index].get_pixmap(dpi=dpi, alpha=False)
+                img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+                del pix
+            yield img
+
+    def close(self, handle: Any) -> None:
+        with FITZ_LOCK:
+            handle.close()
+
+
+class PopplerBackend:
+    """pdftoppm subprocess rendering through pdf2image"""
+
+    name = "poppler"
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+
+    def open(self, pdf_bytes: bytes) -> Any:
+        return pdf_bytes
+
+    def page_count(self, handle: Any) -> int:
+        return page_count(handle)
+
+    def render_pages(self, handle: Any, first: int, last: int, dpi: int) -> Iterator[Image.Image]:
+        # pdf2image page numbers are 1-based and inclusive
+        for start in range(first, last + 1, self.window):
+            end = min(start + self.window - 1, last)
+            images = convert_from_bytes(handle, dpi=dpi, first_page=start + 1, last_page=end + 1)
+            for offset in range(len(images)):
+                img = images[offset]
+                images[offset] = None  # drop the list's reference early
+                yield img
+
+    def close(self, handle: Any) -> None:
+        pass
+
+
+BACKENDS = {
+    PyMuPDFBackend.name: PyMuPDFBackend,
+    PopplerBackend.name: PopplerBackend,
+}
+
+
+def _default_backend_names() -> List[str]:
+    forced = os.environ.get("PDF_RENDER_BACKEND")
+    if forced:
+        return [forced]
+    return [PyMuPDFBackend.name, PopplerBackend.name]
+
+
+# ==========================================================
+# PUBLIC API
+# ==========================================================
+@dataclass
+class RenderDocument:
+    backend: Any
+    handle: Any
+    page_count: int
+
+    def close(self) -> None:
+        self.backend.close(self.handle)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_document(pdf_bytes: bytes, backend: Optional[str] = None) -> RenderDocument:
+    """Open a PDF with the first backend that can handle it"""
+    names = [backend] if backend else _default_backend_names()
+    error = None
+
+    for name in names:
+        impl = BACKENDS[name]()
+        try:
+            handle = impl.open(pdf_bytes)
+            return RenderDocument(impl, handle, impl.page_count(handle))
+        except Exception as e:
+            error = e
+
+    raise RuntimeError(f"No render backend could open the PDF: {error}")
+
+
+def render_page(doc: RenderDocument, index: int, dpi: int = 150) -> Image.Image:
+    """Render one 0-based page to an RGB PIL image"""
+    return next(doc.backend.render_pages(doc.handle, index, index, dpi))
+
+
+def render_pages(pdf_bytes: bytes, dpi: int = 150, first_page: int = 1,
+                 last_page: Optional[int] = None) -> List[Image.Image]:
+    """Render a 1-based inclusive page range into a list (for previews)"""
+    return [img.copy() for _, img in iter_page_images(pdf_bytes, dpi, first_page, last_page)]
+
+
+def iter_page_images(pdf_bytes: bytes, dpi: int = 150, first_page: int = 1,
+                     last_page: Optional[int] = None) -> Iterator[Tuple[int, Image.Image]]:
+    """Yield (page_no, image) one page at a time, 1-based
+
+    Each image is closed once the consumer asks for the next one, so do not
+    keep references to yielded images; copy or encode them instead.
+    """
+    with open_document(pdf_bytes) as doc:
+        if last_page is None or last_page > doc.page_count:
+            last_page = doc.page_count
+
+        pages = doc.backend.render_pages(doc.handle, first_page - 1, last_page - 1, dpi)
+        for page_no, img in enumerate(pages, start=first_page):
+            try:
+                yield page_no, img
+            finally:
+                img.close()
@@ -0,0 +1,194 @@
+"""
+Content-hash keyed result cache.
+
+Streamlit reruns the whole script on every widget change, so parsing,
+previews and OCR would otherwise run again on the same uploaded bytes.
+Results are keyed by SHA-256 of the input bytes plus the operation name
+and its parameters, kept in an in-memory LRU and optionally spilled to a
+disk LRU. Both tiers have a byte budget.
+
+Configuration (environment variables):
+    PDF_CACHE_MEMORY_MB   memory budget, default 256
+    PDF_CACHE_DIR         disk tier directory, disabled when unset
+    PDF_CACHE_DISK_MB     disk budget, default 1024
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+_MISSING = object()
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 hex digest of raw bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(op: str, digest: str, **params) -> str:
+    """Combine an operation, input digest and parameters into one key"""
+    param_str = json.dumps(params, sort_keys=True, default=repr)
+    return hashlib.sha256(f"{op}\0{digest}\0{param_str}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Two-tier (memory, optional disk) LRU cache of pickled results"""
+
+    def __init__(self, max_memory_bytes: int = 256 * 1024 * 1024,
+                 disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = 1024 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()  # key -> pickled blob, oldest first
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        return cls(
+            max_memory_bytes=int(os.environ.get("PDF_CACHE_MEMORY_MB", "256")) * 1024 * 1024,
+            disk_dir=os.environ.get("PDF_CACHE_DIR") or None,
+            max_disk_bytes=int(os.environ.get("PDF_CACHE_DISK_MB", "1024")) * 1024 * 1024,
+        )
+
+    # ------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            blob = self._memory.get(key)
+            if blob is not None:
+                self._memory.move_to_end(key)
+            else:
+                blob = self._disk_get(key)
+                if blob is not None:
+                    self._memory_put(key, blob)
+
+            if blob is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+
+        return pickle.loads(blob)
+
+    def set(self, key: str, value: Any) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._memory_put(key, blob)
+            self._disk_put(key, blob)
+
+    def key(self, func: Callable, data: bytes, *args, **params) -> str:
+        """The key call() stores func(data, *args, **params) under"""
+        op = f"{func.__module__}.{func.__qualname__}"
+        return make_key(op, content_hash(data), args=args, **params)
+
+    def call(self, func: Callable, data: bytes, *args, uncached: Optional[dict] = None, **params) -> Any:
+        """Return func(data, *args, **params), computing it only on a miss
+
+        uncached holds extra keyword arguments that do not change the result
+        (progress callbacks, worker counts) and are left out of the key.
+        """
+        key = self.key(func, data, *args, **params)
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = func(data, *args, **params, **(uncached or {}))
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for path, _, _ in self._disk_entries():
+                os.remove(path)
+            self._disk_bytes = 0
+
+    # ------------------------------------------------------
+    # Memory tier
+    # ------------------------------------------------------
+    def _memory_put(self, key: str, blob: bytes) -> None:
+        if len(blob) > self.max_memory_bytes:
+            return
+
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+
+        self._memory[key] = blob
+        self._memory_bytes += len(blob)
+
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # ------------------------------------------------------
+    # Disk tier (LRU by file mtime, touched on every hit)
+    # ------------------------------------------------------
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".pkl")
+
+    def _disk_entries(self):
+        """Yield (path, size, mtime) for every cached file"""
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".pkl"):
+                    path = os.path.join(root, name)
+                    st = os.stat(path)
+                    yield path, st.st_size, st.st_mtime
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            os.utime(path)
+            return blob
+        except OSError:
+            return None
+
+    def _disk_put(self, key: str, blob: bytes) -> None:
+        if not self.disk_dir or len(blob) > self.max_disk_bytes:
+            return
+
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+        self._disk_bytes += len(blob)
+
+        if self._disk_bytes > self.max_disk_bytes:
+            self._disk_evict()
+
+    def _disk_evict(self) -> None:
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        self._disk_bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                self._disk_bytes -= size
+            except OSError:
+                continue
@@ -0,0 +1,43 @@
+import pytest
+
+import cli
+
+
+def parse(argv):
+    parser = cli.build_parser()
+    args = parser.parse_args(argv)
+    cli.check_args(parser, args)
+    return args
+
+
+@pytest.mark.parametrize("method", ["ocr", "auto"])
+def test_searchable_with_ocr_methods(method):
+    assert parse(["extract-text", "--method", method, "--searchable", "a.pdf"]).searchable
+
+
+def test_searchable_rejected_with_normal_method(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        parse(["extract-text", "--searchable", "a.pdf"])
+    assert exit_info.value.code == 2
+    assert "--searchable needs --method ocr or auto" in capsys.readouterr().err
+
+
+def test_unknown_choice_rejected():
+    with pytest.raises(SystemExit):
+        parse(["rotate", "--angle", "45", "a.pdf"])
+
+
+def test_jobs_must_be_positive(capsys):
+    assert cli.main(["rotate", "--jobs", "0", "a.pdf"]) == 2
+    assert "--jobs must be at least 1" in capsys.readouterr().err
+
+
+def test_missing_input_is_reported(tmp_path, capsys):
+    assert cli.main(["rotate", str(tmp_path / "none-*.pdf"), "-o", str(tmp_path)]) == 1
+    assert "No files match" in capsys.readouterr().err
+
+
+def test_output_stems_are_unique():
+    stems = cli.output_stems(["a/report.pdf", "b/report.pdf", "c/other.pdf"])
+    assert len(set(stems)) == 3
+    assert stems[2] == "other"
@@ -0,0 +1,50 @@
+import io
+
+import fitz  # PyMuPDF
+import PyPDF2
+
+import pdf_ops
+from dedup import dedupe_objects
+
+
+def template_pdf(label):
+    """One page with the same logo image and font as every other copy"""
+    doc = fitz.open()
+    page = doc.new_page()
+    logo = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), 0)
+    logo.clear_with(200)
+    page.insert_image(fitz.Rect(20, 20, 120, 120), pixmap=logo)
+    page.insert_text((20, 200), label, fontname="tiro")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def image_xrefs(pdf):
+    with fitz.open(stream=pdf, filetype="pdf") as doc:
+        return [{img[0] for img in page.get_images()} for page in doc]
+
+
+def test_merge_stores_shared_resources_once():
+    inputs = [template_pdf(f"invoice {n}") for n in range(3)]
+    plain = pdf_ops.merge(inputs, dedupe=False)
+    shared = pdf_ops.merge(inputs, dedupe=True)
+
+    assert len(set.union(*image_xrefs(plain))) == 3
+    assert len(set.union(*image_xrefs(shared))) == 1
+    assert len(shared) < len(plain)
+
+    reader = PyPDF2.PdfReader(io.BytesIO(shared))
+    assert [page.extract_text().strip() for page in reader.pages] == ["invoice 0", "invoice 1", "invoice 2"]
+
+
+def test_pages_are_never_merged():
+    same = template_pdf("same")
+    writer = PyPDF2.PdfWriter()
+    for _ in range(2):
+        writer.append(PyPDF2.PdfReader(io.BytesIO(same)))
+    dedupe_objects(writer)
+
+    output = io.BytesIO()
+    writer.write(output)
+    assert len(PyPDF2.PdfReader(output).pages) == 2
@@ -0,0 +1,92 @@
+import re
+
+import pytest
+
+import invoice
+from invoice_rules import MAX_MATCH_CHARS, Rule, RuleSet, literal_starts
+
+TEXTS = [
+    """TAX INVOICE
+Seller: Star Cement Ltd
+GSTIN: 18AABCS1234F1Z5   State Code: 18   PIN: 793001
+Invoice No: SCL/2024/0042   Invoice Date: 12-03-2024   Due Date: 11-04-2024
+Buyer: Acme Builders Pvt Ltd
+Vehicle No: AS01AB1234   Mode of Transport: Road   E-Way Bill No: 331009876543
+Ack No: 112410012345678   Ack Date: 12-03-2024
+1 25232930 CEMENT OPC 53 GRADE 100 MT 5,400.00 MT 5,40,000.00
+Taxable Amount: 5,40,000.00   CGST @ 9%: 48,600.00   SGST @ 9%: 48,600.00
+Round Off: 0.00   Total Amount: 6,37,200.00
+Amount in Words: Six Lakh Thirty Seven Thousand Two Hundred Only
+Reverse Charge: No""",
+    """Invoice Number INV-77
+Dated 1/2/2023
+KELVIN KILN İNVOICE ınvoice
+Place of Supply: Karnataka (29)
+PAN: AABCS1234F  CIN: U26942ML2001PLC006663
+Total 1,234.50""",
+    "",
+]
+
+
+def all_rules():
+    for ruleset in (invoice.HEADER_RULES, invoice.LINE_ITEM_RULES):
+        for rule in ruleset.rules.values():
+            yield rule
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_alternatives_match_like_plain_re(text):
+    scan = invoice.HEADER_RULES.scan(text, budget=60)
+    for rule in all_rules():
+        for alt in rule.alternatives:
+            found = scan._search(alt)
+            expected = alt.regex.search(text)
+            assert (found and found.span()) == (expected and expected.span()), alt.pattern
+            assert [m.span() for m in scan._finditer(alt)] == [m.span() for m in alt.regex.finditer(text)], \
+                alt.pattern
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_first_is_first_matching_alternative(text):
+    scan = invoice.HEADER_RULES.scan(text, budget=60)
+    for rule in invoice.HEADER_RULES.rules.values():
+        expected = ""
+        for alt in rule.alternatives:
+            match = alt.regex.search(text)
+            if match:
+                expected = match.group(1).strip()
+                break
+        assert scan.first(rule) == expected, rule.name
+
+
+def test_all_reports_findall_values():
+    rule = Rule([r"GSTIN[:\s]*([0-9A-Z]{15})", r"(\d{2})-(\d{2})"])
+    scan = RuleSet({"gstin": rule}).scan(TEXTS[0])
+    assert scan.all(rule) == re.findall(rule.alternatives[0].pattern, TEXTS[0], re.IGNORECASE | re.DOTALL)
+
+
+def test_search_finds_matches_past_the_first_window():
+    rule = Rule([r"(\d+)\s+widgets"])
+    text = "x " * (3 * MAX_MATCH_CHARS) + "42 widgets"
+    scan = RuleSet({"widgets": rule}).scan(text)
+    assert scan.first(rule) == "42"
+
+
+def test_budget_skips_rule():
+    rule = Rule([r"(a+)+b"])
+    scan = RuleSet({"slow": rule}).scan("a" * 40, budget=0)
+    assert scan.first(rule, "none") == "none"
+    assert scan.timings[-1].skipped
+
+
+@pytest.mark.parametrize("pattern, starts", [
+    (r"Invoice\s+No", ["Invoice"]),
+    (r"(?:Seller|Supplier)\s*:", ["Seller", "Supplier"]),
+    (r"(?:State\s+)?Code", ["State", "Code"]),
+    (r"\bGSTIN|PAN", ["GSTIN", "PAN"]),
+    (r"[Ii]nvoice", ["invoice"]),
+    (r"\d+\s+MT", []),
+    (r"(?=x)abc", []),
+])
+def test_literal_starts(pattern, starts):
+    assert literal_starts(pattern) == starts
@@ -0,0 +1,90 @@
+import fitz  # PyMuPDF
+
+import invoice_table
+from invoice_table import table_items
+
+HEADER = [(20, "Sl"), (33, "No"), (80, "Description"), (200, "HSN/SAC"),
+          (260, "Quantity"), (320, "Rate"), (380, "Amount")]
+
+
+def row(y, cells):
+    """Words (x0, y0, x1, y1, text) for one line, 5pt per character"""
+    return [(x, y, x + 5 * len(text), y + 10, text) for x, text in cells]
+
+
+def item(y, serial, description, hsn, qty, rate, amount):
+    return row(y, [(20, serial), (80, description), (200, hsn), (260, qty), (320, rate), (380, amount)])
+
+
+def terms_page():
+    return (
+        row(20, [(20, "Terms"), (60, "and"), (85, "Conditions")])
+        + row(40, [(20, "1."), (60, "Goods"), (120, "once"), (200, "sold"), (260, "will"), (320, "not"),
+                   (380, "be"), (400, "taken"), (440, "back")])
+        + row(60, [(20, "2."), (60, "Interest"), (120, "at"), (200, "18%"), (260, "after"), (320, "due"),
+                   (380, "date")])
+    )
+
+
+def test_single_page_table():
+    page = row(20, HEADER) + item(40, "1", "Widget", "8471", "2", "100.00", "200.00") \
+        + row(52, [(80, "blue")]) + item(64, "2", "Bolt", "7318", "10", "5.00", "50.00") \
+        + row(80, [(80, "Total"), (380, "250.00")])
+    items = table_items([page])
+    assert items == [
+        {"Sl No": "1", "Description": "Widget blue", "HSN/SAC": "8471", "Quantity": "2",
+         "Rate": "100.00", "Amount": "200.00"},
+        {"Sl No": "2", "Description": "Bolt", "HSN/SAC": "7318", "Quantity": "10",
+         "Rate": "5.00", "Amount": "50.00"},
+    ]
+
+
+def test_terms_page_after_total_is_not_items():
+    page1 = row(20, HEADER) + item(40, "1", "Widget", "8471", "2", "100.00", "200.00") \
+        + row(60, [(80, "Total"), (380, "200.00")])
+    items = table_items([page1, terms_page()])
+    assert [i["Description"] for i in items] == ["Widget"]
+
+
+def test_terms_page_without_total_is_not_items():
+    page1 = row(20, HEADER) + item(40, "1", "Widget", "8471", "2", "100.00", "200.00")
+    items = table_items([page1, terms_page()])
+    assert [i["Description"] for i in items] == ["Widget"]
+
+
+def test_continuation_page_reuses_columns():
+    page1 = row(20, HEADER) + item(40, "1", "Widget", "8471", "2", "100.00", "200.00")
+    page2 = row(20, [(20, "Page"), (45, "2")]) + item(40, "2", "Bolt", "7318", "10", "5.00", "50.00") \
+        + row(60, [(80, "Total"), (380, "250.00")])
+    items = table_items([page1, page2])
+    assert [(i["Sl No"], i["Amount"]) for i in items] == [("1", "200.00"), ("2", "50.00")]
+
+
+def test_repeated_amount_headers_get_their_own_keys():
+    header = [(20, "Sl"), (33, "No"), (80, "Description"), (200, "Qty"), (240, "Taxable"), (280, "Value"),
+              (340, "CGST"), (365, "Amount"), (430, "Total")]
+    page = row(20, header) + row(40, [(20, "1"), (80, "Widget"), (200, "2"), (250, "200.00"), (350, "18.00"),
+                                      (430, "236.00")])
+    assert table_items([page]) == [
+        {"Sl No": "1", "Description": "Widget", "Quantity": "2", "Taxable Value": "200.00",
+         "CGST Amount": "18.00", "Amount": "236.00"},
+    ]
+
+
+def test_extract_line_items_from_text_layer():
+    doc = fitz.open()
+    for lines in ([(HEADER, 60), ([(20, "1"), (80, "Widget"), (200, "8471"), (260, "2"), (320, "100.00"),
+                                  (380, "200.00")], 80), ([(80, "Total"), (380, "200.00")], 100)],
+                  [([(20, "1."), (60, "Goods"), (120, "once"), (200, "sold"), (260, "will"), (320, "not"),
+                     (380, "be")], 60)]):
+        page = doc.new_page()
+        for cells, y in lines:
+            for x, text in cells:
+                page.insert_text((x, y), text, fontsize=9)
+    pdf = doc.tobytes()
+    doc.close()
+
+    items = invoice_table.extract_line_items(pdf)
+    assert len(items) == 1
+    assert items[0]["Description"] == "Widget"
+    assert items[0]["Amount"] == "200.00"
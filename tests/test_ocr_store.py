@@ -0,0 +1,86 @@
+import itertools
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+import ocr_store
+from ocr_store import OcrStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Strictly increasing time.time(), so last_used orders every put"""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(ocr_store.time, "time", lambda: float(next(ticks)))
+
+
+def stored_sizes(store):
+    with closing(sqlite3.connect(store.path)) as conn:
+        return dict(conn.execute("SELECT key, size FROM ocr"))
+
+
+def real_size(store, key):
+    with closing(sqlite3.connect(store.path)) as conn:
+        k, text, words = conn.execute("SELECT key, text, words FROM ocr WHERE key = ?", (key,)).fetchone()
+    return len(k) + len(text.encode("utf-8")) + len(words or "")
+
+
+def test_round_trip(tmp_path):
+    store = OcrStore(str(tmp_path / "ocr.sqlite"))
+    store.put("a", "héllo", [("héllo", 1, 2, 3, 4, 90.0)])
+    entry = store.get("a")
+    assert entry.text == "héllo"
+    assert entry.words == [("héllo", 1, 2, 3, 4, 90.0)]
+    assert store.get("missing") is None
+
+
+def test_total_tracks_sizes_through_overwrites(tmp_path):
+    store = OcrStore(str(tmp_path / "ocr.sqlite"))
+    store.put("a", "text only")
+    store.put("a", "with words", [("with", 0, 0, 5, 5, 80.0), ("words", 6, 0, 5, 5, 80.0)])
+    # A text-only put keeps the stored word boxes, and still counts them
+    store.put("a", "new text")
+    store.put("b", "ünïcode")
+    store.put("b", "shorter")
+
+    assert store.get("a").words is not None
+    sizes = stored_sizes(store)
+    assert sizes == {key: real_size(store, key) for key in sizes}
+    assert store.total_bytes() == sum(sizes.values())
+
+    store.clear()
+    assert store.total_bytes() == 0
+
+
+def test_eviction_drops_least_recently_used(tmp_path, clock):
+    store = OcrStore(str(tmp_path / "ocr.sqlite"), max_bytes=1000)
+    for n in range(9):
+        store.put(f"k{n}", "x" * 98)  # 100 bytes each
+    store.get("k0")  # now the most recently used
+
+    store.put("k9", "x" * 98)
+    store.put("k10", "x" * 98)  # 1100 bytes: trim to 900
+
+    keys = set(stored_sizes(store))
+    assert "k0" in keys
+    assert {"k1", "k2"}.isdisjoint(keys)
+    assert store.total_bytes() == sum(stored_sizes(store).values()) <= 900
+
+
+def test_oversized_entry_is_not_stored(tmp_path):
+    store = OcrStore(str(tmp_path / "ocr.sqlite"), max_bytes=10)
+    store.put("key", "far too long for the budget")
+    assert store.get("key") is None
+    assert store.total_bytes() == 0
+
+
+def test_total_is_seeded_for_an_existing_file(tmp_path):
+    path = str(tmp_path / "ocr.sqlite")
+    store = OcrStore(path)
+    store.put("a", "one")
+    store.put("b", "two")
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute("DROP TABLE ocr_total")
+
+    assert OcrStore(path).total_bytes() == sum(stored_sizes(store).values())
@@ -0,0 +1,50 @@
+import io
+
+import fitz  # PyMuPDF
+import PyPDF2
+
+import pdf_ops
+from watermark import WatermarkSpec
+
+
+def blank_pdf(sizes, rotations=None):
+    writer = PyPDF2.PdfWriter()
+    for i, (width, height) in enumerate(sizes):
+        page = writer.add_blank_page(width, height)
+        if rotations:
+            page.rotate(rotations[i])
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def stamp_refs(pdf):
+    """(stamp name, form object number) per page"""
+    refs = []
+    for page in PyPDF2.PdfReader(io.BytesIO(pdf)).pages:
+        xobjects = page["/Resources"]["/XObject"]
+        [(name, ref)] = [(n, r) for n, r in xobjects.items() if n.startswith("/StarWm")]
+        refs.append((name, ref.idnum))
+    return refs
+
+
+def test_pages_of_one_size_share_a_stamp_whatever_their_rotation():
+    pdf = blank_pdf([(612, 792)] * 4, rotations=[0, 90, 180, 270])
+    refs = stamp_refs(pdf_ops.watermark(pdf, WatermarkSpec("CONFIDENTIAL")))
+    assert len(set(refs)) == 1
+    assert refs[0][0] == "/StarWm0"
+
+
+def test_each_page_size_gets_its_own_stamp():
+    pdf = blank_pdf([(612, 792), (842, 595), (612, 792)])
+    refs = stamp_refs(pdf_ops.watermark(pdf, WatermarkSpec("DRAFT")))
+    assert refs[0] == refs[2]
+    assert refs[0] != refs[1]
+
+
+def test_stamp_is_drawn_on_every_page():
+    pdf = blank_pdf([(612, 792), (612, 792)])
+    watermarked = pdf_ops.watermark(pdf, WatermarkSpec("DRAFT"))
+    with fitz.open(stream=watermarked, filetype="pdf") as doc:
+        for page in doc:
+            assert b"/StarWm0 Do" in page.read_contents()
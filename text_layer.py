@@ -0,0 +1,79 @@
+"""
+Invisible OCR text layer for scanned pages.
+
+Each OCR'd word is drawn in text render mode 3 (neither filled nor
+stroked) over its box on the page image, scaled so PyMuPDF's search and
+selection rectangles cover the word as printed. The page looks the same.
+Its text is now real PDF text, so search, copy, redaction and text
+extraction work on it without running OCR again.
+"""
+
+from typing import Dict
+
+import fitz  # PyMuPDF
+
+from ocr import PageWords
+from raster import FITZ_LOCK
+
+FONT = "helv"
+INVISIBLE = 3  # PDF text render mode: no fill, no stroke
+
+_font = fitz.Font(FONT)
+# Height of a search/selection box per point of font size
+_LINE_HEIGHT = _font.ascender - _font.descender
+
+
+def _linear(m: fitz.Matrix) -> fitz.Matrix:
+    return fitz.Matrix(m.a, m.b, m.c, m.d, 0, 0)
+
+
+def add_text_layer(page: fitz.Page, page_words: PageWords) -> int:
+    """Draw the words invisibly over the page, returns the number drawn
+
+    Word boxes are in pixels of the rendered page, which shows the page
+    as displayed (rotation applied), so they are scaled to page.rect and
+    then taken back to unrotated page space.
+    """
+    width, height = page_words.size
+    sx = page.rect.width / width
+    sy = page.rect.height / height
+    derotate = page.derotation_matrix
+    rotate = _linear(page.rotation_matrix)
+    derotate_linear = _linear(derotate)
+
+    shape = page.new_shape()
+    drawn = 0
+    for text, left, top, w, h, _ in page_words.words:
+        if w <= 0 or h <= 0:
+            continue
+        box_w, box_h = w * sx, h * sy
+        fontsize = box_h / _LINE_HEIGHT
+        text_w = _font.text_length(text, fontsize)
+        if text_w <= 0:
+            continue
+
+        # Baseline start in displayed coordinates, then unrotated
+        origin = fitz.Point(left * sx, (top + h) * sy + _font.descender * fontsize) * derotate
+        # Stretch along the displayed text direction to the box width
+        stretch = rotate * fitz.Matrix(box_w / text_w, 1) * derotate_linear
+        # The trailing space keeps words apart for extractors that do
+        # not infer spacing from glyph positions (PyPDF2)
+        shape.insert_text(origin, text + " ", fontname=FONT, fontsize=fontsize,
+                          rotate=page.rotation, render_mode=INVISIBLE,
+                          morph=(origin, stretch))
+        drawn += 1
+
+    shape.commit()
+    return drawn
+
+
+def make_searchable(pdf_bytes: bytes, pages: Dict[int, PageWords]) -> bytes:
+    """Copy of the PDF with a text layer on the given 1-based pages"""
+    with FITZ_LOCK:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            for page_no, page_words in pages.items():
+                add_text_layer(doc[page_no - 1], page_words)
+            return doc.tobytes(garbage=3, deflate=True)
+        finally:
+            doc.close()
@@ -0,0 +1,92 @@
+"""
+Thumbnail service for page preview grids.
+
+A page group is rendered in one pass over a single opened document, and
+each thumbnail is stored as compact JPEG/WebP bytes in the shared result
+cache, keyed by document hash and page. Later groups can be rendered ahead
+of time on a background thread so paging through a large file is a lookup.
+"""
+
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from raster import open_document, render_page
+from result_cache import ResultCache, content_hash, make_key
+
+
+class ThumbnailService:
+    def __init__(self, cache: ResultCache, dpi: int = 80, image_format: str = "JPEG", quality: int = 70):
+        self.cache = cache
+        self.dpi = dpi
+        self.image_format = image_format
+        self.quality = quality
+
+        # Foreground and prefetch renders interleave page by page on
+        # raster.FITZ_LOCK
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnails")
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+
+    def _key(self, digest: str, page_no: int) -> str:
+        return make_key("thumbnail", digest, page=page_no, dpi=self.dpi,
+                        image_format=self.image_format, quality=self.quality)
+
+    def _encode(self, img) -> bytes:
+        buf = io.BytesIO()
+        img.save(buf, format=self.image_format, quality=self.quality)
+        return buf.getvalue()
+
+    def _render_group(self, pdf_bytes: bytes, digest: str, pages) -> Dict[int, bytes]:
+        """Render the given 1-based pages with one opened document"""
+        rendered = {}
+        with open_document(pdf_bytes) as doc:
+            for page_no in pages:
+                if page_no > doc.page_count:
+                    break
+                img = render_page(doc, page_no - 1, self.dpi)
+                try:
+                    rendered[page_no] = self._encode(img)
+                finally:
+                    img.close()
+                self.cache.set(self._key(digest, page_no), rendered[page_no])
+        return rendered
+
+    def get_group(self, pdf_bytes: bytes, first_page: int, last_page: int) -> Dict[int, bytes]:
+        """Return {page_no: image bytes} for a 1-based inclusive range"""
+        digest = content_hash(pdf_bytes)
+        thumbs = {}
+        missing = []
+
+        for page_no in range(first_page, last_page + 1):
+            data = self.cache.get(self._key(digest, page_no))
+            if data is None:
+                missing.append(page_no)
+            else:
+                thumbs[page_no] = data
+
+        if missing:
+            thumbs.update(self._render_group(pdf_bytes, digest, missing))
+        return thumbs
+
+    def prefetch(self, pdf_bytes: bytes, first_page: int, last_page: int) -> None:
+        """Render a range in the background unless it is already queued"""
+        digest = content_hash(pdf_bytes)
+        job = (digest, first_page, last_page)
+
+        with self._pending_lock:
+            if job in self._pending:
+                return
+            self._pending.add(job)
+
+        def run():
+            try:
+                self.get_group(pdf_bytes, first_page, last_page)
+            except Exception:
+                pass  # a failed prefetch just means a foreground render later
+            finally:
+                with self._pending_lock:
+                    self._pending.discard(job)
+
+        self._prefetcher.submit(run)
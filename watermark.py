@@ -0,0 +1,143 @@
+"""
+Watermark engine with shared stamps.
+
+The stamp for each distinct (width, height) page size is rendered once
+with reportlab and stored once in the output as a Form XObject. Every
+page of that size only gets a resource entry and a tiny shared "draw the
+stamp" content stream, so CPU time grows with the number of distinct page
+sizes and the file does not grow by a copy of the stamp per page.
+"""
+
+import io
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import PyPDF2
+from PyPDF2.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    FloatObject,
+    IndirectObject,
+    NameObject,
+)
+from reportlab.pdfgen import canvas
+
+
+@dataclass
+class WatermarkSpec:
+    text: str
+    font_size: int = 48
+    opacity: float = 0.25
+    rotation: int = 45
+
+
+def _stream(writer: PyPDF2.PdfWriter, data: bytes) -> IndirectObject:
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return writer._add_object(stream)
+
+
+def render_stamp(spec: WatermarkSpec, width: float, height: float) -> PyPDF2.PageObject:
+    """Draw the watermark on a blank page of the given size"""
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet, pagesize=(width, height))
+
+    can.saveState()
+    can.setFont("Helvetica-Bold", spec.font_size)
+    can.setFillAlpha(spec.opacity)  # TRUE transparency
+    can.translate(width / 2, height / 2)
+    can.rotate(spec.rotation)
+    can.drawCentredString(0, 0, spec.text)
+    can.restoreState()
+    can.save()
+
+    packet.seek(0)
+    return PyPDF2.PdfReader(packet).pages[0]
+
+
+class _StampCache:
+    """Form XObjects (and their draw streams) keyed by page size
+
+    The stamp is drawn in the page's unrotated space, as merging a
+    rendered stamp page did, so /Rotate does not change it.
+    """
+
+    def __init__(self, writer: PyPDF2.PdfWriter, spec: WatermarkSpec):
+        self.writer = writer
+        self.spec = spec
+        self.stamps: Dict[Tuple[float, float], Tuple[NameObject, IndirectObject, IndirectObject]] = {}
+
+        # Shared by every page: isolates the page's own graphics state
+        self.save_state = _stream(writer, b"q\n")
+
+    def get(self, width: float, height: float):
+        key = (width, height)
+        if key not in self.stamps:
+            stamp_page = render_stamp(self.spec, width, height)
+
+            form = DecodedStreamObject()
+            form.set_data(stamp_page.get_contents().get_data())
+            form.update({
+                NameObject("/Type"): NameObject("/XObject"),
+                NameObject("/Subtype"): NameObject("/Form"),
+                NameObject("/BBox"): ArrayObject([
+                    FloatObject(0), FloatObject(0), FloatObject(width), FloatObject(height)
+                ]),
+                NameObject("/Resources"): stamp_page["/Resources"].clone(self.writer),
+            })
+
+            name = NameObject(f"/StarWm{len(self.stamps)}")
+            form_ref = self.writer._add_object(form)
+            draw_ref = _stream(self.writer, b"\nQ\nq " + name.encode() + b" Do Q\n")
+            self.stamps[key] = (name, form_ref, draw_ref)
+
+        return self.stamps[key]
+
+
+def stamp_page(stamps: _StampCache, page: PyPDF2.PageObject) -> None:
+    """Add the shared stamp to a page that already belongs to stamps.writer"""
+    width = float(page.mediabox.width)
+    height = float(page.mediabox.height)
+    name, form_ref, draw_ref = stamps.get(width, height)
+
+    # ---- Resources: register the shared form under its name ----
+    resources = page.get("/Resources")
+    if resources is None:
+        resources = DictionaryObject()
+        page[NameObject("/Resources")] = resources
+    resources = resources.get_object()
+
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        xobjects = DictionaryObject()
+        resources[NameObject("/XObject")] = xobjects
+    xobjects.get_object()[name] = form_ref
+
+    # ---- Contents: q <original> Q q /StarWmN Do Q ----
+    contents = page.raw_get("/Contents") if "/Contents" in page else None
+    parts = [stamps.save_state]
+    if contents is not None:
+        resolved = contents.get_object()
+        if isinstance(resolved, ArrayObject):
+            parts.extend(resolved)
+        else:
+            parts.append(contents)
+    parts.append(draw_ref)
+    page[NameObject("/Contents")] = ArrayObject(parts)
+
+
+def stamp_pages(writer: PyPDF2.PdfWriter, pages, spec: WatermarkSpec) -> None:
+    """Stamp pages already added to writer, sharing one form per page size"""
+    stamps = _StampCache(writer, spec)
+    for page in pages:
+        stamp_page(stamps, page)
+
+
+def apply_watermark(reader: PyPDF2.PdfReader, spec: WatermarkSpec) -> PyPDF2.PdfWriter:
+    """Return a writer holding every page of reader with the stamp applied"""
+    writer = PyPDF2.PdfWriter()
+    stamps = _StampCache(writer, spec)
+    for page in reader.pages:
+        stamp_page(stamps, writer.add_page(page))
+    return writer
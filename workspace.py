@@ -0,0 +1,183 @@
+"""
+Document workspace shared by every tool.
+
+Each tool has its own uploader, and switching tools drops its widgets, so
+without this a large PDF is uploaded (and hashed and parsed) again for
+every tool. Uploaded documents are stored once on local disk under their
+SHA-256, the same digest ResultCache keys on, so page counts, previews and
+results computed by one tool are cache hits in the next.
+
+DocumentStore is the disk store, shared by all sessions, LRU by file mtime
+within a byte budget. Workspace is one session's index of its documents,
+most recently used first, capped at a number of documents. Dropping a
+document from an index leaves the stored copy for other sessions.
+
+Configuration (environment variables):
+    PDF_WORKSPACE_DIR     store directory, default <tmp>/pdf-editor-workspace
+    PDF_WORKSPACE_MB      store budget, default 2048
+    PDF_WORKSPACE_DOCS    documents kept per session, default 8
+"""
+
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from result_cache import content_hash
+
+
+class DocumentStore:
+    """Content-addressed files on disk, LRU by mtime within a byte budget"""
+
+    def __init__(self, root: str, max_bytes: int = 2048 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._entries())
+
+    @classmethod
+    def from_env(cls) -> "DocumentStore":
+        return cls(
+            root=os.environ.get("PDF_WORKSPACE_DIR")
+            or os.path.join(tempfile.gettempdir(), "pdf-editor-workspace"),
+            max_bytes=int(os.environ.get("PDF_WORKSPACE_MB", "2048")) * 1024 * 1024,
+        )
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest + ".pdf")
+
+    def put(self, data: bytes, digest: Optional[str] = None) -> str:
+        """Store data (once per content) and return its digest"""
+        digest = digest or content_hash(data)
+        path = self.path(digest)
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)
+                return digest
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._bytes += len(data)
+
+            if self._bytes > self.max_bytes:
+                self._evict(keep=path)
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """Stored bytes, None if the document was evicted"""
+        path = self.path(digest)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _entries(self):
+        """Yield (path, size, mtime) for every stored document"""
+        for root, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".pdf"):
+                    path = os.path.join(root, name)
+                    st = os.stat(path)
+                    yield path, st.st_size, st.st_mtime
+
+    def _evict(self, keep: str) -> None:
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        self._bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                self._bytes -= size
+            except OSError:
+                continue
+
+
+@dataclass
+class WorkspaceDoc:
+    digest: str
+    name: str
+    size: int
+
+
+class WorkspaceFile(io.BytesIO):
+    """A stored document with the UploadedFile attributes the tools use"""
+
+    def __init__(self, doc: WorkspaceDoc, data: bytes):
+        super().__init__(data)
+        self.name = doc.name
+        self.size = doc.size
+        self.type = "application/pdf"
+        self.file_id = doc.digest
+
+
+class Workspace:
+    """One session's documents, most recently used first"""
+
+    def __init__(self, store: DocumentStore, max_docs: int = 8):
+        self.store = store
+        self.max_docs = max_docs
+        self._docs: "OrderedDict[str, WorkspaceDoc]" = OrderedDict()  # oldest first
+        self._uploads: Dict[str, str] = {}  # uploader file_id -> digest
+
+    @classmethod
+    def from_env(cls, store: DocumentStore) -> "Workspace":
+        return cls(store, max_docs=int(os.environ.get("PDF_WORKSPACE_DOCS", "8")))
+
+    def add_upload(self, uploaded) -> WorkspaceDoc:
+        """Store an uploaded file and make it the active document
+
+        The same upload is hashed and written once, however many reruns
+        pass it in again; later reruns do not change the active document.
+        """
+        file_id = getattr(uploaded, "file_id", None)
+        digest = self._uploads.get(file_id) if file_id else None
+        if digest is not None and digest in self._docs:
+            return self._docs[digest]
+
+        data = uploaded.getvalue()
+        digest = self.store.put(data)
+        if file_id:
+            self._uploads[file_id] = digest
+        if digest not in self._docs:
+            self._docs[digest] = WorkspaceDoc(digest, uploaded.name, len(data))
+        self.touch(digest)
+        return self._docs[digest]
+
+    def touch(self, digest: str) -> None:
+        """Mark a document as the most recently used (the active one)"""
+        self._docs.move_to_end(digest)
+        while len(self._docs) > self.max_docs:
+            self.remove(next(iter(self._docs)))
+
+    def remove(self, digest: str) -> None:
+        self._docs.pop(digest, None)
+        self._uploads = {k: v for k, v in self._uploads.items() if v != digest}
+
+    def docs(self) -> List[WorkspaceDoc]:
+        """Documents, most recently used first"""
+        return list(reversed(self._docs.values()))
+
+    @property
+    def active(self) -> Optional[WorkspaceDoc]:
+        return next(reversed(self._docs.values()), None)
+
+    def open(self, doc: WorkspaceDoc) -> Optional[WorkspaceFile]:
+        """The stored document as a file object, None if evicted from disk"""
+        data = self.store.get(doc.digest)
+        if data is None:
+            self.remove(doc.digest)
+            return None
+        return WorkspaceFile(doc, data)